@@ -0,0 +1,174 @@
+"""
+Vectorized aggregation over expense histories.
+
+ExpenseFrame holds expenses as NumPy columns (amount, currency id, category id, date) so bulk reports
+convert and group hundreds of thousands of rows with a handful of array operations instead of one
+convert_to_primary() call per row. Results match the per-row semantics exactly: a row already in the
+primary currency keeps its amount, any other row is computed as amount * rate_to_usd / primary_rate_to_usd.
+Given a rates.RateTable, each row is converted at the rates in effect on its own date instead.
+"""
+import numpy as np
+
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD
+
+# Currency codes are stored as small integers indexing these tables.
+CURRENCY_IDS = {code: index for index, code in enumerate(CURRENCY_OPTIONS)}
+RATES_TO_USD = np.array([CURRENCY_RATES_TO_USD[code] for code in CURRENCY_OPTIONS], dtype=np.float64)
+
+
+def month_label(month_number):
+    """Months since 1970-01 (NumPy's datetime64[M] epoch) -> 'YYYY-MM'."""
+    year, month = divmod(int(month_number), 12)
+    return f'{1970 + year:04d}-{month + 1:02d}'
+
+
+class ExpenseFrame:
+    """Column-oriented expenses for bulk reports."""
+
+    def __init__(self, amounts, currency_ids, category_ids, dates, categories, rates=None):
+        self.amounts = np.asarray(amounts, dtype=np.float64)
+        self.currency_ids = np.asarray(currency_ids, dtype=np.int8)
+        self.category_ids = np.asarray(category_ids, dtype=np.int32)
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.categories = list(categories)
+        self.rates = rates  # a rates.RateTable for date-effective conversion; None uses the fixed rates
+        self._converted = {}
+        self._months = None
+
+    @classmethod
+    def from_rows(cls, rows, rates=None):
+        """Builds a frame from (amount, currency_code, category, date) tuples or sqlite rows."""
+        amounts, currency_ids, category_ids, dates = [], [], [], []
+        category_index = {}
+        for amount, currency_code, category, date in rows:
+            amounts.append(amount)
+            currency_ids.append(CURRENCY_IDS[currency_code])
+            category_ids.append(category_index.setdefault(category, len(category_index)))
+            dates.append(date)
+        return cls(amounts, currency_ids, category_ids, np.array(dates, dtype='datetime64[D]'), category_index, rates)
+
+    @classmethod
+    def from_store(cls, store, start_month=None, end_month=None, rates=None):
+        """Loads every expense (optionally limited to an inclusive month range) from an ExpenseStore."""
+        return cls.from_rows(store.expense_rows(start_month, end_month), rates)
+
+    def __len__(self):
+        return len(self.amounts)
+
+    # --- CONVERSION ---
+
+    def converted(self, primary_code):
+        """Every amount in the primary currency (one vectorized pass; np.take looks up each row's rate)."""
+        # Frames are never mutated, so each primary currency is converted at most once.
+        if primary_code not in self._converted and self.rates is not None:
+            self._converted[primary_code] = self.rates.convert_columns(
+                self.amounts, self.currency_ids, self.dates, primary_code)
+        elif primary_code not in self._converted:
+            primary_id = CURRENCY_IDS[primary_code]
+            via_usd = self.amounts * np.take(RATES_TO_USD, self.currency_ids) / RATES_TO_USD[primary_id]
+            self._converted[primary_code] = np.where(self.currency_ids == primary_id, self.amounts, via_usd)
+        return self._converted[primary_code]
+
+    def total(self, primary_code):
+        return float(self.converted(primary_code).sum())
+
+    # --- GROUP-BYS ---
+
+    def months(self):
+        """Month number (months since 1970-01) of every row."""
+        if self._months is None and not len(self):
+            self._months = np.zeros(0, dtype=np.int64)
+        elif self._months is None:
+            # Converting every row's datetime64[D] to [M] is slow (calendar math per element). Convert each
+            # day of the frame's span once instead and look the rows up in that table.
+            days = self.dates.view(np.int64)
+            first = days.min()
+            span = np.arange(first, days.max() + 1).astype('datetime64[D]')
+            self._months = span.astype('datetime64[M]').astype(np.int64)[days - first]
+        return self._months
+
+    def totals_by_category(self, primary_code):
+        """{category: total in primary currency}, omitting categories with no rows."""
+        sums = np.bincount(self.category_ids, weights=self.converted(primary_code), minlength=len(self.categories))
+        counts = np.bincount(self.category_ids, minlength=len(self.categories))
+        return {name: float(sums[index]) for index, name in enumerate(self.categories) if counts[index]}
+
+    def totals_by_currency(self):
+        """{currency_code: total in that currency (unconverted)}."""
+        sums = np.bincount(self.currency_ids, weights=self.amounts, minlength=len(CURRENCY_OPTIONS))
+        counts = np.bincount(self.currency_ids, minlength=len(CURRENCY_OPTIONS))
+        return {code: float(sums[index]) for index, code in enumerate(CURRENCY_OPTIONS) if counts[index]}
+
+    def month_series(self, primary_code):
+        """{'YYYY-MM': total in primary currency} for every month from the first to the last row."""
+        if not len(self):
+            return {}
+        months = self.months()
+        first = months.min()
+        sums = np.bincount(months - first, weights=self.converted(primary_code))
+        return {month_label(first + offset): float(total) for offset, total in enumerate(sums)}
+
+    def category_month_totals(self, primary_code):
+        """(month labels, category names, matrix[month, category]) of primary-currency totals."""
+        if not len(self):
+            return [], list(self.categories), np.zeros((0, len(self.categories)))
+        months = self.months()
+        first = months.min()
+        span = int(months.max() - first) + 1
+        width = len(self.categories)
+        cells = (months - first) * width + self.category_ids
+        matrix = np.bincount(cells, weights=self.converted(primary_code), minlength=span * width)
+        labels = [month_label(first + offset) for offset in range(span)]
+        return labels, list(self.categories), matrix.reshape(span, width)
+
+    def report(self, primary_code):
+        """The JSON-ready report served by /api/report."""
+        return {
+            'primaryCurrency': primary_code,
+            'count': len(self),
+            'total': self.total(primary_code),
+            'byCategory': self.totals_by_category(primary_code),
+            'byCurrency': self.totals_by_currency(),
+            'byMonth': self.month_series(primary_code),
+        }
+
+
+def year_partitions(months):
+    """Sorted 'YYYY-MM' months -> [(first, last)] inclusive month ranges, one per calendar year."""
+    partitions = []
+    for month in months:
+        if partitions and partitions[-1][0][:4] == month[:4]:
+            partitions[-1][1] = month
+        else:
+            partitions.append([month, month])
+    return [tuple(partition) for partition in partitions]
+
+
+def merge_reports(parts, primary_code):
+    """
+    Combines report() dicts of disjoint parts of a history (such as year_partitions() ranges) into the
+    report of the whole. Totals agree with a single report() up to float rounding.
+    """
+    merged = {'primaryCurrency': primary_code, 'count': 0, 'total': 0.0,
+              'byCategory': {}, 'byCurrency': {}, 'byMonth': {}}
+    months = {}
+    for part in parts:
+        merged['count'] += part['count']
+        merged['total'] += part['total']
+        for key in ('byCategory', 'byCurrency'):
+            totals = merged[key]
+            for name, amount in part[key].items():
+                totals[name] = totals.get(name, 0.0) + amount
+        for month, amount in part['byMonth'].items():
+            months[month] = months.get(month, 0.0) + amount
+    if months:
+        # Like month_series(): every month from the first to the last, including empty ones between parts
+        first, last = min(months), max(months)
+        year, month = int(first[:4]), int(first[5:])
+        while True:
+            label = f'{year:04d}-{month:02d}'
+            merged['byMonth'][label] = months.get(label, 0.0)
+            if label == last:
+                break
+            year, month = year + month // 12, month % 12 + 1
+    return merged
@@ -0,0 +1,545 @@
+import io
+import json
+import math
+import os
+import threading
+from datetime import date as Date
+
+from flask import Blueprint, Response, current_app, g, jsonify, request, send_file
+
+import charts
+from auth import current_user
+import exporter
+import jobs
+from cache import LRUCache
+from currency import CURRENCY_RATES_TO_USD
+from importer import DECIMAL_SEPARATORS, ImportOptions, detect_format, import_statement
+from precompressed import PrecompressedAsset
+from rollups import summarize_month
+from store import ExpenseStore, ValidationError, validate_color, validate_expense, validate_month
+from workpool import PoolBusy, WorkPool
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+@api.before_request
+def authenticate():
+    """Every /api route acts for one user; in multi-user mode an unauthenticated request stops here."""
+    g.user = current_user()
+    if g.user is None:
+        return jsonify(error="Sign in required."), 401
+
+
+def get_store():
+    """The app's ExpenseStore, scoped to the user making this request."""
+    return current_app.extensions['expense_store'].for_user(g.user['id'])
+
+
+def _json_body():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ValidationError("Request body must be a JSON object.")
+    return payload
+
+
+@api.errorhandler(ValidationError)
+def handle_validation_error(error):
+    return jsonify(error=str(error)), 400
+
+
+@api.errorhandler(PoolBusy)
+def handle_pool_busy(error):
+    response = jsonify(error="The server is busy with other reports and exports; try again shortly.")
+    response.headers['Retry-After'] = '5'
+    return response, 503
+
+
+def get_work_pool():
+    """
+    The bounded pool (workpool.py) that runs reports and exports, sized by app.config['HEAVY_WORKERS']
+    and ['HEAVY_QUEUE']. Slow requests wait there instead of in the server's own threads, which stay
+    free for the page's quick requests.
+    """
+    pool = current_app.extensions.get('work_pool')
+    if pool is None:
+        pool = current_app.extensions.setdefault('work_pool', WorkPool(
+            current_app.config.get('HEAVY_WORKERS', 2), current_app.config.get('HEAVY_QUEUE', 2)))
+    return pool
+
+
+def _primary_currency():
+    """The ?primary= currency for converted totals (defaults to USD, like the page)."""
+    code = request.args.get('primary', 'USD').upper()
+    if code not in CURRENCY_RATES_TO_USD:
+        raise ValidationError(f"Unsupported currency {code!r}.")
+    return code
+
+
+def _month_range():
+    """Optional inclusive ?from=YYYY-MM / ?to=YYYY-MM bounds."""
+    start = request.args.get('from')
+    end = request.args.get('to')
+    return (validate_month(start) if start else None), (validate_month(end) if end else None)
+
+
+def _not_found(what):
+    return jsonify(error=f"{what} not found."), 404
+
+
+# --- EXPENSES ---
+
+def _page_cursor(expense):
+    return f"{expense['date']},{expense['id']}"
+
+
+def _parse_page_cursor(value):
+    """'YYYY-MM-DD,<id>' (the previous page's "next") -> (date, id)."""
+    try:
+        date, expense_id = value.split(',')
+        return Date.fromisoformat(date).isoformat(), int(expense_id)
+    except ValueError:
+        raise ValidationError(f"Invalid page cursor {value!r}.") from None
+
+
+@api.get('/expenses')
+def list_expenses():
+    """
+    Expenses newest first; ?month=YYYY-MM limits them to one month.
+    With ?limit=N the response is a keyset page whose "next" cursor is passed back as ?after= (null on the last page).
+    """
+    month = request.args.get('month')
+    if month is not None:
+        month = validate_month(month)
+
+    limit = request.args.get('limit', type=int)
+    if limit is None:
+        return jsonify(expenses=get_store().list_expenses(month))
+
+    limit = min(max(1, limit), 1000)
+    after = request.args.get('after')
+    after = _parse_page_cursor(after) if after else None
+    # Fetch one extra row to know whether another page exists.
+    expenses = get_store().list_expenses(month, limit + 1, after)
+    next_cursor = _page_cursor(expenses[limit - 1]) if len(expenses) > limit else None
+    return jsonify(expenses=expenses[:limit], next=next_cursor)
+
+
+@api.post('/expenses')
+def create_expense():
+    expense = validate_expense(_json_body())
+    return jsonify(get_store().add_expense(expense)), 201
+
+
+@api.post('/expenses/batch')
+def create_expenses():
+    """Bulk insert, used to migrate data a browser still holds in localStorage. Ids the user already has are skipped."""
+    payload = _json_body()
+    items = payload.get('expenses')
+    if not isinstance(items, list):
+        raise ValidationError("'expenses' must be a list.")
+    expenses = [validate_expense(item) for item in items]
+    return jsonify(inserted=get_store().add_expenses(expenses)), 201
+
+
+@api.get('/expenses/<int:expense_id>')
+def get_expense(expense_id):
+    expense = get_store().get_expense(expense_id)
+    return jsonify(expense) if expense else _not_found('Expense')
+
+
+@api.put('/expenses/<int:expense_id>')
+def update_expense(expense_id):
+    expense = get_store().update_expense(expense_id, validate_expense(_json_body()))
+    return jsonify(expense) if expense else _not_found('Expense')
+
+
+@api.delete('/expenses/<int:expense_id>')
+def delete_expense(expense_id):
+    if not get_store().delete_expense(expense_id):
+        return _not_found('Expense')
+    return '', 204
+
+
+def _date_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return Date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise ValidationError(f"'{name}' must be YYYY-MM-DD.") from None
+
+
+def _amount_arg(name):
+    value = request.args.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        raise ValidationError(f"'{name}' must be a number.") from None
+
+
+@api.get('/search')
+def search_expenses():
+    """
+    Ranked full-text search over categories and notes: every word of ?q= must start a word of the expense.
+    Optional filters: ?min= / ?max= amount (in the expense's own currency), ?from= / ?to= YYYY-MM-DD (inclusive);
+    ?limit= (default 50, at most 200).
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        raise ValidationError("Search query 'q' is required.")
+    limit = min(max(1, request.args.get('limit', 50, type=int)), 200)
+    results = get_store().search(
+        query, _amount_arg('min'), _amount_arg('max'), _date_arg('from'), _date_arg('to'), limit,
+    )
+    return jsonify(query=query, results=results)
+
+
+def _import_options(upload):
+    """(format, ImportOptions, chunk size) from an import request's query string."""
+    fmt = detect_format(upload.filename if upload else None, request.args.get('format'))
+    currency = request.args.get('currency')
+    if currency and currency.upper() not in CURRENCY_RATES_TO_USD:
+        raise ValidationError(f"Unsupported currency {currency!r}.")
+    decimal = request.args.get('decimal') or None
+    if decimal not in (None, *DECIMAL_SEPARATORS):
+        raise ValidationError(f"Unsupported decimal separator {decimal!r}; use '.' or ','.")
+    options = ImportOptions(
+        currency=currency.upper() if currency else None,
+        category=request.args.get('category', 'Other'),
+        negate=request.args.get('negate') in ('1', 'true', 'yes'),
+        date_format=request.args.get('date_format'),
+        decimal=decimal,
+    )
+    return fmt, options, max(1, request.args.get('chunk_size', 1000, type=int))
+
+
+@api.post('/import')
+def import_expenses():
+    """
+    Streams a CSV/OFX statement (multipart field 'file', or the raw request body) into the store.
+    Query: format=csv|ofx|auto, currency=, category=, negate=1, date_format=%d/%m/%Y, chunk_size=.
+    Responds with NDJSON progress/error events while the import runs.
+    """
+    upload = request.files.get('file')
+    if upload:
+        # Flask closes a request's uploads as soon as the view returns, but the import keeps
+        # reading while the response streams: take over the spooled file and close it ourselves.
+        stream, upload.stream = upload.stream, io.BytesIO()
+    else:
+        stream = request.stream
+    fmt, options, chunk_size = _import_options(upload)
+
+    events = import_statement(get_store(), stream, fmt, options, chunk_size)
+    response = Response((json.dumps(event) + '\n' for event in events), mimetype='application/x-ndjson')
+    response.call_on_close(stream.close)
+    return response
+
+
+@api.get('/export/<fmt>')
+def export_expenses(fmt):
+    """
+    Streams the whole history (or ?from=YYYY-MM..?to=YYYY-MM) as csv, ndjson or parquet,
+    month by month, with each amount also converted to ?primary=.
+    """
+    if fmt not in exporter.FORMATS:
+        return _not_found('Export format')
+    if fmt == 'parquet' and exporter.pq is None:
+        return jsonify(error="Parquet export needs pyarrow (pip install pyarrow)."), 501
+
+    start, end = _month_range()
+    store, primary = get_store(), _primary_currency()
+    mimetype, extension = exporter.FORMATS[fmt]
+    chunks = get_work_pool().stream(lambda: exporter.stream_export(store, fmt, primary, start, end))
+    return Response(chunks, mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename="expenses.{extension}"',
+    })
+
+
+# --- BACKGROUND JOBS ---
+
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """
+    The background job queue (jobs.py), opened on first use. Opening it hands queued jobs left by a
+    restart to the workers and prunes old finished ones.
+    """
+    queue = current_app.extensions.get('job_queue')
+    if queue is None:
+        with _job_queue_lock:
+            queue = current_app.extensions.get('job_queue')
+            if queue is None:
+                queue = jobs.JobQueue(current_app.config['JOBS_DB'], current_app.config['JOBS_DIR'],
+                                      current_app.extensions['expense_store'], current_app.config.get('JOB_WORKERS'))
+                queue.prune()
+                queue.resume()
+                current_app.extensions['job_queue'] = queue
+    return queue
+
+
+def _job_accepted(job):
+    response = jsonify(job)
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+
+@api.post('/jobs/import')
+def submit_import_job():
+    """
+    Queues a statement import (the same file and query as POST /api/import) and answers 202 with the job
+    at once. Poll GET /api/jobs/<id> for progress and the import summary.
+    """
+    upload = request.files.get('file')
+    fmt, options, chunk_size = _import_options(upload)
+    params = {'format': fmt, 'options': vars(options), 'chunk_size': chunk_size}
+    return _job_accepted(get_job_queue().submit(g.user['id'], 'import', params, upload or request.stream))
+
+
+@api.post('/jobs/export/<fmt>')
+def submit_export_job(fmt):
+    """Queues an export to a file (the same query as GET /api/export/<fmt>); download it from /api/jobs/<id>/file."""
+    if fmt not in exporter.FORMATS:
+        return _not_found('Export format')
+    if fmt == 'parquet' and exporter.pq is None:
+        return jsonify(error="Parquet export needs pyarrow (pip install pyarrow)."), 501
+    start, end = _month_range()
+    params = {'format': fmt, 'primary': _primary_currency(), 'from': start, 'to': end}
+    return _job_accepted(get_job_queue().submit(g.user['id'], 'export', params))
+
+
+@api.post('/jobs/rebuild-rollups')
+def submit_rebuild_rollups_job():
+    """Queues a rebuild of the monthly rollups behind /api/summary from the expenses."""
+    return _job_accepted(get_job_queue().submit(g.user['id'], 'rebuild-rollups', {}))
+
+
+@api.get('/jobs')
+def list_jobs():
+    """The user's most recent jobs (?limit=, default 50), newest first."""
+    limit = min(max(1, request.args.get('limit', 50, type=int)), 500)
+    return jsonify(jobs=get_job_queue().list_jobs(g.user['id'], limit))
+
+
+@api.get('/jobs/<int:job_id>')
+def get_job(job_id):
+    """A job's status, progress ({done, total}; total is null until known), result or error."""
+    job = get_job_queue().get(job_id, g.user['id'])
+    return jsonify(job) if job else _not_found('Job')
+
+
+@api.post('/jobs/<int:job_id>/cancel')
+def cancel_job(job_id):
+    """Cancels a queued job, or stops a running one at its next progress report."""
+    job = get_job_queue().cancel(job_id, g.user['id'])
+    return jsonify(job) if job else _not_found('Job')
+
+
+@api.get('/jobs/<int:job_id>/file')
+def download_job_file(job_id):
+    """The file a finished export job wrote."""
+    queue = get_job_queue()
+    job = queue.get(job_id, g.user['id'])
+    if not job or job['status'] != 'done' or not (job['result'] or {}).get('file'):
+        return _not_found('Job file')
+    name = job['result']['file']
+    path = queue.file_path(job_id, name)
+    if not os.path.exists(path):
+        return _not_found('Job file')  # pruned
+    return send_file(path, mimetype=exporter.FORMATS[job['params']['format']][0], as_attachment=True,
+                     download_name=name)
+
+
+# --- DELTA SYNC ---
+
+@api.get('/changes')
+def list_changes():
+    """
+    Delta sync: ?since=<cursor> returns only what changed after that cursor; no/stale cursor
+    returns a full snapshot. Keep calling with the returned cursor while "more" is true.
+    """
+    limit = min(max(1, request.args.get('limit', 5000, type=int)), 50000)
+    return jsonify(get_store().changes_since(request.args.get('since', ''), limit))
+
+
+# --- SUMMARIES ---
+
+@api.get('/summary/<month>')
+def month_summary(month):
+    """Per-category totals for a month, converted to ?primary=, from the incrementally maintained rollups."""
+    month = validate_month(month)
+    store = get_store()
+    return jsonify(summarize_month(month, store.month_rollups(month), _primary_currency(), store.get_budget(month)))
+
+
+@api.get('/report')
+def report():
+    """Totals by category, currency and month over ?from=YYYY-MM..?to=YYYY-MM (both optional), in ?primary=."""
+    from aggregate import ExpenseFrame  # NumPy is only needed for bulk reports
+
+    start, end = _month_range()
+    # Pool threads run outside the request: resolve everything that needs it here
+    store, rates, primary = get_store(), get_rate_table(), _primary_currency()
+    reporter, user_id = get_parallel_reporter(), g.user['id']
+
+    def compute():
+        if reporter is not None:
+            return reporter.report(start, end, primary, user_id=user_id)
+        return ExpenseFrame.from_store(store, start, end, rates=rates).report(primary)
+
+    return jsonify(get_work_pool().run(compute))
+
+
+def get_parallel_reporter():
+    """
+    The multi-core report engine (parallel_report.py) for histories of PARALLEL_MIN_ROWS rows or more,
+    with app.config['REPORT_WORKERS'] processes; None when that is 1 or the store isn't SQLite.
+    """
+    workers = current_app.config.get('REPORT_WORKERS', 1)
+    store = current_app.extensions['expense_store']
+    if workers <= 1 or not isinstance(store, ExpenseStore):
+        return None
+    reporter = current_app.extensions.get('parallel_reporter')
+    if reporter is None:
+        from parallel_report import ParallelReporter
+
+        reporter = current_app.extensions.setdefault(
+            'parallel_reporter', ParallelReporter(store, get_rate_table(), workers))
+    return reporter
+
+
+@api.get('/report/stream')
+def report_stream():
+    """
+    The /api/report totals as NDJSON, computed a year at a time: a {"event": "partial", "from", "to",
+    "report"} line per year with expenses, then {"event": "done", "report": <the whole range>}.
+    """
+    from aggregate import ExpenseFrame, merge_reports, year_partitions
+
+    start, end = _month_range()
+    store, rates, primary = get_store(), get_rate_table(), _primary_currency()
+
+    def events():
+        parts = []
+        for first, last in year_partitions(store.months(start, end)):
+            part = ExpenseFrame.from_store(store, first, last, rates=rates).report(primary)
+            parts.append(part)
+            yield {'event': 'partial', 'from': first, 'to': last, 'report': part}
+        yield {'event': 'done', 'report': merge_reports(parts, primary)}
+
+    lines = get_work_pool().stream(events)
+    response = Response((json.dumps(event) + '\n' for event in lines), mimetype='application/x-ndjson')
+    response.call_on_close(lines.close)
+    return response
+
+
+def get_rate_table():
+    """Historical exchange rates (rates.py), loaded from app.config['EXPENSE_RATES'] on first use."""
+    from rates import RateTable
+
+    table = current_app.extensions.get('rate_table')
+    if table is None:
+        table = current_app.extensions['rate_table'] = RateTable.load(current_app.config.get('EXPENSE_RATES'))
+    return table
+
+
+@api.get('/rates')
+def rates_as_of():
+    """USD rate of every currency in effect on ?date=YYYY-MM-DD (default today), from the historical table."""
+    try:
+        on = Date.fromisoformat(request.args.get('date') or Date.today().isoformat())
+    except ValueError:
+        raise ValidationError("Date must be YYYY-MM-DD.") from None
+    table = get_rate_table()
+    return jsonify(date=on.isoformat(), ratesToUsd=table.rates_on(on), historical=table.currencies())
+
+
+# --- SERVER-RENDERED CHARTS ---
+
+CHART_CACHE_SIZE = 256
+CHART_CACHE_USERS = 64
+
+
+def get_chart_cache():
+    """
+    This user's rendered charts, keyed by (month, primary, theme, format, data version). Each user gets
+    their own LRU (the least recently active users' caches are dropped first), so one busy account
+    can't evict everyone else's charts.
+    """
+    users = current_app.extensions.setdefault('chart_cache', LRUCache(CHART_CACHE_USERS))
+    return users.get_or_build(g.user['id'], lambda: LRUCache(CHART_CACHE_SIZE))
+
+
+@api.get('/charts/category/<month>.<fmt>')
+def category_chart(month, fmt):
+    """
+    The page's category pie as an image (svg or png), in ?primary= and ?theme=light|dark.
+    Any data change bumps the store's version, so cached renders never go stale; unchanged ones are served
+    from memory (and answered with 304 when the client already has them).
+    """
+    if fmt not in charts.FORMATS:
+        return _not_found('Chart format')
+    if fmt == 'png' and charts.Figure is None:
+        return jsonify(error="PNG charts need matplotlib (pip install matplotlib)."), 501
+    month = validate_month(month)
+    primary = _primary_currency()
+    theme = request.args.get('theme', 'light')
+    if theme not in charts.THEMES:
+        raise ValidationError(f"Unknown theme {theme!r}; use light or dark.")
+
+    store = get_store()
+
+    def render():
+        with store.read_transaction():
+            summary = summarize_month(month, store.month_rollups(month), primary)
+            saved_colors = store.list_category_colors()
+        body = charts.RENDERERS[fmt](summary, saved_colors, theme)
+        # PNG is already deflate-compressed; SVG text compresses well
+        return PrecompressedAsset(body, charts.FORMATS[fmt], compress=fmt == 'svg')
+
+    key = (month, primary, theme, fmt, store.data_version())
+    return get_chart_cache().get_or_build(key, render).respond(request)
+
+
+# --- BUDGETS & CATEGORY COLORS ---
+
+@api.get('/budgets')
+def list_budgets():
+    return jsonify(budgets=get_store().list_budgets())
+
+
+@api.put('/budgets/<month>')
+def set_budget(month):
+    month = validate_month(month)
+    try:
+        amount = float(_json_body().get('amount'))
+    except (TypeError, ValueError):
+        raise ValidationError("Budget amount must be a number.") from None
+    if not math.isfinite(amount):
+        raise ValidationError("Budget amount must be a finite number.")
+    if amount < 0:
+        raise ValidationError("Budget amount cannot be negative.")
+    get_store().set_budget(month, amount)
+    return jsonify(month=month, amount=amount)
+
+
+@api.get('/category-colors')
+def list_category_colors():
+    return jsonify(categoryColors=get_store().list_category_colors())
+
+
+@api.put('/category-colors/<path:category>')
+def set_category_color(category):
+    color = validate_color(_json_body().get('color'))
+    get_store().set_category_color(category, color)
+    return jsonify(category=category, color=color)
+
+
+@api.delete('/data')
+def clear_all_data():
+    get_store().clear_all()
+    return '', 204
@@ -1,12 +1,74 @@
+import atexit
 import os
+import secrets
+import sys
 import webbrowser
-from flask import Flask
+from datetime import datetime, timezone
+from flask import Flask, request
+from flask.cli import ScriptInfo
 from threading import Timer
 
+import click
+
+from api import api
+from auth import auth, create_user, issue_token, set_password
+from importer import DECIMAL_SEPARATORS, ImportOptions, detect_format, import_statement
+from journal import JournalStore
+import metrics
+from assets import AssetBundle
+from serving import default_workers, serve
+from store import DEFAULT_DB_PATH, ExpenseStore
+from vendor import VendorError, fetch_vendor, missing_vendor_files, vendored_files
+
 app = Flask(__name__)
 
 app.logger.setLevel('ERROR')
 
+# Server-side expense store (SQLite, WAL mode). Set EXPENSE_DB to use another database file, or
+# EXPENSE_JOURNAL=<directory> for the file-backed journal store (journal.py; one server process only).
+if os.environ.get('EXPENSE_JOURNAL'):
+    app.extensions['expense_store'] = JournalStore(
+        os.environ['EXPENSE_JOURNAL'], sync=os.environ.get('EXPENSE_JOURNAL_SYNC', 'always'),
+    )
+    atexit.register(app.extensions['expense_store'].close)
+else:
+    app.extensions['expense_store'] = ExpenseStore(os.environ.get('EXPENSE_DB', DEFAULT_DB_PATH))
+# Reports over PARALLEL_MIN_ROWS (1M) expenses or more are computed by EXPENSE_REPORT_WORKERS processes
+# (parallel_report.py; default: the CPU count, and 1 turns it off).
+app.config['REPORT_WORKERS'] = int(os.environ.get('EXPENSE_REPORT_WORKERS') or os.cpu_count() or 1)
+# Background jobs (jobs.py, /api/jobs/...): imports, exports and rollup rebuilds run in EXPENSE_JOB_WORKERS
+# processes (default: the CPU count). The queue is EXPENSE_JOBS_DB (default: expenses-jobs.db beside
+# expenses.db) and job files (uploads, finished exports) go in EXPENSE_JOBS_DIR (default: expenses-jobs-files).
+if os.environ.get('EXPENSE_JOURNAL'):
+    default_jobs_db = os.path.join(os.environ['EXPENSE_JOURNAL'], 'jobs.db')
+else:
+    default_jobs_db = os.path.splitext(app.extensions['expense_store'].path)[0] + '-jobs.db'
+app.config['JOBS_DB'] = os.environ.get('EXPENSE_JOBS_DB') or default_jobs_db
+app.config['JOBS_DIR'] = os.environ.get('EXPENSE_JOBS_DIR') or os.path.splitext(app.config['JOBS_DB'])[0] + '-files'
+app.config['JOB_WORKERS'] = int(os.environ.get('EXPENSE_JOB_WORKERS') or os.cpu_count() or 1)
+# Optional daily exchange-rate history (see rates.py); defaults to rates.csv next to this file.
+app.config['EXPENSE_RATES'] = os.environ.get('EXPENSE_RATES')
+# Shared deployments: EXPENSE_MULTI_USER=1 gives every account its own data behind a sign-in (see auth.py);
+# create accounts with `python app.py create-user NAME`, or let people sign up with EXPENSE_ALLOW_SIGNUP=1.
+app.config['MULTI_USER'] = os.environ.get('EXPENSE_MULTI_USER', '') in ('1', 'true', 'yes')
+app.config['ALLOW_SIGNUP'] = os.environ.get('EXPENSE_ALLOW_SIGNUP', '') in ('1', 'true', 'yes')
+# Signs the session cookie. Without EXPENSE_SECRET_KEY a random key is used and sign-ins end on restart.
+app.secret_key = os.environ.get('EXPENSE_SECRET_KEY') or secrets.token_hex(32)
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+# Opt-in instrumentation (metrics.py): EXPENSE_METRICS=1 serves latency/query/cache metrics at /metrics;
+# EXPENSE_PROFILE_RATE=0.01 profiles 1% of requests into EXPENSE_PROFILE_DIR (EXPENSE_PROFILER=pyinstrument for HTML).
+app.config['METRICS'] = os.environ.get('EXPENSE_METRICS', '') in ('1', 'true', 'yes')
+app.config['PROFILE_RATE'] = float(os.environ.get('EXPENSE_PROFILE_RATE') or 0)
+app.config['PROFILE_DIR'] = os.environ.get('EXPENSE_PROFILE_DIR', 'profiles')
+app.config['PROFILER'] = os.environ.get('EXPENSE_PROFILER', 'cprofile')
+# Reports and exports run in a bounded pool (workpool.py) so they can't occupy every server thread:
+# EXPENSE_HEAVY_WORKERS run at once (default half the CPUs), EXPENSE_HEAVY_QUEUE more wait, the rest get a 503.
+app.config['HEAVY_WORKERS'] = int(os.environ.get('EXPENSE_HEAVY_WORKERS') or max(1, (os.cpu_count() or 2) // 2))
+app.config['HEAVY_QUEUE'] = int(os.environ.get('EXPENSE_HEAVY_QUEUE') or app.config['HEAVY_WORKERS'])
+app.register_blueprint(api)
+app.register_blueprint(auth)
+metrics.install(app)
+
 HTML_CONTENT = """
 <!DOCTYPE html>
 <html lang="en">
@@ -14,8 +76,9 @@ HTML_CONTENT = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Dynamic Currency Expense Tracker</title>
-    <!-- 1. Include Chart.js Library for Data Visualization -->
-    <script src="https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"></script>
+    <!-- 1. Chart.js is loaded on demand by renderCharts(); self-hosted when vendored (see vendor.py) -->
+    <meta name="chart-js-src" content="https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js">
+    <link rel="preload" href="https://cdn.jsdelivr.net/npm/@fontsource-variable/inter@5.0.16/files/inter-latin-wght-normal.woff2" as="font" type="font/woff2" crossorigin>
     
     <!-- 2. All CSS Styles (Outstanding UI/UX) -->
     <style>
@@ -48,7 +111,13 @@ HTML_CONTENT = """
             --color-shadow: rgba(0, 0, 0, 0.4);
         }
 
-        @import url('https://fonts.googleapis.com/css2?family=Inter:wght@100..900&display=swap');
+        @font-face {
+            font-family: 'Inter';
+            font-style: normal;
+            font-weight: 100 900;
+            font-display: swap;
+            src: url('https://cdn.jsdelivr.net/npm/@fontsource-variable/inter@5.0.16/files/inter-latin-wght-normal.woff2') format('woff2');
+        }
 
         * {
             margin: 0;
@@ -256,20 +325,36 @@ HTML_CONTENT = """
         }
         
         /* Expense List */
+        /* Virtualized list: only the rows in view exist in the DOM, so rows have a fixed height */
         #expense-list {
             list-style: none;
             padding: 0;
             margin-top: 10px;
+            max-height: 616px; /* 8 rows */
+            overflow-y: auto;
         }
 
         .expense-item {
             display: flex;
             align-items: center;
             justify-content: space-between;
+            height: 77px; /* keep in sync with EXPENSE_ROW_HEIGHT */
             padding: 16px 0;
             border-bottom: 1px solid var(--color-border);
             transition: background-color 0.2s;
         }
+
+        .expense-item .details .category,
+        .expense-item .details .note {
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
+        }
+
+        .expense-spacer {
+            padding: 0;
+            border: none;
+        }
         
         .expense-item:hover {
             background-color: var(--color-bg);
@@ -366,6 +451,11 @@ HTML_CONTENT = """
                     Reset All Data
                 </button>
                 
+                <!-- Sign Out (multi-user servers only) -->
+                <button id="logout-btn" class="reset-btn" style="display: none; background-color: var(--color-text-secondary);">
+                    Sign Out
+                </button>
+                
                 <!-- Theme Toggle -->
                 <div id="theme-toggle" class="theme-switch" title="Toggle dark/light mode" 
                      style="font-size: 1.5rem; cursor: pointer; padding: 5px;">
@@ -421,7 +511,8 @@ HTML_CONTENT = """
                 <!-- Expense List Card -->
                 <div class="card" style="margin-top: 24px;">
                     <div class="card-header card-header-row">
-                        <h2>Recent Transactions</h2>
+                        <h2 id="expense-list-title">Recent Transactions</h2>
+                        <input type="search" id="expense-search" placeholder="Search notes and categories" aria-label="Search expenses" style="width: auto; padding: 8px 12px; font-size: 0.9rem;">
                     </div>
                     <ul id="expense-list">
                         <li id="no-expenses-msg" style="text-align: center; padding: 20px; color: var(--color-text-secondary); font-style: italic; display: none;">
@@ -535,6 +626,26 @@ HTML_CONTENT = """
         </div>
     </div>
 
+    <!-- Sign-in Modal (multi-user servers only) -->
+    <div id="login-modal" class="modal">
+        <div class="modal-content card">
+            <h2>Sign In</h2>
+            <form id="login-form">
+                <div class="form-group">
+                    <label for="login-username">Username</label>
+                    <input type="text" id="login-username" autocomplete="username" required>
+                </div>
+                <div class="form-group">
+                    <label for="login-password">Password</label>
+                    <input type="password" id="login-password" autocomplete="current-password" required>
+                </div>
+                <p id="login-error" style="color: var(--color-red); margin-bottom: 10px;"></p>
+                <input type="submit" value="Sign In" class="btn">
+                <button type="button" id="signup-btn" class="btn" style="display: none; background-color: var(--color-text-secondary); margin-top: 10px;">Create Account</button>
+            </form>
+        </div>
+    </div>
+
     <!-- 3. All JavaScript Logic -->
     <script>
         document.addEventListener('DOMContentLoaded', () => {
@@ -563,7 +674,9 @@ HTML_CONTENT = """
             
             const CURRENCY_OPTIONS = Object.keys(CURRENCY_RATES_TO_USD);
 
-            let allExpenses = [];
+            let allExpenses = new Map();      // id -> expense
+            let expensesByMonth = new Map();  // 'YYYY-MM' -> expenses, kept sorted newest first
+            let monthRollups = new Map();     // 'YYYY-MM' -> category -> currency -> { total, count }
             let allBudgets = {};
             let selectedMonth = ''; 
             let wasOverBudget = false; 
@@ -575,6 +688,23 @@ HTML_CONTENT = """
             let categoryColorMap = {};
             let categoryPieChart = null;
 
+            // Signed-in account ({ id, username }); the default account on single-user servers
+            let currentUser = null;
+            let resolveLogin = null;
+
+            // Delta sync state: the server change-log cursor and the IndexedDB cache it belongs to
+            const CACHE_DB_NAME = 'expense-tracker';
+            const CACHE_STORES = ['expenses', 'budgets', 'categoryColors', 'meta'];
+            let cacheDb = null;
+            let syncCursor = '';
+            let syncQueue = Promise.resolve();
+
+            // Search (results come from the server index; null when the search box is empty)
+            const SEARCH_DEBOUNCE_MS = 200;
+            let searchResults = null;
+            let searchTimer = null;
+            let searchRequest = 0;
+
             const EXPANDED_COLOR_PALETTE = [
                 '#0f76e6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6', 
                 '#06b6d4', '#f97316', '#34d399', '#6366f1', '#fb7185',
@@ -589,6 +719,8 @@ HTML_CONTENT = """
             const expenseForm = document.getElementById('expense-form');
             const expenseList = document.getElementById('expense-list');
             const noExpensesMsg = document.getElementById('no-expenses-msg');
+            const expenseListTitle = document.getElementById('expense-list-title');
+            const expenseSearch = document.getElementById('expense-search');
             const primaryCurrencySelector = document.getElementById('primary-currency-selector');
             const clearDataBtn = document.getElementById('clear-data-btn');
             
@@ -605,27 +737,24 @@ HTML_CONTENT = """
             const expenseCurrencySelect = document.getElementById('expense-currency');
             const editExpenseCurrencySelect = document.getElementById('edit-expense-currency');
 
+            // Edit Modal
+            const editModal = document.getElementById('edit-modal');
+            const editExpenseForm = document.getElementById('edit-expense-form');
 
-            function init() {
-                // Load data from localStorage
-                allExpenses = JSON.parse(localStorage.getItem('expenses')) || [];
-                allBudgets = JSON.parse(localStorage.getItem('budgets')) || {};
-                categoryColorMap = JSON.parse(localStorage.getItem('categoryColorMap')) || {};
-                
-                // Load global currency preference
-                primaryCurrencyCode = localStorage.getItem('primaryCurrencyCode') || 'USD';
-                primaryCurrencySymbol = CURRENCY_SYMBOLS[primaryCurrencyCode] || '$';
+            // Accounts
+            const loginModal = document.getElementById('login-modal');
+            const loginForm = document.getElementById('login-form');
+            const loginError = document.getElementById('login-error');
+            const signupBtn = document.getElementById('signup-btn');
+            const logoutBtn = document.getElementById('logout-btn');
 
 
-                // Set initial month to current month
-                const today = new Date();
-                const currentYear = today.getFullYear();
-                const currentMonth = String(today.getMonth() + 1).padStart(2, '0');
-                selectedMonth = `${currentYear}-${currentMonth}`;
-                monthPicker.value = selectedMonth;
+            async function init() {
+                // Load global currency preference (a per-browser setting, so it stays in localStorage)
+                primaryCurrencyCode = localStorage.getItem('primaryCurrencyCode') || 'USD';
+                primaryCurrencySymbol = CURRENCY_SYMBOLS[primaryCurrencyCode] || '$';
 
-                // Set today's date in expense form
-                document.getElementById('expense-date').value = dateToHTML(today);
+                resetToCurrentMonth();
 
                 // Setup currency selectors
                 setupCurrencySelectors();
@@ -635,15 +764,55 @@ HTML_CONTENT = """
                 budgetForm.addEventListener('submit', handleSetBudget);
                 expenseForm.addEventListener('submit', handleAddExpense);
                 expenseList.addEventListener('click', handleListActions);
+                expenseList.addEventListener('scroll', handleListScroll, { passive: true });
+                expenseSearch.addEventListener('input', handleSearchInput);
                 primaryCurrencySelector.addEventListener('change', handlePrimaryCurrencyChange);
                 clearDataBtn.addEventListener('click', showClearDataConfirmation);
                 themeToggle.addEventListener('click', toggleTheme);
+                editExpenseForm.addEventListener('submit', handleEditExpense);
+                document.getElementById('cancel-edit').addEventListener('click', closeEditModal);
+                loginForm.addEventListener('submit', e => {
+                    e.preventDefault();
+                    submitCredentials('/api/auth/login');
+                });
+                signupBtn.addEventListener('click', () => submitCredentials('/api/auth/register'));
+                logoutBtn.addEventListener('click', handleLogout);
+                document.addEventListener('visibilitychange', () => {
+                    if (document.visibilityState === 'visible') syncInBackground();
+                });
                 
                 // Load initial theme
                 loadTheme();
 
+                // Load data from the server (after signing in, on multi-user servers)
+                try {
+                    await ensureSignedIn();
+                    try {
+                        await migrateLocalStorageData();
+                    } catch (err) {
+                        // The old data stays in localStorage and the upload is retried on the next load
+                        showNotification(`Could not move the data saved in this browser to the server: ${err.message}`, 'error');
+                    }
+                    await loadData();
+                } catch (err) {
+                    showNotification(`Could not load your data: ${err.message}`, 'error');
+                }
+
                 // Initial render
                 updateUI();
+                performance.mark('expense-tracker-ready');
+            }
+
+            /** Selects the current month and defaults the expense form to today. */
+            function resetToCurrentMonth() {
+                const today = new Date();
+                const currentYear = today.getFullYear();
+                const currentMonth = String(today.getMonth() + 1).padStart(2, '0');
+                selectedMonth = `${currentYear}-${currentMonth}`;
+                monthPicker.value = selectedMonth;
+
+                // Set today's date in expense form
+                document.getElementById('expense-date').value = dateToHTML(today);
             }
 
             /** Populates the currency options in all relevant select elements. */
@@ -662,18 +831,347 @@ HTML_CONTENT = """
             }
 
             // --- DATA & STATE MANAGEMENT ---
-            
-            function saveData() {
-                localStorage.setItem('expenses', JSON.stringify(allExpenses));
-                localStorage.setItem('budgets', JSON.stringify(allBudgets));
-                localStorage.setItem('categoryColorMap', JSON.stringify(categoryColorMap)); 
-                localStorage.setItem('primaryCurrencyCode', primaryCurrencyCode);
+
+            /** Calls the JSON API; rejects with the server's error message on failure. */
+            async function api(path, options = {}) {
+                const response = await fetch(path, {
+                    ...options,
+                    headers: { 'Content-Type': 'application/json', ...(options.headers || {}) },
+                    body: options.body === undefined ? undefined : JSON.stringify(options.body),
+                });
+                if (response.status === 401 && currentUser && !path.startsWith('/api/auth/')) {
+                    // Signed out elsewhere (or the server restarted): start over at the sign-in form
+                    location.reload();
+                }
+                if (!response.ok) {
+                    const payload = await response.json().catch(() => ({}));
+                    throw new Error(payload.error || `Request failed (${response.status})`);
+                }
+                return response.status === 204 ? null : response.json();
+            }
+
+            // --- ACCOUNTS (multi-user servers) ---
+
+            /** Sets currentUser, showing the sign-in form first when the server needs it. */
+            async function ensureSignedIn() {
+                const session = await api('/api/auth/me');
+                currentUser = session.user || await promptLogin(session.signup);
+                if (session.multiUser) {
+                    logoutBtn.textContent = `Sign Out (${currentUser.username})`;
+                    logoutBtn.style.display = '';
+                }
+            }
+
+            /** Opens the sign-in modal; resolves with the user once sign-in (or sign-up) succeeds. */
+            function promptLogin(signupAllowed) {
+                signupBtn.style.display = signupAllowed ? '' : 'none';
+                loginModal.style.display = 'flex';
+                return new Promise(resolve => { resolveLogin = resolve; });
+            }
+
+            async function submitCredentials(path) {
+                loginError.textContent = '';
+                try {
+                    const result = await api(path, {
+                        method: 'POST',
+                        body: {
+                            username: document.getElementById('login-username').value.trim(),
+                            password: document.getElementById('login-password').value,
+                        },
+                    });
+                    loginModal.style.display = 'none';
+                    loginForm.reset();
+                    resolveLogin(result.user);
+                } catch (err) {
+                    loginError.textContent = err.message;
+                }
+            }
+
+            async function handleLogout() {
+                await api('/api/auth/logout', { method: 'POST' }).catch(() => {});
+                // Don't leave this account's offline copy behind on a shared computer
+                if (cacheDb) cacheDb.close();
+                if (window.indexedDB) indexedDB.deleteDatabase(cacheDbName());
+                location.reload();
+            }
+
+            /**
+             * One IndexedDB cache per account, so a shared browser never shows one person another's data.
+             * The default (single-user) account keeps the original name, and with it any existing cache.
+             */
+            function cacheDbName() {
+                return currentUser.id === 1 ? CACHE_DB_NAME : `${CACHE_DB_NAME}-user-${currentUser.id}`;
+            }
+
+            /**
+             * Shows the IndexedDB copy right away, then asks the server only for what changed since it was saved.
+             * A cold start (no cache) costs one full snapshot.
+             */
+            async function loadData() {
+                cacheDb = await openCache();
+                const cached = cacheDb ? await readCache().catch(() => null) : null;
+                if (cached && cached.cursor) {
+                    setExpenses(cached.expenses.sort(compareExpenses));
+                    allBudgets = Object.fromEntries(cached.budgets.map(b => [b.month, b.amount]));
+                    categoryColorMap = Object.fromEntries(cached.colors.map(c => [c.category, c.color]));
+                    syncCursor = cached.cursor;
+                }
+                await syncChanges();
+            }
+
+            // --- DELTA SYNC & OFFLINE CACHE ---
+
+            function idbRequest(request) {
+                return new Promise((resolve, reject) => {
+                    request.onsuccess = () => resolve(request.result);
+                    request.onerror = () => reject(request.error);
+                });
+            }
+
+            function openCache() {
+                if (!window.indexedDB) return Promise.resolve(null);
+                const request = indexedDB.open(cacheDbName(), 1);
+                request.onupgradeneeded = () => {
+                    const db = request.result;
+                    db.createObjectStore('expenses', { keyPath: 'id' });
+                    db.createObjectStore('budgets', { keyPath: 'month' });
+                    db.createObjectStore('categoryColors', { keyPath: 'category' });
+                    db.createObjectStore('meta');
+                };
+                return idbRequest(request).catch(() => null);
+            }
+
+            async function readCache() {
+                const tx = cacheDb.transaction(CACHE_STORES, 'readonly');
+                const [cursor, expenses, budgets, colors] = await Promise.all([
+                    idbRequest(tx.objectStore('meta').get('cursor')),
+                    idbRequest(tx.objectStore('expenses').getAll()),
+                    idbRequest(tx.objectStore('budgets').getAll()),
+                    idbRequest(tx.objectStore('categoryColors').getAll()),
+                ]);
+                return { cursor, expenses, budgets, colors };
+            }
+
+            /** Mirrors one /api/changes response into IndexedDB: O(changes), or a rewrite after a full snapshot. */
+            function writeCache(response) {
+                if (!cacheDb) return Promise.resolve();
+                const tx = cacheDb.transaction(CACHE_STORES, 'readwrite');
+                const stores = {
+                    expense: tx.objectStore('expenses'),
+                    budget: tx.objectStore('budgets'),
+                    categoryColor: tx.objectStore('categoryColors'),
+                };
+
+                if (response.full) {
+                    Object.values(stores).forEach(store => store.clear());
+                    response.expenses.forEach(exp => stores.expense.put(exp));
+                    Object.entries(response.budgets).forEach(([month, amount]) => stores.budget.put({ month, amount }));
+                    Object.entries(response.categoryColors).forEach(([category, color]) => stores.categoryColor.put({ category, color }));
+                } else {
+                    response.changes.forEach(change => {
+                        const store = stores[change.entity];
+                        if (change.op === 'delete') {
+                            store.delete(change.entity === 'expense' ? Number(change.key) : change.key);
+                        } else {
+                            store.put(change.data);
+                        }
+                    });
+                }
+                tx.objectStore('meta').put(response.cursor, 'cursor');
+
+                return new Promise((resolve, reject) => {
+                    tx.oncomplete = () => resolve();
+                    tx.onerror = () => reject(tx.error);
+                });
+            }
+
+            function sameExpense(a, b) {
+                return a && b && a.amount === b.amount && a.currencyCode === b.currencyCode &&
+                    a.category === b.category && a.date === b.date && a.note === b.note;
+            }
+
+            /** Applies one /api/changes response to the in-memory state; returns true if anything visible changed. */
+            function applyServerChanges(response) {
+                if (response.full) {
+                    setExpenses(response.expenses);
+                    allBudgets = response.budgets;
+                    categoryColorMap = response.categoryColors;
+                    return true;
+                }
+
+                let changed = false;
+                response.changes.forEach(change => {
+                    if (change.entity === 'expense') {
+                        const id = Number(change.key);
+                        // Our own writes come back through the log too; skip records we already hold
+                        if (change.op === 'upsert' && sameExpense(allExpenses.get(id), change.data)) return;
+                        removeExpenseFromState(id);
+                        if (change.op === 'upsert') addExpenseToState(change.data);
+                    } else if (change.entity === 'budget') {
+                        if (change.op === 'upsert' && allBudgets[change.key] === change.data.amount) return;
+                        if (change.op === 'upsert') allBudgets[change.key] = change.data.amount;
+                        else delete allBudgets[change.key];
+                    } else if (change.entity === 'categoryColor') {
+                        if (change.op === 'upsert' && categoryColorMap[change.key] === change.data.color) return;
+                        if (change.op === 'upsert') categoryColorMap[change.key] = change.data.color;
+                        else delete categoryColorMap[change.key];
+                    }
+                    changed = true;
+                });
+                return changed;
+            }
+
+            /** Pulls everything changed since syncCursor, applies and caches it. Calls are queued, never concurrent. */
+            function syncChanges() {
+                syncQueue = syncQueue.catch(() => {}).then(async () => {
+                    let changed = false;
+                    let response;
+                    do {
+                        response = await api(`/api/changes?since=${encodeURIComponent(syncCursor)}`);
+                        changed = applyServerChanges(response) || changed;
+                        await writeCache(response).catch(err => console.error('Could not update the offline cache', err));
+                        syncCursor = response.cursor;
+                    } while (response.more);
+                    return changed;
+                });
+                return syncQueue;
+            }
+
+            /** Sync after a local write (or when the tab regains focus) and re-render if another client changed something. */
+            function syncInBackground() {
+                syncChanges()
+                    .then(changed => { if (changed) updateUI(); })
+                    .catch(err => console.error('Sync failed', err));
+            }
+
+            /**
+             * One-time upload of data saved by older versions of the page in localStorage.
+             * The localStorage copies are removed only after the server has accepted them; a failure leaves
+             * them in place for the next page load (init() still loads the server's data).
+             */
+            async function migrateLocalStorageData() {
+                const legacyExpenses = JSON.parse(localStorage.getItem('expenses') || 'null');
+                const legacyBudgets = JSON.parse(localStorage.getItem('budgets') || 'null');
+                const legacyColors = JSON.parse(localStorage.getItem('categoryColorMap') || 'null');
+                if (!legacyExpenses && !legacyBudgets && !legacyColors) return;
+
+                if (legacyExpenses && legacyExpenses.length) {
+                    await api('/api/expenses/batch', { method: 'POST', body: { expenses: legacyExpenses } });
+                }
+                for (const [month, amount] of Object.entries(legacyBudgets || {})) {
+                    await api(`/api/budgets/${month}`, { method: 'PUT', body: { amount } });
+                }
+                for (const [category, color] of Object.entries(legacyColors || {})) {
+                    await api(`/api/category-colors/${encodeURIComponent(category)}`, { method: 'PUT', body: { color } });
+                }
+
+                localStorage.removeItem('expenses');
+                localStorage.removeItem('budgets');
+                localStorage.removeItem('categoryColorMap');
             }
             
+            /** Newest first: ISO dates compare correctly as strings; ties fall back to id (insertion order). */
+            function compareExpenses(a, b) {
+                if (a.date !== b.date) return a.date < b.date ? 1 : -1;
+                return b.id - a.id;
+            }
+
+            /** Binary search for the position of `exp` in a month bucket. */
+            function bucketPosition(bucket, exp) {
+                let lo = 0;
+                let hi = bucket.length;
+                while (lo < hi) {
+                    const mid = (lo + hi) >>> 1;
+                    if (compareExpenses(bucket[mid], exp) < 0) lo = mid + 1;
+                    else hi = mid;
+                }
+                return lo;
+            }
+
+            function setExpenses(expenses) {
+                allExpenses = new Map();
+                expensesByMonth = new Map();
+                monthRollups = new Map();
+                expenses.forEach(addExpenseToState);
+            }
+
+            /** Adds (sign = 1) or removes (sign = -1) an expense from its month's category/currency rollup. */
+            function applyToRollup(exp, sign) {
+                const month = exp.date.slice(0, 7);
+                let categories = monthRollups.get(month);
+                if (!categories) {
+                    categories = new Map();
+                    monthRollups.set(month, categories);
+                }
+                let currencies = categories.get(exp.category);
+                if (!currencies) {
+                    currencies = new Map();
+                    categories.set(exp.category, currencies);
+                }
+                const cell = currencies.get(exp.currencyCode) || { total: 0, count: 0 };
+                cell.total += sign * exp.amount;
+                cell.count += sign;
+
+                if (cell.count > 0) {
+                    currencies.set(exp.currencyCode, cell);
+                    return;
+                }
+                currencies.delete(exp.currencyCode);
+                if (currencies.size === 0) categories.delete(exp.category);
+                if (categories.size === 0) monthRollups.delete(month);
+            }
+
+            function addExpenseToState(exp) {
+                const month = exp.date.slice(0, 7);
+                let bucket = expensesByMonth.get(month);
+                if (!bucket) {
+                    bucket = [];
+                    expensesByMonth.set(month, bucket);
+                }
+                // Rows arrive sorted from the server, so this is usually an append
+                const last = bucket[bucket.length - 1];
+                if (!last || compareExpenses(last, exp) < 0) {
+                    bucket.push(exp);
+                } else {
+                    bucket.splice(bucketPosition(bucket, exp), 0, exp);
+                }
+                allExpenses.set(exp.id, exp);
+                applyToRollup(exp, 1);
+            }
+
+            function removeExpenseFromState(id) {
+                const exp = allExpenses.get(id);
+                if (!exp) return;
+                const month = exp.date.slice(0, 7);
+                const bucket = expensesByMonth.get(month);
+                const index = bucketPosition(bucket, exp);
+                if (bucket[index] === exp) bucket.splice(index, 1);
+                if (bucket.length === 0) expensesByMonth.delete(month);
+                allExpenses.delete(id);
+                applyToRollup(exp, -1);
+            }
+
+            /** The month's expenses, newest first. O(1): the bucket is already sorted; callers must not mutate it. */
             function getExpensesForMonth(month) {
-                return allExpenses
-                    .filter(exp => exp.date.startsWith(month))
-                    .sort((a, b) => new Date(b.date) - new Date(a.date));
+                return expensesByMonth.get(month) || [];
+            }
+
+            /**
+             * Per-category totals for a month in the primary currency, computed from the rollup.
+             * Cost depends on the number of categories and currencies used, not on the number of expenses.
+             */
+            function getCategoryTotalsForMonth(month) {
+                const totals = {};
+                const categories = monthRollups.get(month);
+                if (!categories) return totals;
+                for (const [category, currencies] of categories) {
+                    let sum = 0;
+                    for (const [code, cell] of currencies) {
+                        sum += convertToPrimary(cell.total, code);
+                    }
+                    totals[category] = sum;
+                }
+                return totals;
             }
 
             function getBudgetForMonth(month) {
@@ -708,7 +1206,9 @@ HTML_CONTENT = """
                 const newColor = EXPANDED_COLOR_PALETTE[paletteIndex];
                 
                 categoryColorMap[category] = newColor;
-                saveData();
+                api(`/api/category-colors/${encodeURIComponent(category)}`, { method: 'PUT', body: { color: newColor } })
+                    .then(syncInBackground)
+                    .catch(err => console.error('Could not save category color', err));
                 return newColor;
             }
             
@@ -728,18 +1228,64 @@ HTML_CONTENT = """
                 
                 // Get current month's data
                 const currentBudget = getBudgetForMonth(selectedMonth); 
-                const currentExpenses = getExpensesForMonth(selectedMonth);
+                const categoryTotals = getCategoryTotalsForMonth(selectedMonth);
                 
+                // Make sure every category shown this month has a color (only new ones are assigned and saved)
+                Object.keys(categoryTotals).forEach(getCategoryColor);
+
                 // Update views
-                updateDashboard(currentBudget, currentExpenses);
-                renderExpenseList(currentExpenses);
-                renderCharts(currentExpenses);
+                updateDashboard(currentBudget, categoryTotals);
+                renderTransactions();
+                renderCharts(categoryTotals);
+                // Data changed: the search results may have too
+                if (searchResults) runSearch();
+            }
+
+            /** The selected month's expenses, or the search results while the search box has a query. */
+            function renderTransactions() {
+                if (searchResults) {
+                    // Show the local copies, so edits and deletes made since the search show up
+                    const results = searchResults.map(exp => allExpenses.get(exp.id)).filter(Boolean);
+                    expenseListTitle.textContent = `Search Results (${results.length})`;
+                    noExpensesMsg.textContent = 'No expenses match your search.';
+                    renderExpenseList(results);
+                } else {
+                    expenseListTitle.textContent = 'Recent Transactions';
+                    noExpensesMsg.textContent = 'No expenses recorded for this month.';
+                    renderExpenseList(getExpensesForMonth(selectedMonth));
+                }
+            }
+
+            // --- SEARCH ---
+
+            function handleSearchInput() {
+                clearTimeout(searchTimer);
+                searchTimer = setTimeout(runSearch, SEARCH_DEBOUNCE_MS);
+            }
+
+            /** Ranked search on the server; a response that arrives after a newer query was typed is dropped. */
+            async function runSearch() {
+                const query = expenseSearch.value.trim();
+                const request = ++searchRequest;
+                if (!query) {
+                    searchResults = null;
+                    renderTransactions();
+                    return;
+                }
+                try {
+                    const { results } = await api(`/api/search?q=${encodeURIComponent(query)}&limit=200`);
+                    if (request !== searchRequest) return;
+                    searchResults = results;
+                    renderTransactions();
+                } catch (err) {
+                    if (request === searchRequest) showNotification(`Search failed: ${err.message}`, 'error');
+                }
             }
 
             // --- DASHBOARD UPDATER ---
-            function updateDashboard(budget, expenses) {
+            function updateDashboard(budget, categoryTotals) {
                 // Calculate total spent in Primary Currency
-                const spentInPrimary = expenses.reduce((sum, exp) => sum + convertToPrimary(exp.amount, exp.currencyCode), 0);
+                const spentInPrimary = Object.values(categoryTotals).reduce((sum, total) => sum + total, 0);
                 const left = budget - spentInPrimary;
 
                 // Dashboard displays are all in the Primary Currency
@@ -771,76 +1317,175 @@ HTML_CONTENT = """
             }
 
             // --- EXPENSE LIST RENDERER ---
+            // Windowed rendering: the list scrolls inside a fixed-height box and only the rows in view
+            // (plus OVERSCAN on each side) are in the DOM; spacers stand in for the rest.
+
+            const EXPENSE_ROW_HEIGHT = 77;
+            const OVERSCAN = 6;
+            const topSpacer = document.createElement('li');
+            const bottomSpacer = document.createElement('li');
+            topSpacer.className = bottomSpacer.className = 'expense-spacer';
+            let listExpenses = [];
+            let renderedWindow = null;
+            let scrollFramePending = false;
+
             function renderExpenseList(expenses) {
-                expenseList.innerHTML = ''; 
+                if (expenses !== listExpenses) expenseList.scrollTop = 0;
+                listExpenses = expenses;
+                renderedWindow = null;
 
                 if (expenses.length === 0) {
-                    expenseList.appendChild(noExpensesMsg);
+                    expenseList.replaceChildren(noExpensesMsg);
                     noExpensesMsg.style.display = 'block';
                     return;
                 }
                 noExpensesMsg.style.display = 'none';
+                renderVisibleRows();
+            }
 
-                expenses.forEach(exp => {
-                    const li = document.createElement('li');
-                    li.className = 'expense-item';
-                    li.dataset.id = exp.id;
+            function handleListScroll() {
+                if (scrollFramePending) return;
+                scrollFramePending = true;
+                requestAnimationFrame(() => {
+                    scrollFramePending = false;
+                    renderVisibleRows();
+                });
+            }
 
-                    const categoryIcon = getCategoryIconEmoji(exp.category);
-                    const categoryColor = getCategoryColor(exp.category);
-                    
-                    // Display amount in the primary currency for comparison
-                    const primaryAmount = convertToPrimary(exp.amount, exp.currencyCode);
+            /** Renders just the rows intersecting the viewport: cost depends on the viewport, not the month's size. */
+            function renderVisibleRows() {
+                const total = listExpenses.length;
+                if (total === 0) return;
 
-                    li.innerHTML = `
-                        <div class="icon" data-category="${exp.category}" title="${exp.category}">
-                            ${categoryIcon}
-                        </div>
-                        <div class="details">
-                            <div class="category">${exp.category} (${exp.currencyCode} recorded)</div>
-                            <div class="note">${exp.note || 'No notes'}</div>
-                        </div>
-                        <div class="amount-date">
-                            <div class="amount">-${formatCurrency(primaryAmount)}</div>
-                            <div class="date">${exp.date}</div>
-                        </div>
-                        <div class="actions">
-                            <button class="btn-icon btn-edit" title="Edit Expense" onclick="openEditModal(${exp.id})" style="background: none; border: none; cursor: pointer; color: var(--color-primary);">
-                                <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><path d="M11 4H4a2 2 0 0 0-2 2v14a2 2 0 0 0 2 2h14a2 2 0 0 0 2-2v-7"></path><path d="M18.5 2.5a2.121 2.121 0 0 1 3 3L12 15l-4 1 1-4 9.5-9.5z"></path></svg>
-                            </button>
-                        </div>
-                    `;
-                    li.querySelector('.icon').style.backgroundColor = categoryColor;
-                    
-                    expenseList.appendChild(li);
-                });
+                const viewportHeight = expenseList.clientHeight || 8 * EXPENSE_ROW_HEIGHT;
+                const scrollTop = expenseList.scrollTop;
+                const first = Math.max(0, Math.floor(scrollTop / EXPENSE_ROW_HEIGHT) - OVERSCAN);
+                const last = Math.min(total, Math.ceil((scrollTop + viewportHeight) / EXPENSE_ROW_HEIGHT) + OVERSCAN);
+                if (renderedWindow && renderedWindow.first === first && renderedWindow.last === last) return;
+                renderedWindow = { first, last };
+
+                topSpacer.style.height = `${first * EXPENSE_ROW_HEIGHT}px`;
+                bottomSpacer.style.height = `${(total - last) * EXPENSE_ROW_HEIGHT}px`;
+
+                const rows = [];
+                for (let i = first; i < last; i++) {
+                    rows.push(buildExpenseRow(listExpenses[i]));
+                }
+                expenseList.replaceChildren(topSpacer, ...rows, bottomSpacer);
+            }
+
+            function buildExpenseRow(exp) {
+                const li = document.createElement('li');
+                li.className = 'expense-item';
+                li.dataset.id = exp.id;
+
+                const category = escapeHTML(exp.category);
+                const categoryIcon = getCategoryIconEmoji(exp.category);
+                // Colors are assigned per category in updateUI(); rendering only reads them
+                const categoryColor = categoryColorMap[exp.category] || EXPANDED_COLOR_PALETTE[0];
+
+                // Display amount in the primary currency for comparison
+                const primaryAmount = convertToPrimary(exp.amount, exp.currencyCode);
+
+                li.innerHTML = `
+                    <div class="icon" data-category="${category}" title="${category}">
+                        ${categoryIcon}
+                    </div>
+                    <div class="details">
+                        <div class="category">${category} (${exp.currencyCode} recorded)</div>
+                        <div class="note">${escapeHTML(exp.note || 'No notes')}</div>
+                    </div>
+                    <div class="amount-date">
+                        <div class="amount">-${formatCurrency(primaryAmount)}</div>
+                        <div class="date">${exp.date}</div>
+                    </div>
+                    <div class="actions">
+                        <button class="btn-icon btn-edit" title="Edit Expense" style="background: none; border: none; cursor: pointer; color: var(--color-primary);">
+                            <svg xmlns="http://www.w3.org/2000/svg" width="18" height="18" viewBox="0 0 24 24" fill="none" stroke="currentColor" stroke-width="2" stroke-linecap="round" stroke-linejoin="round"><path d="M11 4H4a2 2 0 0 0-2 2v14a2 2 0 0 0 2 2h14a2 2 0 0 0 2-2v-7"></path><path d="M18.5 2.5a2.121 2.121 0 0 1 3 3L12 15l-4 1 1-4 9.5-9.5z"></path></svg>
+                        </button>
+                    </div>
+                `;
+                li.querySelector('.icon').style.backgroundColor = categoryColor;
+                return li;
             }
 
             // --- CHART RENDERING (ONLY PIE) ---
             
-            function renderCharts(expenses) {
-                const ctx = document.getElementById('category-pie-chart').getContext('2d');
-                const isDarkMode = document.body.classList.contains('dark-mode');
-                const colors = {
-                    text: isDarkMode ? '#f1f5f9' : '#1e293b',
-                    grid: isDarkMode ? '#475569' : '#e2e8f0'
-                };
-                
-                // Group expenses by category (converted to Primary Currency)
-                const categoryTotals = expenses.reduce((acc, exp) => {
-                    const amountInPrimary = convertToPrimary(exp.amount, exp.currencyCode);
-                    acc[exp.category] = (acc[exp.category] || 0) + amountInPrimary;
-                    return acc;
-                }, {});
+            let chartJsLoading = null;
+            let pendingChartTotals = null;
+
+            /** Injects the Chart.js script once; resolves when `Chart` is defined. */
+            function loadChartJs() {
+                if (!chartJsLoading) {
+                    chartJsLoading = new Promise((resolve, reject) => {
+                        const script = document.createElement('script');
+                        script.src = document.querySelector('meta[name="chart-js-src"]').content;
+                        script.async = true;
+                        script.onload = resolve;
+                        script.onerror = () => {
+                            chartJsLoading = null;
+                            reject(new Error('Chart.js could not be loaded.'));
+                        };
+                        document.head.appendChild(script);
+                    });
+                }
+                return chartJsLoading;
+            }
+
+            function renderCharts(categoryTotals) {
+                if (typeof Chart === 'undefined') {
+                    // Renders requested while loading collapse into one, with the latest totals
+                    // (an empty month too, so the previous month's totals aren't drawn once it loads)
+                    const loadPending = pendingChartTotals !== null;
+                    if (loadPending) {
+                        pendingChartTotals = categoryTotals;
+                        return;
+                    }
+                    // Nothing to draw yet: an empty month never downloads the library
+                    if (Object.keys(categoryTotals).length === 0) return;
+                    pendingChartTotals = categoryTotals;
+                    loadChartJs().then(() => {
+                        const totals = pendingChartTotals;
+                        pendingChartTotals = null;
+                        if (Object.keys(totals).length > 0) renderCharts(totals);
+                    }, err => {
+                        pendingChartTotals = null;
+                        showNotification(err.message, 'warning');
+                    });
+                    return;
+                }
 
                 const labels = Object.keys(categoryTotals);
                 const data = Object.values(categoryTotals);
-                const backgroundColors = labels.map(label => getCategoryColor(label)); 
+                const backgroundColors = labels.map(label => getCategoryColor(label));
+                const title = `Expenses by Category (Total in ${primaryCurrencyCode})`;
 
-                if (categoryPieChart) {
-                    categoryPieChart.destroy();
+                if (!categoryPieChart) {
+                    createPieChart(labels, data, backgroundColors, title);
+                    return;
                 }
 
+                // Patch the existing chart in place: no new canvas state, layout or plugin setup
+                const dataset = categoryPieChart.data.datasets[0];
+                categoryPieChart.data.labels = labels;
+                dataset.data = data;
+                dataset.backgroundColor = backgroundColors;
+                categoryPieChart.options.plugins.title.text = title;
+                categoryPieChart.update();
+            }
+
+            function chartThemeColors() {
+                const isDarkMode = document.body.classList.contains('dark-mode');
+                return {
+                    text: isDarkMode ? '#f1f5f9' : '#1e293b',
+                    grid: isDarkMode ? '#475569' : '#e2e8f0'
+                };
+            }
+
+            function createPieChart(labels, data, backgroundColors, title) {
+                const ctx = document.getElementById('category-pie-chart').getContext('2d');
+                const colors = chartThemeColors();
+
                 categoryPieChart = new Chart(ctx, {
                     type: 'pie',
                     data: {
@@ -862,7 +1507,7 @@ HTML_CONTENT = """
                             },
                             title: {
                                 display: true,
-                                text: `Expenses by Category (Total in ${primaryCurrencyCode})`,
+                                text: title,
                                 color: colors.text,
                                 font: { size: 14, weight: 'bold' }
                             }
@@ -870,6 +1515,17 @@ HTML_CONTENT = """
                     }
                 });
             }
+
+            /** Recolors the chart for the current theme; the data is untouched, so nothing animates. */
+            function applyChartTheme() {
+                if (!categoryPieChart) return;
+                const colors = chartThemeColors();
+                const { plugins } = categoryPieChart.options;
+                categoryPieChart.data.datasets[0].borderColor = colors.grid;
+                plugins.legend.labels.color = colors.text;
+                plugins.title.color = colors.text;
+                categoryPieChart.update('none');
+            }
             
             // --- EVENT HANDLERS ---
             
@@ -879,7 +1535,7 @@ HTML_CONTENT = """
                 primaryCurrencySymbol = selectedOption.dataset.symbol;
                 
                 // Save and update the entire UI
-                saveData();
+                localStorage.setItem('primaryCurrencyCode', primaryCurrencyCode);
                 updateUI();
                 showNotification(`Primary currency set to ${primaryCurrencyCode}`, 'info');
             }
@@ -890,7 +1546,7 @@ HTML_CONTENT = """
                 updateUI();
             }
 
-            function handleSetBudget(e) {
+            async function handleSetBudget(e) {
                 e.preventDefault();
                 const amount = parseFloat(document.getElementById('budget-amount').value);
                 if (isNaN(amount) || amount < 0) {
@@ -899,13 +1555,20 @@ HTML_CONTENT = """
                 }
                 
                 // Budget is stored in the currently selected primary currency
-                allBudgets[selectedMonth] = amount;
-                saveData();
+                const month = selectedMonth;
+                try {
+                    await api(`/api/budgets/${month}`, { method: 'PUT', body: { amount } });
+                } catch (err) {
+                    showNotification(`Could not save budget: ${err.message}`, 'error');
+                    return;
+                }
+                allBudgets[month] = amount;
                 updateUI();
+                syncInBackground();
                 showNotification("Budget set successfully!", 'success');
             }
 
-            function handleAddExpense(e) {
+            async function handleAddExpense(e) {
                 e.preventDefault();
                 const amount = parseFloat(document.getElementById('expense-amount').value);
                 // Note: We record the original input currency code, not the primary code
@@ -921,17 +1584,26 @@ HTML_CONTENT = """
                 
                 getCategoryColor(category);
 
-                const newExpense = {
-                    id: new Date().getTime(),
-                    amount: amount,
-                    currencyCode: currencyCode, // Store original code
-                    category: category,
-                    date: date,
-                    note: note
-                };
+                let newExpense;
+                try {
+                    // Only the new record is sent; the server assigns its id
+                    newExpense = await api('/api/expenses', {
+                        method: 'POST',
+                        body: {
+                            amount: amount,
+                            currencyCode: currencyCode, // Store original code
+                            category: category,
+                            date: date,
+                            note: note
+                        }
+                    });
+                } catch (err) {
+                    showNotification(`Could not save expense: ${err.message}`, 'error');
+                    return;
+                }
 
-                allExpenses.push(newExpense);
-                saveData();
+                addExpenseToState(newExpense);
+                syncInBackground();
                 
                 if (newExpense.date.startsWith(selectedMonth)) {
                     updateUI();
@@ -965,34 +1637,85 @@ HTML_CONTENT = """
                 cancelActionBtn.onclick = () => confirmationModal.style.display = 'none';
             }
 
-            function handleClearAllData() {
+            async function handleClearAllData() {
                 confirmationModal.style.display = 'none';
                 
-                // Clear localStorage items
-                localStorage.removeItem('expenses');
-                localStorage.removeItem('budgets');
-                localStorage.removeItem('categoryColorMap');
+                // Clear server-side data
+                try {
+                    await api('/api/data', { method: 'DELETE' });
+                } catch (err) {
+                    showNotification(`Could not clear data: ${err.message}`, 'error');
+                    return;
+                }
                 localStorage.removeItem('primaryCurrencyCode');
                 
                 // Reset internal state
-                allExpenses = [];
+                setExpenses([]);
                 allBudgets = {};
                 categoryColorMap = {};
                 primaryCurrencyCode = 'USD';
                 primaryCurrencySymbol = '$';
                 
-                // Re-initialize and update UI
-                init();
+                // Reset the view and update UI
+                resetToCurrentMonth();
+                setupCurrencySelectors();
+                updateUI();
+                syncInBackground(); // picks up the new (empty) snapshot and clears the offline cache
                 
                 showNotification("All data has been cleared and reset to default.", 'success');
             }
 
 
-            // --- EDIT MODAL LOGIC --- (Simplified as a placeholder for now)
+            // --- EDIT MODAL LOGIC ---
             window.openEditModal = function(id) {
-                 // For now, we will simply notify that the edit feature needs implementation
-                 showNotification("Edit functionality is currently disabled. Use the Reset button to start over.", 'warning');
-                 // In a full application, this would populate the edit modal fields and display it.
+                const expense = allExpenses.get(Number(id));
+                if (!expense) return;
+
+                document.getElementById('edit-expense-id').value = expense.id;
+                document.getElementById('edit-expense-amount').value = expense.amount;
+                editExpenseCurrencySelect.value = expense.currencyCode;
+                document.getElementById('edit-expense-category').value = expense.category;
+                document.getElementById('edit-expense-date').value = expense.date;
+                document.getElementById('edit-expense-note').value = expense.note || '';
+                editModal.style.display = 'flex';
+            }
+
+            function closeEditModal() {
+                editModal.style.display = 'none';
+            }
+
+            async function handleEditExpense(e) {
+                e.preventDefault();
+                const id = Number(document.getElementById('edit-expense-id').value);
+                const changes = {
+                    amount: parseFloat(document.getElementById('edit-expense-amount').value),
+                    currencyCode: editExpenseCurrencySelect.value,
+                    category: document.getElementById('edit-expense-category').value.trim(),
+                    date: document.getElementById('edit-expense-date').value,
+                    note: document.getElementById('edit-expense-note').value.trim()
+                };
+
+                if (!changes.amount || !changes.currencyCode || !changes.category || !changes.date) {
+                    showNotification("Please fill in all required fields.", 'warning');
+                    return;
+                }
+
+                let updated;
+                try {
+                    updated = await api(`/api/expenses/${id}`, { method: 'PUT', body: changes });
+                } catch (err) {
+                    showNotification(`Could not update expense: ${err.message}`, 'error');
+                    return;
+                }
+
+                getCategoryColor(updated.category);
+                removeExpenseFromState(id);
+                addExpenseToState(updated);
+                syncInBackground();
+
+                closeEditModal();
+                updateUI();
+                showNotification("Expense updated.", 'success');
             }
 
             // --- THEME & UTILITIES ---
@@ -1008,8 +1731,8 @@ HTML_CONTENT = """
                 }
                 localStorage.setItem('theme', theme);
                 
-                // Re-render charts to pick up new color scheme
-                updateUI();
+                // Everything else follows the CSS variables; only the canvas needs new colors
+                applyChartTheme();
             }
             
             function loadTheme() {
@@ -1022,6 +1745,11 @@ HTML_CONTENT = """
                 }
             }
             
+            // Building an Intl.NumberFormat is the expensive part: keep one per (currency, display symbol)
+            const currencyFormatters = new Map();
+            // The tokens en-US formatting may emit for our currencies, in one pass (INR/NPR codes are dropped)
+            const CURRENCY_TOKEN = /[$£€¥]|INR|NPR|Rs\./;
+
             /**
              * Formats amount using the primary currency symbol.
              * @param {number} amount - Amount in the primary currency.
@@ -1032,19 +1760,31 @@ HTML_CONTENT = """
             function formatCurrency(amount, overrideCode = primaryCurrencyCode, useOverride = false) {
                 const code = useOverride ? overrideCode : primaryCurrencyCode;
                 const symbol = useOverride ? CURRENCY_SYMBOLS[overrideCode] : primaryCurrencySymbol;
-                
-                const formatted = new Intl.NumberFormat('en-US', {
-                    style: 'currency',
-                    currency: code,
-                    currencyDisplay: 'symbol',
-                    minimumFractionDigits: 2,
-                    maximumFractionDigits: 2
-                }).format(Math.abs(amount));
-
-                // Replace the default symbol with our custom one if needed (e.g., 'रु')
-                return formatted.replace('$', symbol).replace('£', symbol).replace('€', symbol).replace('¥', symbol).replace('INR', '').replace('NPR', '').replace('Rs.', symbol).trim();
+
+                const key = `${code}|${symbol}`;
+                let format = currencyFormatters.get(key);
+                if (!format) {
+                    const numberFormat = new Intl.NumberFormat('en-US', {
+                        style: 'currency',
+                        currency: code,
+                        currencyDisplay: 'symbol',
+                        minimumFractionDigits: 2,
+                        maximumFractionDigits: 2
+                    });
+                    // Replace the default symbol with our custom one if needed (e.g., 'रु')
+                    const replaceToken = token => (token === 'INR' || token === 'NPR' ? '' : symbol);
+                    format = value => numberFormat.format(value).replace(CURRENCY_TOKEN, replaceToken).trim();
+                    currencyFormatters.set(key, format);
+                }
+                return format(Math.abs(amount));
             }
             
+            function escapeHTML(text) {
+                return String(text).replace(/[&<>"']/g, ch => (
+                    { '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;' }[ch]
+                ));
+            }
+
             function dateToHTML(date) {
                 const y = date.getFullYear();
                 const m = String(date.getMonth() + 1).padStart(2, '0');
@@ -1117,10 +1857,131 @@ HTML_CONTENT = """
 </html>
 """
 
+# Split into a small HTML shell plus fingerprinted CSS/JS (and vendored Chart.js/fonts), compressed once
+# at import time; every request just picks a ready-made representation.
+ASSETS = AssetBundle(
+    HTML_CONTENT,
+    last_modified=datetime.fromtimestamp(os.path.getmtime(__file__), timezone.utc),
+    vendor=vendored_files(),
+)
+
 @app.route('/')
 def home():
-    """Returns the single-file HTML application content."""
-    return HTML_CONTENT
+    """Returns the HTML shell (precompressed, revalidated by ETag)."""
+    return ASSETS.page.respond(request)
+
+@app.route('/assets/<name>')
+def asset(name):
+    """Serves a fingerprinted stylesheet/script; its name changes whenever its content does."""
+    bundle_asset = ASSETS.get(name)
+    if bundle_asset is None:
+        return {'error': 'Asset not found.'}, 404
+    return bundle_asset.respond(request)
+
+@app.cli.command('import')
+@click.argument('statement', type=click.File('rb'))
+@click.option('--format', 'fmt', type=click.Choice(['auto', 'csv', 'ofx']), default='auto', show_default=True)
+@click.option('--currency', help='Currency for rows without one (OFX files default to their CURDEF).')
+@click.option('--category', default='Other', show_default=True, help='Category for rows without one.')
+@click.option('--negate', is_flag=True, help='Flip amount signs (for statements that record debits as negative).')
+@click.option('--date-format', help='strptime format for non-ISO dates, e.g. %d/%m/%Y.')
+@click.option('--decimal', type=click.Choice(DECIMAL_SEPARATORS),
+              help="Decimal separator of the amounts (default: detected per amount; '1,234' is refused as ambiguous).")
+@click.option('--chunk-size', default=1000, show_default=True, help='Rows per insert transaction.')
+def import_command(statement, fmt, currency, category, negate, date_format, decimal, chunk_size):
+    """Streams a bank CSV/OFX statement into the expense store."""
+    store = app.extensions['expense_store']
+    options = ImportOptions(currency and currency.upper(), category, negate, date_format, decimal)
+    fmt = detect_format(statement.name, fmt)
+
+    for event in import_statement(store, statement, fmt, options, chunk_size):
+        if event['event'] == 'error':
+            click.echo(f"  row {event['row']}: {event['error']}", err=True)
+        elif event['event'] == 'progress':
+            click.echo(f"  {event['rows']:,} rows read, {event['imported']:,} imported, {event['errors']:,} errors")
+        elif event['event'] == 'failed':
+            raise click.ClickException(f"{event['error']} ({event['imported']:,} rows imported before the failure)")
+        else:
+            click.echo(f"Done: {event['rows']:,} rows read, {event['imported']:,} imported, {event['errors']:,} errors.")
+
+def require_vendor_files(allow_cdn):
+    """Stops a production command while Chart.js or the font would still come from the CDN."""
+    missing = missing_vendor_files()
+    if missing and not allow_cdn:
+        raise click.ClickException(
+            f"vendor/ is missing {', '.join(missing)}; run `python app.py fetch-vendor` "
+            f"(or pass --allow-cdn to load them from jsDelivr)."
+        )
+
+@app.cli.command('build-assets')
+@click.argument('directory', type=click.Path(file_okay=False), default='dist')
+@click.option('--allow-cdn', is_flag=True, help='Load Chart.js and the font from the CDN when vendor/ lacks them.')
+def build_assets_command(directory, allow_cdn):
+    """Writes the HTML shell and fingerprinted assets (with .gz/.br copies) for a static host or CDN."""
+    require_vendor_files(allow_cdn)
+    for path in ASSETS.write(directory):
+        click.echo(f"  {path}")
+
+@app.cli.command('fetch-vendor')
+@click.option('--force', is_flag=True, help='Download again even if the files exist.')
+@click.option('--pin', is_flag=True, help='Record the downloads\' sha256 in vendor/SHA256SUMS instead of checking it.')
+def fetch_vendor_command(force, pin):
+    """Downloads Chart.js and the Inter font into vendor/ so the page needs no CDN (restart to pick them up)."""
+    try:
+        for filename, size in fetch_vendor(force=force, pin=pin):
+            click.echo(f"  {filename}: " + (f"{size:,} bytes" if size is not None else "already present"))
+    except OSError as error:
+        raise click.ClickException(f"Download failed: {error}")
+    except VendorError as error:
+        raise click.ClickException(f"Not saved: {error} (--pin records new pins; review them before committing)")
+
+@app.cli.command('create-user')
+@click.argument('username')
+@click.password_option()
+@click.option('--token', is_flag=True, help='Also print an API token for scripts (Authorization: Bearer ...).')
+def create_user_command(username, password, token):
+    """Adds an account for multi-user mode (EXPENSE_MULTI_USER=1)."""
+    store = app.extensions['expense_store']
+    try:
+        user_id = create_user(store, username, password)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    click.echo(f"Created user {username!r} (id {user_id}).")
+    if token:
+        click.echo(f"API token (shown once): {issue_token(store, user_id)}")
+
+@app.cli.command('set-password')
+@click.argument('username')
+@click.password_option()
+def set_password_command(username, password):
+    """Sets an account's password (e.g. for `default`, which owns the data from before multi-user mode)."""
+    try:
+        found = set_password(app.extensions['expense_store'], username, password)
+    except ValueError as error:
+        raise click.ClickException(str(error))
+    if not found:
+        raise click.ClickException(f"No user {username!r}.")
+    click.echo(f"Password set for {username!r}.")
+
+@app.cli.command('serve')
+@click.option('--host', default='0.0.0.0', show_default=True)
+@click.option('--port', default=5000, show_default=True)
+@click.option('--workers', type=int, default=default_workers, show_default='CPU count',
+              help='Worker processes (gunicorn only).')
+@click.option('--threads', default=4, show_default=True, help='Threads per worker.')
+@click.option('--server', type=click.Choice(['auto', 'gunicorn', 'waitress']), default='auto', show_default=True)
+@click.option('--allow-cdn', is_flag=True, help='Load Chart.js and the font from the CDN when vendor/ lacks them.')
+def serve_command(host, port, workers, threads, server, allow_cdn):
+    """Runs the app under a production WSGI server (no debugger, no browser launch)."""
+    require_vendor_files(allow_cdn)
+    if isinstance(app.extensions['expense_store'], JournalStore) and workers > 1:
+        click.echo(f"  ℹ️  The journal store keeps its data in one process; using 1 worker instead of {workers}.")
+        workers = 1
+    click.echo(f"Serving on http://{host}:{port} with {server} ({workers} workers x {threads} threads)")
+    try:
+        serve(app, host, port, workers, threads, server)
+    except RuntimeError as error:
+        raise click.ClickException(str(error))
 
 def open_browser(port):
     """Opens the web browser to the application URL."""
@@ -1131,13 +1992,20 @@ def open_browser(port):
 
 if __name__ == '__main__':
 
+    # `python app.py serve ...` / `python app.py import ...` run the CLI commands instead of the dev server
+    if len(sys.argv) > 1:
+        app.cli.main(args=sys.argv[1:], prog_name='app.py', obj=ScriptInfo(create_app=lambda: app))
+
     port = 5000
-    print(f"\n==================================================")
-    print(f"  🚀 Starting Single-File Expense Tracker...")
-    print(f"  💡 Requires Flask: (pip install Flask).")
+    print("\n==================================================")
+    print("  🚀 Starting Single-File Expense Tracker...")
+    print("  💡 Requires Flask: (pip install Flask).")
     print(f"  🌍 View your app at: http://127.0.0.1:{port}")
-    print(f"  ℹ️  Press CTRL+C to stop the server.")
-    print(f"==================================================")
+    print("  ℹ️  Press CTRL+C to stop the server.")
+    print("  🏭 For production use: python app.py serve --workers 4")
+    if missing_vendor_files():
+        print("  ⚠️  Chart.js and the Inter font come from the CDN until you run: python app.py fetch-vendor")
+    print("==================================================")
     
 
     Timer(1, open_browser, args=(port,)).start()
@@ -0,0 +1,106 @@
+"""
+Asset pipeline for HTML_CONTENT.
+
+The page is still authored as one HTML string in app.py. At import time its inline <style> and <script>
+blocks are minified and moved into separate files whose names carry a content hash (app.<hash>.css,
+app.<hash>.js), next to any self-hosted vendor files. Those are served with a one-year immutable
+Cache-Control, so a browser downloads them once per release; only the small HTML shell is revalidated
+on each visit.
+"""
+import hashlib
+import os
+import re
+
+from precompressed import PrecompressedAsset
+
+ASSET_URL_PREFIX = '/assets/'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+_STYLE_BLOCK = re.compile(r'<style>(.*?)</style>', re.S)
+_INLINE_SCRIPT_BLOCK = re.compile(r'<script>(.*?)</script>', re.S)
+
+
+def minify_css(css):
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    css = re.sub(r':\s+', ':', css)
+    return css.replace(';}', '}').strip()
+
+
+def minify_js(js):
+    """
+    Conservative, dependency-free minification: drops comment-only lines, blank lines and indentation.
+    Code is never rewritten, so the output behaves exactly like the input.
+    """
+    lines = []
+    in_block_comment = False
+    for line in js.splitlines():
+        stripped = line.strip()
+        if in_block_comment:
+            in_block_comment = '*/' not in stripped
+            continue
+        if stripped.startswith('/*'):
+            in_block_comment = '*/' not in stripped
+            continue
+        if not stripped or stripped.startswith('//'):
+            continue
+        lines.append(stripped)
+    return '\n'.join(lines)
+
+
+def fingerprint(body):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return hashlib.sha256(body).hexdigest()[:12]
+
+
+class AssetBundle:
+    """The HTML shell plus its fingerprinted, precompressed CSS/JS, built from one HTML document."""
+
+    def __init__(self, html, last_modified=None, vendor=()):
+        self.assets = {}
+        shell = html
+
+        # Self-hosted third-party files replace their CDN URLs (see vendor.py)
+        for filename, url, content_type, compress, body in vendor:
+            stem, extension = os.path.splitext(filename)
+            name = self._add(stem, extension[1:], body, content_type, last_modified, compress)
+            shell = shell.replace(url, ASSET_URL_PREFIX + name)
+
+        style = _STYLE_BLOCK.search(shell)
+        if style:
+            name = self._add('app', 'css', minify_css(style.group(1)), 'text/css; charset=utf-8', last_modified)
+            shell = shell.replace(style.group(0), f'<link rel="stylesheet" href="{ASSET_URL_PREFIX}{name}">')
+
+        script = _INLINE_SCRIPT_BLOCK.search(shell)
+        if script:
+            name = self._add('app', 'js', minify_js(script.group(1)), 'text/javascript; charset=utf-8', last_modified)
+            # defer keeps the original timing: it runs after parsing, before DOMContentLoaded
+            shell = shell.replace(script.group(0), f'<script src="{ASSET_URL_PREFIX}{name}" defer></script>')
+
+        self.shell = shell
+        self.page = PrecompressedAsset(shell, last_modified=last_modified)
+
+    def _add(self, stem, extension, body, content_type, last_modified, compress=True):
+        name = f'{stem}.{fingerprint(body)}.{extension}'
+        self.assets[name] = PrecompressedAsset(body, content_type, IMMUTABLE, last_modified, compress)
+        return name
+
+    def get(self, name):
+        return self.assets.get(name)
+
+    def write(self, directory):
+        """Writes the shell and assets (plus .gz/.br variants) for serving from a web server or CDN."""
+        os.makedirs(directory, exist_ok=True)
+        written = []
+        files = {'index.html': self.page}
+        files.update(self.assets)
+        suffixes = {'identity': '', 'gzip': '.gz', 'br': '.br'}
+        for name, asset in files.items():
+            for coding, (body, _) in asset.variants.items():
+                path = os.path.join(directory, name + suffixes[coding])
+                with open(path, 'wb') as handle:
+                    handle.write(body)
+                written.append(path)
+        return written
@@ -0,0 +1,133 @@
+"""
+Accounts and API authentication for shared deployments.
+
+With app.config['MULTI_USER'] off (the default) every request acts as the default user, so a
+single-person install behaves exactly as before. With it on, every /api route needs either the signed
+session cookie set by POST /api/auth/login (what the page uses) or an `Authorization: Bearer <token>`
+header (scripts and other clients). Tokens are random; only their SHA-256 is stored.
+"""
+import hashlib
+import secrets
+
+from flask import Blueprint, current_app, jsonify, request, session
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from store import DEFAULT_USER_ID, ValidationError
+
+auth = Blueprint('auth', __name__, url_prefix='/api/auth')
+
+DEFAULT_USER = {'id': DEFAULT_USER_ID, 'username': 'default'}
+MIN_PASSWORD_LENGTH = 8
+
+
+def hash_token(token):
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _password_hash(password):
+    if len(str(password or '')) < MIN_PASSWORD_LENGTH:
+        raise ValidationError(f"Password must be at least {MIN_PASSWORD_LENGTH} characters.")
+    return generate_password_hash(password)
+
+
+def create_user(store, username, password):
+    """Validates and stores a new account; returns its id."""
+    username = str(username or '').strip()
+    if not 1 <= len(username) <= 64:
+        raise ValidationError("Username must be 1 to 64 characters.")
+    return store.add_user(username, _password_hash(password))
+
+
+def set_password(store, username, password):
+    """Sets (or resets) an account's password; False if there is no such user."""
+    return store.set_password(username, _password_hash(password))
+
+
+def issue_token(store, user_id):
+    """A new API token for the user (shown once; only its hash is kept)."""
+    token = secrets.token_urlsafe(32)
+    store.add_token(hash_token(token), user_id)
+    return token
+
+
+def _bearer_token():
+    scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+
+def current_user():
+    """{id, username} of whoever is making this request, or None if multi-user mode needs a sign-in."""
+    if not current_app.config.get('MULTI_USER'):
+        return DEFAULT_USER
+    token = _bearer_token()
+    if token is not None:
+        return current_app.extensions['expense_store'].user_for_token(hash_token(token))
+    if 'user_id' in session:
+        return {'id': session['user_id'], 'username': session['username']}
+    return None
+
+
+@auth.errorhandler(ValidationError)
+def handle_validation_error(error):
+    return jsonify(error=str(error)), 400
+
+
+def _credentials():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        raise ValidationError("Request body must be a JSON object.")
+    return payload.get('username'), payload.get('password'), payload
+
+
+@auth.get('/me')
+def me():
+    """Who the page is signed in as (null in multi-user mode before sign-in)."""
+    return jsonify(user=current_user(), multiUser=bool(current_app.config.get('MULTI_USER')),
+                   signup=bool(current_app.config.get('ALLOW_SIGNUP')))
+
+
+@auth.post('/login')
+def login():
+    """{username, password[, issueToken]} -> starts a session; with issueToken=true also returns an API token."""
+    if not current_app.config.get('MULTI_USER'):
+        return jsonify(error="Accounts are disabled on this server (single-user mode)."), 404
+    username, password, payload = _credentials()
+    store = current_app.extensions['expense_store']
+    account = store.find_user(str(username or '').strip())
+    # Check a hash even for unknown users, so response time doesn't reveal which names exist
+    password_hash = account['password_hash'] if account and account['password_hash'] else _DUMMY_HASH
+    if not check_password_hash(password_hash, str(password or '')) or not account:
+        return jsonify(error="Wrong username or password."), 401
+
+    user = {'id': account['id'], 'username': account['username']}
+    session.clear()
+    session['user_id'], session['username'] = user['id'], user['username']
+    response = {'user': user}
+    if payload.get('issueToken'):
+        response['token'] = issue_token(store, user['id'])
+    return jsonify(response)
+
+
+@auth.post('/register')
+def register():
+    """Self-service sign-up, only when the server allows it (EXPENSE_ALLOW_SIGNUP=1)."""
+    if not (current_app.config.get('MULTI_USER') and current_app.config.get('ALLOW_SIGNUP')):
+        return jsonify(error="Sign-up is disabled on this server."), 404
+    username, password, _ = _credentials()
+    user_id = create_user(current_app.extensions['expense_store'], username, password)
+    session.clear()
+    session['user_id'], session['username'] = user_id, str(username).strip()
+    return jsonify(user={'id': user_id, 'username': session['username']}), 201
+
+
+@auth.post('/logout')
+def logout():
+    """Ends the session; a bearer token sent with this request is revoked."""
+    token = _bearer_token()
+    if token is not None:
+        current_app.extensions['expense_store'].delete_token(hash_token(token))
+    session.clear()
+    return '', 204
+
+
+_DUMMY_HASH = generate_password_hash(secrets.token_hex(16))
@@ -0,0 +1 @@
+"""Benchmarks for the Expense Tracker server. Run from the ExpenseTracker directory, e.g. `python -m benchmarks.bench_home`."""
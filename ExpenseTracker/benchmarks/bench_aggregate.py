@@ -0,0 +1,55 @@
+"""
+Vectorized ExpenseFrame aggregation vs. the per-row convert_to_primary() loop.
+
+tests/test_aggregate.py checks that both give the same results.
+"""
+import argparse
+import time
+
+from aggregate import ExpenseFrame
+from benchmarks.generators import synthetic_rows
+from currency import convert_to_primary
+
+
+def per_row_report(rows, primary_code):
+    """The reference: one convert_to_primary() per row, as the page does."""
+    by_category, by_month = {}, {}
+    for amount, currency_code, category, date in rows:
+        value = convert_to_primary(amount, currency_code, primary_code)
+        by_category[category] = by_category.get(category, 0) + value
+        by_month[date[:7]] = by_month.get(date[:7], 0) + value
+    return by_category, by_month
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    frame = ExpenseFrame.from_rows(rows)
+
+    def vectorized():
+        # fresh frame each time so the per-currency conversion cache doesn't flatter the numbers
+        fresh = ExpenseFrame(frame.amounts, frame.currency_ids, frame.category_ids, frame.dates, frame.categories)
+        fresh.totals_by_category('EUR')
+        fresh.month_series('EUR')
+
+    per_row = best_of(args.repeat, lambda: per_row_report(rows, 'EUR'))
+    numpy_time = best_of(args.repeat, vectorized)
+    print(f'{args.rows:,} rows  per-row: {per_row * 1000:8.1f} ms  vectorized: {numpy_time * 1000:8.1f} ms  '
+          f'speedup: {per_row / numpy_time:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
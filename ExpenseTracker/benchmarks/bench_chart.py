@@ -0,0 +1,143 @@
+"""
+Frame times for re-rendering the category pie chart with a few hundred categories, in headless Chromium.
+
+Compares the old renderCharts() strategy (destroy the Chart and build a new one on every updateUI())
+with the current one (patch data.labels / datasets[0].data and call update()), plus a theme toggle
+that only recolors. Each render is followed by its animation; every frame in that window is timed.
+
+    pip install playwright && playwright install chromium
+    python -m benchmarks.bench_chart --categories 300 --renders 30
+"""
+import argparse
+import json
+import threading
+
+from flask import Flask, request
+from werkzeug.serving import make_server
+
+from app import ASSETS
+from benchmarks.load_test import percentile
+from vendor import VENDOR_FILES
+
+BENCH_PAGE = """<!DOCTYPE html>
+<html><head><script src="%(chart_src)s"></script></head>
+<body style="width: 900px; height: 500px"><canvas id="chart"></canvas>
+<script>
+const CATEGORIES = %(categories)d;
+const labels = Array.from({ length: CATEGORIES }, (_, i) => `Category ${i}`);
+const colors = labels.map((_, i) => `hsl(${(i * 47) %% 360}, 70%%, 55%%)`);
+let seed = 1;
+const random = () => (seed = (seed * 16807) %% 2147483647) / 2147483647;
+const totals = () => labels.map(() => Math.round(random() * 1000));
+
+function config(data, dark) {
+    const text = dark ? '#f1f5f9' : '#1e293b';
+    return {
+        type: 'pie',
+        data: { labels: labels.slice(), datasets: [{ data, backgroundColor: colors, borderColor: dark ? '#475569' : '#e2e8f0', borderWidth: 1 }] },
+        options: { responsive: true, maintainAspectRatio: false, plugins: {
+            legend: { position: 'right', labels: { color: text, boxWidth: 15, padding: 10 } },
+            title: { display: true, text: 'Expenses by Category', color: text, font: { size: 14, weight: 'bold' } } } }
+    };
+}
+
+const ctx = document.getElementById('chart').getContext('2d');
+let chart = new Chart(ctx, config(totals(), false));
+
+const strategies = {
+    recreate() { chart.destroy(); chart = new Chart(ctx, config(totals(), false)); },
+    patch() { chart.data.labels = labels.slice(); chart.data.datasets[0].data = totals(); chart.update(); },
+    theme(i) {
+        const dark = i %% 2 === 0, text = dark ? '#f1f5f9' : '#1e293b';
+        chart.data.datasets[0].borderColor = dark ? '#475569' : '#e2e8f0';
+        chart.options.plugins.legend.labels.color = text;
+        chart.options.plugins.title.color = text;
+        chart.update('none');
+    },
+};
+
+const nextFrame = () => new Promise(resolve => requestAnimationFrame(resolve));
+
+/** Runs `renders` renders; returns the synchronous call times and every frame time that follows. */
+async function run(name, renders, settleMs) {
+    const calls = [], frames = [];
+    for (let i = 0; i < renders; i++) {
+        await nextFrame();
+        const started = performance.now();
+        strategies[name](i);
+        calls.push(performance.now() - started);
+        let last = await nextFrame();
+        frames.push(last - started);
+        const until = started + settleMs;
+        while (last < until) {
+            const now = await nextFrame();
+            frames.push(now - last);
+            last = now;
+        }
+    }
+    return { calls, frames };
+}
+window.run = run;
+</script></body></html>"""
+
+
+def chart_source():
+    """The vendored Chart.js when fetched (see vendor.py), otherwise the CDN."""
+    for name in ASSETS.assets:
+        if name.startswith('chart.'):
+            return f'/assets/{name}'
+    return VENDOR_FILES['chart.umd.min.js'][0]
+
+
+def make_bench_app(categories):
+    bench = Flask('bench_chart')
+    page = BENCH_PAGE % {'chart_src': chart_source(), 'categories': categories}
+
+    @bench.route('/')
+    def home():
+        return page
+
+    @bench.route('/assets/<name>')
+    def asset(name):
+        return ASSETS.get(name).respond(request)
+
+    return bench
+
+
+def summarize(values):
+    values = sorted(values)
+    return (f"median {percentile(values, 0.5):7.2f} ms   p95 {percentile(values, 0.95):7.2f} ms   "
+            f"max {values[-1]:7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--categories', type=int, default=300)
+    parser.add_argument('--renders', type=int, default=30)
+    parser.add_argument('--settle-ms', type=int, default=1200, help='frames timed after each render (animation)')
+    args = parser.parse_args()
+
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise SystemExit("This benchmark needs Playwright: pip install playwright && playwright install chromium")
+
+    server = make_server('127.0.0.1', 0, make_bench_app(args.categories), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with sync_playwright() as playwright:
+            browser = playwright.chromium.launch()
+            page = browser.new_page()
+            page.goto(f'http://127.0.0.1:{server.server_port}/')
+            print(f"{args.categories} categories, {args.renders} renders each")
+            for name in ('recreate', 'patch', 'theme'):
+                result = page.evaluate(f"run({json.dumps(name)}, {args.renders}, {args.settle_ms})")
+                print(f"  {name:<9} call   {summarize(result['calls'])}")
+                print(f"  {'':<9} frames {summarize(result['frames'])}   ({len(result['frames'])} frames)")
+            browser.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
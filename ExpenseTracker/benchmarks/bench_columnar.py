@@ -0,0 +1,70 @@
+"""
+Memory per row of ColumnarExpenses vs. one dict per expense (the page's JSON shape), plus append speed.
+
+Memory is measured with tracemalloc around building each representation from the same rows.
+tests/test_columnar.py checks that rows read back unchanged and that to_frame() reports like ExpenseFrame.from_rows().
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from benchmarks.generators import synthetic_rows
+from columnar import ColumnarExpenses
+
+NOTES = ['', '', '', 'lunch', 'taxi to airport', 'groceries for the week', 'rent']
+
+
+def synthetic_expenses(count):
+    """Page-shaped expenses decoded from JSON, as a server cache would hold them."""
+    expenses = [
+        {'id': index + 1, 'amount': amount, 'currencyCode': code, 'category': category,
+         'date': day, 'note': NOTES[index % len(NOTES)]}
+        for index, (amount, code, category, day) in enumerate(synthetic_rows(count))
+    ]
+    return json.loads(json.dumps(expenses))  # fresh objects, no sharing with the generator's strings
+
+
+def measure(build):
+    """(result, bytes allocated by build())."""
+    tracemalloc.start()
+    try:
+        result = build()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, current
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    payload = json.dumps(synthetic_expenses(args.rows))
+    dicts, dict_bytes = measure(lambda: json.loads(payload))
+
+    def build_columns():
+        columns = ColumnarExpenses()
+        columns.extend(dicts)
+        return columns
+
+    columns, column_bytes = measure(build_columns)
+    # tracemalloc slows allocation down, so time the appends separately
+    started = time.perf_counter()
+    build_columns()
+    append_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    columns.to_frame()
+    frame_seconds = time.perf_counter() - started
+
+    print(f'{args.rows:,} rows')
+    print(f'  dict per row        {dict_bytes / args.rows:8.1f} bytes/row')
+    print(f'  ColumnarExpenses    {column_bytes / args.rows:8.1f} bytes/row '
+          f'(nbytes() says {columns.bytes_per_row():.1f}; {dict_bytes / column_bytes:.1f}x smaller)')
+    print(f'  append              {args.rows / append_seconds:10,.0f} rows/s')
+    print(f'  to_frame()          {frame_seconds * 1000:8.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,155 @@
+"""
+Interactive latency while heavy reports run: does a handful of users running full-history reports and
+exports slow down everyone else's page requests?
+
+Starts `python app.py serve` (one worker, --threads threads) on a seeded history twice: once with the
+bounded work pool at its defaults, and once with EXPENSE_HEAVY_WORKERS set high enough that heavy
+requests can take every server thread (how the server behaved before the pool). Each time, `--heavy`
+connections loop over /api/report, /api/report/stream and /api/export/csv, while `--light` connections
+use the page's month routes. It prints light-request latency, and completed and rejected (503) heavy
+requests. It first checks that the streamed report's final totals match /api/report.
+
+    python -m benchmarks.bench_heavy --scale 20 --seconds 15
+"""
+import argparse
+import http.client
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.generators import expense_history, monthly_budgets
+from benchmarks.load_test import percentile
+from store import ExpenseStore
+
+HEAVY_PATHS = ['/api/report?primary=EUR', '/api/report/stream?primary=EUR', '/api/export/csv?primary=EUR']
+LIGHT_PATHS = ['/api/expenses?month={month}&limit=50', '/api/summary/{month}?primary=EUR', '/api/budgets']
+
+
+def _get(conn, path):
+    conn.request('GET', path)
+    response = conn.getresponse()
+    return response.status, response.read()
+
+
+def _heavy_client(port, deadline, done, rejected):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    index = 0
+    while time.perf_counter() < deadline:
+        status, _ = _get(conn, HEAVY_PATHS[index % len(HEAVY_PATHS)])
+        index += 1
+        if status == 503:
+            rejected.append(1)
+            time.sleep(0.5)  # a polite client honours Retry-After, if not for its full 5 seconds
+        else:
+            assert status == 200, status
+            done.append(1)
+    conn.close()
+
+
+def _light_client(port, deadline, paths, latencies):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    index = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        status, _ = _get(conn, paths[index % len(paths)])
+        assert status == 200, status
+        latencies.append(time.perf_counter() - started)
+        index += 1
+    conn.close()
+
+
+def check_streamed_report(port):
+    """The streamed report's "done" totals equal /api/report's (up to float rounding)."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+    whole = json.loads(_get(conn, '/api/report?primary=EUR')[1])
+    events = [json.loads(line) for line in _get(conn, '/api/report/stream?primary=EUR')[1].splitlines()]
+    conn.close()
+    assert events[-1]['event'] == 'done' and all(event['event'] == 'partial' for event in events[:-1])
+    merged = events[-1]['report']
+    assert merged['count'] == whole['count']
+    for key in ('byCategory', 'byCurrency', 'byMonth'):
+        assert merged[key].keys() == whole[key].keys(), key
+        for name, total in whole[key].items():
+            assert abs(merged[key][name] - total) <= 1e-9 * max(1.0, abs(total)), (key, name)
+    assert abs(merged['total'] - whole['total']) <= 1e-9 * whole['total']
+    return len(events) - 1
+
+
+def run(db_path, port, threads, heavy, light, seconds, months, env):
+    server = subprocess.Popen(
+        [sys.executable, 'app.py', 'serve', '--host', '127.0.0.1', '--port', str(port),
+         '--workers', '1', '--threads', str(threads)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        env={**os.environ, 'EXPENSE_DB': db_path, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        for _ in range(300):
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+                _get(conn, '/api/budgets')
+                conn.close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        partitions = check_streamed_report(port)
+
+        deadline = time.perf_counter() + seconds
+        done, rejected, latencies = [], [], []
+        paths = [path.format(month=month) for month in months for path in LIGHT_PATHS]
+        clients = [threading.Thread(target=_heavy_client, args=(port, deadline, done, rejected)) for _ in range(heavy)]
+        clients += [threading.Thread(target=_light_client, args=(port, deadline, paths[index::light], latencies))
+                    for index in range(light)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+        return partitions, sorted(latencies), len(done), len(rejected)
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--scale', type=float, default=20.0, help='history density (1 = about 80 expenses a month)')
+    parser.add_argument('--threads', type=int, default=4, help='server threads (the serve default)')
+    parser.add_argument('--heavy', type=int, default=6, help='connections running reports and exports')
+    parser.add_argument('--light', type=int, default=4, help='connections using the month routes')
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--dir', help='where to put the test database (default: a temporary directory)')
+    args = parser.parse_args()
+
+    history = expense_history(args.years, args.scale)
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        db_path = os.path.join(workdir, 'heavy.db')
+        store = ExpenseStore(db_path)
+        store.add_expenses(history)
+        for month, amount in monthly_budgets(history).items():
+            store.set_budget(month, amount)
+        months = store.months()[-12:]
+        store.close()
+        print(f'{len(history):,} expenses, {args.threads} server threads, '
+              f'{args.heavy} heavy + {args.light} light connections for {args.seconds:.0f} s each')
+
+        for label, env in (('work pool (defaults)', {}),
+                           ('unbounded (every thread)', {'EXPENSE_HEAVY_WORKERS': str(args.heavy + args.threads)})):
+            partitions, latencies, done, rejected = run(
+                db_path, args.port, args.threads, args.heavy, args.light, args.seconds, months, env)
+            print(f'\n{label}  (streamed report OK: {partitions} yearly partials merge to /api/report)')
+            print(f'  light  {len(latencies) / args.seconds:8.1f} req/s   p50 {percentile(latencies, 0.5) * 1000:7.1f} ms'
+                  f'   p95 {percentile(latencies, 0.95) * 1000:7.1f} ms   p99 {percentile(latencies, 0.99) * 1000:7.1f} ms')
+            print(f'  heavy  {done:8,} completed   {rejected:,} rejected with 503')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Bytes-on-wire and requests/sec for `home()`: plain HTML_CONTENT vs. the precompressed, ETag-validated page.
+
+Runs in-process through the WSGI test client, so the numbers measure server work only (no sockets).
+"""
+import argparse
+import time
+
+from flask import Flask
+
+from app import HTML_CONTENT, app as tracker_app
+
+BROWSER_ACCEPT_ENCODING = 'gzip, deflate, br'
+
+
+def make_baseline_app():
+    """The original route: the raw string on every hit, no validators."""
+    baseline = Flask('baseline')
+
+    @baseline.route('/')
+    def home():
+        return HTML_CONTENT
+
+    return baseline
+
+
+def measure(client, headers, seconds):
+    """Issues GET / in a loop for `seconds`; returns (requests/sec, status, body bytes of one response)."""
+    response = client.get('/', headers=headers)
+    status, size = response.status_code, len(response.get_data())
+
+    count = 0
+    deadline = time.perf_counter() + seconds
+    started = time.perf_counter()
+    while time.perf_counter() < deadline:
+        client.get('/', headers=headers)
+        count += 1
+    return count / (time.perf_counter() - started), status, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--seconds', type=float, default=2.0, help='duration of each timed scenario')
+    args = parser.parse_args()
+
+    baseline = make_baseline_app().test_client()
+    tracker = tracker_app.test_client()
+    etag = tracker.get('/', headers={'Accept-Encoding': BROWSER_ACCEPT_ENCODING}).headers['ETag']
+
+    scenarios = [
+        ('before: first visit', baseline, {'Accept-Encoding': BROWSER_ACCEPT_ENCODING}),
+        ('before: repeat visit', baseline, {'Accept-Encoding': BROWSER_ACCEPT_ENCODING}),
+        ('after: first visit (no coding)', tracker, {}),
+        ('after: first visit (gzip)', tracker, {'Accept-Encoding': 'gzip'}),
+        ('after: first visit (br)', tracker, {'Accept-Encoding': BROWSER_ACCEPT_ENCODING}),
+        ('after: repeat visit (If-None-Match)', tracker,
+         {'Accept-Encoding': BROWSER_ACCEPT_ENCODING, 'If-None-Match': etag}),
+    ]
+
+    print(f"{'scenario':<40} {'status':>6} {'body bytes':>11} {'req/s':>10}")
+    for name, client, headers in scenarios:
+        rps, status, size = measure(client, headers, args.seconds)
+        print(f"{name:<40} {status:>6} {size:>11,} {rps:>10,.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+Background job throughput and behaviour (jobs.py).
+
+- Imports `--statements` CSV statements of `--rows` rows each as jobs, once per worker count in
+  `--workers`, and reports rows imported per second. Parsing and validation run in the worker processes;
+  the inserts still commit one at a time through SQLite's single writer.
+- Cancels a running import and checks that it stops part way, as 'cancelled'.
+- Leaves a job queued in a closed queue, reopens the queue as a restarted server would, and checks that
+  the job runs.
+
+    python -m benchmarks.bench_jobs --statements 8 --rows 50000 --workers 1 2 4
+"""
+import argparse
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import jobs
+from benchmarks.generators import expense_history
+from store import DEFAULT_USER_ID, ExpenseStore
+
+
+def statement_csv(expenses):
+    lines = ['date,amount,currency,category,note']
+    lines += [f"{expense['date']},{expense['amount']},{expense['currencyCode']},{expense['category']},"
+              f"{expense['note'].replace(',', ' ')}" for expense in expenses]
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def import_params(chunk_size=1000):
+    return {'format': 'csv', 'options': {'category': 'Other'}, 'chunk_size': chunk_size}
+
+
+def wait(queue, job_ids, timeout=600):
+    deadline = time.perf_counter() + timeout
+    while True:
+        found = [queue.get(job_id, DEFAULT_USER_ID) for job_id in job_ids]
+        if all(job['status'] in ('done', 'failed', 'cancelled') for job in found):
+            return found
+        assert time.perf_counter() < deadline, 'jobs did not finish in time'
+        time.sleep(0.05)
+
+
+def open_queue(workdir, name, workers):
+    store = ExpenseStore(os.path.join(workdir, f'{name}.db'))
+    return store, jobs.JobQueue(os.path.join(workdir, f'{name}-jobs.db'), os.path.join(workdir, f'{name}-files'),
+                                store, workers)
+
+
+def measure_throughput(workdir, statements, workers):
+    store, queue = open_queue(workdir, f'throughput-{workers}', workers)
+    try:
+        # Start the worker processes before timing, as a running server would have them
+        wait(queue, [queue.submit(DEFAULT_USER_ID, 'rebuild-rollups', {})['id'] for _ in range(workers)])
+        started = time.perf_counter()
+        submitted = [queue.submit(DEFAULT_USER_ID, 'import', import_params(), io.BytesIO(data))['id']
+                     for data in statements]
+        finished = wait(queue, submitted)
+        elapsed = time.perf_counter() - started
+        assert all(job['status'] == 'done' for job in finished), [job['error'] for job in finished]
+        rows = sum(job['result']['imported'] for job in finished)
+        assert store.query('SELECT COUNT(*) AS n FROM expenses')[0]['n'] == rows
+        return rows, elapsed
+    finally:
+        queue.close()
+        store.close()
+
+
+def check_cancel(workdir, data):
+    store, queue = open_queue(workdir, 'cancel', 1)
+    try:
+        job_id = queue.submit(DEFAULT_USER_ID, 'import', import_params(chunk_size=200), io.BytesIO(data))['id']
+        while queue.get(job_id, DEFAULT_USER_ID)['progress']['done'] == 0:
+            time.sleep(0.01)
+        queue.cancel(job_id, DEFAULT_USER_ID)
+        job, = wait(queue, [job_id])
+        imported = store.query('SELECT COUNT(*) AS n FROM expenses')[0]['n']
+        assert job['status'] == 'cancelled', job
+        assert job['progress']['done'] < job['progress']['total'], job['progress']
+        assert 0 < imported < data.count(b'\n') - 1, imported
+        return imported, data.count(b'\n') - 1
+    finally:
+        queue.close()
+        store.close()
+
+
+def check_resume(workdir, data):
+    store, queue = open_queue(workdir, 'resume', 1)
+    # Queue a job without handing it to a worker: what a crash between the two would leave behind
+    job_id = queue.conn.execute(
+        'INSERT INTO jobs (user_id, kind, params) VALUES (?, ?, ?)',
+        (DEFAULT_USER_ID, 'import', json.dumps(import_params())),
+    ).lastrowid
+    with open(queue.file_path(job_id, jobs.UPLOAD), 'wb') as upload:
+        upload.write(data)
+    queue.close()
+    store.close()
+
+    store, queue = open_queue(workdir, 'resume', 1)
+    try:
+        queue.resume()
+        job, = wait(queue, [job_id])
+        assert job['status'] == 'done' and job['result']['imported'] == data.count(b'\n') - 1, job
+        assert not os.path.exists(queue.file_path(job_id, jobs.UPLOAD))
+    finally:
+        queue.close()
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--statements', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=50_000, help='rows per statement')
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--dir', help='where to put the test files (default: a temporary directory)')
+    args = parser.parse_args()
+
+    history = expense_history(10, 10.0)
+    statements = [statement_csv((history * (args.rows // len(history) + 1))[index:index + args.rows])
+                  for index in range(args.statements)]
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        imported, total = check_cancel(workdir, statement_csv(history))
+        print(f'cancel: OK (stopped after {imported:,} of {total:,} rows)')
+        check_resume(workdir, statement_csv(history[:5000]))
+        print('resume: OK (a job queued before a restart ran after it)')
+
+        print(f'\n{args.statements} statements x {args.rows:,} rows, {os.cpu_count()} CPUs')
+        baseline = None
+        for workers in args.workers:
+            rows, elapsed = measure_throughput(workdir, statements, workers)
+            baseline = baseline or rows / elapsed
+            print(f'  {workers:2} workers  {rows / elapsed:10,.0f} rows/s  ({elapsed:.1f} s, '
+                  f'{rows / elapsed / baseline:.2f}x the first)')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
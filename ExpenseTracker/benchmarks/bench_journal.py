@@ -0,0 +1,112 @@
+"""
+JournalStore: write throughput and recovery time. tests/test_journal.py checks it against ExpenseStore.
+
+Write throughput compares these on a store that already holds `--history` expenses:
+- Appending one journal record per change, in each sync mode and with several writer threads (group commit).
+- SQLite (one transaction per change).
+- Rewriting the whole dataset on every change, which is what the page's old saveData() did to
+  localStorage, here as a fsynced JSON file.
+
+Recovery compares replaying the full journal with loading a snapshot and replaying a short tail.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.generators import synthetic_rows
+from journal import JournalStore
+from store import ExpenseStore
+
+
+def synthetic_expenses(count, seed=0, first_id=1):
+    return [
+        {'id': first_id + index, 'amount': amount, 'currencyCode': code, 'category': category,
+         'date': day, 'note': f'#{index}'}
+        for index, (amount, code, category, day) in enumerate(synthetic_rows(count, seed))
+    ]
+
+
+def _timed_writes(store, writes, threads, first_id):
+    """Seconds for `writes` single-expense inserts split over `threads` threads."""
+    expenses = synthetic_expenses(writes, seed=7, first_id=first_id)
+    chunks = [expenses[index::threads] for index in range(threads)]
+    workers = [threading.Thread(target=lambda chunk=chunk: [store.add_expense(e) for e in chunk]) for chunk in chunks]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+
+def full_rewrite(path, history, writes):
+    """The saveData() pattern: every change re-serializes and fsyncs the whole dataset."""
+    data = list(history)
+    started = time.perf_counter()
+    for expense in synthetic_expenses(writes, seed=7, first_id=len(history) + 1):
+        data.append(expense)
+        with open(path, 'w', encoding='utf-8') as handle:
+            json.dump(data, handle)
+            handle.flush()
+            os.fsync(handle.fileno())
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--history', type=int, default=100_000, help='expenses already stored')
+    parser.add_argument('--writes', type=int, default=2_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--dir', help='where to put the test files (default: a temporary directory)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        history = synthetic_expenses(args.history, seed=3)
+        first_id = args.history + 1
+        print(f'write throughput ({args.writes:,} single-expense writes on top of {args.history:,})')
+        results = []
+        for sync, threads in [('always', 1), ('always', args.threads), ('interval', args.threads)]:
+            store = JournalStore(os.path.join(workdir, f'journal-{sync}-{threads}'), sync=sync)
+            store.add_expenses(history)
+            seconds = _timed_writes(store, args.writes, threads, first_id)
+            store.close()
+            results.append((f'journal sync={sync}, {threads} thread(s)', seconds))
+
+        sqlite = ExpenseStore(os.path.join(workdir, 'throughput.db'))
+        sqlite.add_expenses(history)
+        results.append((f'SQLite ExpenseStore, {args.threads} thread(s)', _timed_writes(sqlite, args.writes, args.threads, first_id)))
+        rewrites = max(1, args.writes // 50)
+        seconds = full_rewrite(os.path.join(workdir, 'everything.json'), history, rewrites)
+        results.append((f'full rewrite per change ({rewrites} writes, extrapolated)', seconds * args.writes / rewrites))
+        for label, seconds in results:
+            print(f'  {label:<48} {args.writes / seconds:10,.0f} writes/s')
+
+        print(f'\nrecovery ({args.history:,} expenses, one journal record each)')
+        directory = os.path.join(workdir, 'recovery')
+        store = JournalStore(directory, sync='none', compact_bytes=1 << 40)
+        for expense in history:
+            store.add_expense(expense)
+        store.close()
+        started = time.perf_counter()
+        store = JournalStore(directory, sync='none', compact_bytes=1 << 40)
+        replay = time.perf_counter() - started
+        store.compact()
+        for expense in synthetic_expenses(1000, seed=9, first_id=first_id):
+            store.add_expense(expense)
+        store.close()
+        started = time.perf_counter()
+        JournalStore(directory, sync='none')
+        snapshot = time.perf_counter() - started
+        print(f'  full journal replay                              {replay * 1000:8.0f} ms')
+        print(f'  snapshot + 1,000-record tail                     {snapshot * 1000:8.0f} ms')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Multi-core reports, end to end: what /api/report does with one process, loading every row with
+ExpenseFrame.from_store() and reporting on it, against ParallelReporter.report() with each worker count in
+`--workers`, on a SQLite database of `--rows` expenses. Both include reading the rows from the database.
+It uses the fixed rates, or with --historical-rates a ten-year daily series for every currency (the
+heavier, date-effective conversion).
+
+tests/test_parallel_report.py checks that the parallel report matches the single-process one.
+
+Filling the database runs at roughly 10,000 expenses a second, so `--db` keeps it for the next run: an
+existing file is reused as it is.
+
+On a machine with one CPU the workers can't run in parallel, so there it also prints a projection for
+each worker count. It times each partition's load and report one after another, and separately the
+serial part: planning the partitions, a round trip to a worker per partition carrying its report, and
+merging. The projection is the serial part plus the time the busiest worker would need if the
+partitions were handed out to `workers` cores in order.
+
+    python -m benchmarks.bench_parallel --rows 10000000 --db /tmp/report-10m.db --workers 1 2 4 8
+"""
+import argparse
+import heapq
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from aggregate import CURRENCY_IDS, ExpenseFrame, merge_reports
+from benchmarks.bench_aggregate import best_of
+from benchmarks.bench_rates import synthetic_series
+from parallel_report import PARTITIONS_PER_WORKER, ParallelReporter, month_partitions
+from rates import RateTable
+from store import ExpenseStore
+
+CATEGORIES = ['Food', 'Travel', 'Shopping', 'Utilities', 'Health', 'Entertainment', 'Other', 'Rent', 'Gifts']
+CURRENCY_CODES = list(CURRENCY_IDS)
+
+
+def fill(store, rows, seed=0, years=10, chunk=100_000):
+    """Adds `rows` random expenses over `years` years from 2015, none from 2018-03 to 2018-12."""
+    rng = np.random.default_rng(seed)
+    for start in range(0, rows, chunk):
+        size = min(chunk, rows - start)
+        dates = np.datetime64('2015-01-01') + rng.integers(0, 365 * years, size)
+        # Leave a gap of empty months, which the merged byMonth must still list as zeros
+        gap = (dates >= np.datetime64('2018-03-01')) & (dates < np.datetime64('2019-01-01'))
+        dates[gap] += 365
+        amounts = np.round(rng.lognormal(3, 1, size), 2) + 0.01
+        currencies = rng.integers(0, len(CURRENCY_CODES), size)
+        categories = rng.integers(0, len(CATEGORIES), size)
+        store.add_expenses([
+            {'amount': float(amount), 'currencyCode': CURRENCY_CODES[currency], 'category': CATEGORIES[category],
+             'date': str(date), 'note': ''}
+            for amount, currency, category, date in zip(amounts, currencies, categories, dates)
+        ])
+
+
+def single_report(store, start_month, end_month, primary_code, rates):
+    """/api/report with one process."""
+    return ExpenseFrame.from_store(store, start_month, end_month, rates=rates).report(primary_code)
+
+
+def serial_part(reporter, parts, repeat):
+    """Time ParallelReporter.report() spends outside the partitions' load and report."""
+    pool = reporter._pool()
+
+    def run():
+        month_partitions(reporter.store.month_counts(), len(parts))
+        futures = [pool.submit(dict, part) for part in parts]  # ships each report both ways
+        merge_reports([future.result() for future in futures], 'EUR')
+
+    return best_of(repeat, run)
+
+
+def projected(serial, partition_times, workers):
+    """Serial part plus the busiest of `workers` cores when they take the partitions in order."""
+    finish = [0.0] * workers
+    for elapsed in partition_times:
+        heapq.heapreplace(finish, finish[0] + elapsed)
+    return serial + max(finish)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--db', help='database to fill once and reuse (default: a temporary one)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--historical-rates', action='store_true')
+    args = parser.parse_args()
+
+    directory = None if args.db else tempfile.mkdtemp()
+    path = args.db or os.path.join(directory, 'expenses.db')
+    try:
+        existing = os.path.exists(path)
+        store = ExpenseStore(path)
+        if not existing:
+            started = time.perf_counter()
+            fill(store, args.rows)
+            print(f'filled {path} in {time.perf_counter() - started:.0f} s')
+        rows = sum(count for _, count in store.month_counts())
+        rates = RateTable(synthetic_series()) if args.historical_rates else None
+
+        single = best_of(args.repeat, lambda: single_report(store, None, None, 'EUR', rates))
+        cpus = os.cpu_count() or 1
+        print(f"{rows:,} rows, {'historical' if rates else 'fixed'} rates, {cpus} CPUs, load + report")
+        print(f'  one process (from_store + report)   {single * 1000:9.1f} ms')
+        for workers in args.workers:
+            reporter = ParallelReporter(store, rates, workers)
+            reporter.report(None, None, 'EUR')  # start the worker processes
+            elapsed = best_of(args.repeat, lambda: reporter.report(None, None, 'EUR'))
+            line = f'  {workers:2} workers                          {elapsed * 1000:9.1f} ms   {single / elapsed:5.2f}x'
+            if cpus == 1 and workers > 1:
+                partitions = month_partitions(store.month_counts(), workers * PARTITIONS_PER_WORKER)
+                times = [best_of(args.repeat, lambda: single_report(store, first, last, 'EUR', rates))
+                         for first, last in partitions]
+                parts = [single_report(store, first, last, 'EUR', rates) for first, last in partitions]
+                serial = serial_part(reporter, parts, args.repeat)
+                estimate = projected(serial, times, workers)
+                line += (f'   projected on {workers} cores: {estimate * 1000:7.1f} ms   {single / estimate:5.2f}x'
+                         f' (serial part {serial * 1000:.0f} ms)')
+            reporter.close()
+            print(line)
+    finally:
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,46 @@
+"""
+Date-effective conversion: RateTable.convert_columns() vs. one as-of RateTable.convert() per row.
+
+Uses a synthetic ten-year daily rate series. tests/test_rates.py checks that both agree exactly.
+"""
+import argparse
+
+import numpy as np
+
+from aggregate import ExpenseFrame
+from benchmarks.bench_aggregate import best_of
+from benchmarks.generators import synthetic_rows
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD
+from rates import RateTable
+
+
+def synthetic_series(seed=0, start='2014-06-01', days=4000):
+    """{code: [(date, rate)]}: a daily random walk around each fixed rate (USD has no series)."""
+    rng = np.random.default_rng(seed)
+    dates = (np.datetime64(start) + np.arange(days)).astype(str)
+    series = {}
+    for code in CURRENCY_OPTIONS:
+        if code == 'USD':
+            continue
+        walk = np.exp(np.cumsum(rng.normal(0, 0.004, days)))
+        series[code] = list(zip(dates, CURRENCY_RATES_TO_USD[code] * walk))
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.rows)
+    table = RateTable(synthetic_series())
+    frame = ExpenseFrame.from_rows(rows)
+    per_row = best_of(args.repeat, lambda: [table.convert(amount, code, 'EUR', date) for amount, code, _, date in rows])
+    batch = best_of(args.repeat, lambda: table.convert_columns(frame.amounts, frame.currency_ids, frame.dates, 'EUR'))
+    print(f'{args.rows:,} rows  per-row as-of: {per_row * 1000:8.1f} ms  batch: {batch * 1000:8.1f} ms  '
+          f'speedup: {per_row / batch:5.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Full-text search latency over `--rows` expense notes, for the SQLite FTS5 index and JournalStore's inverted index.
+
+tests/test_search.py checks both against a brute-force scan of every row.
+"""
+import argparse
+import itertools
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.generators import synthetic_rows
+from journal import JournalStore
+from store import ExpenseStore
+
+# Note words follow a Zipf-like distribution: a few very common words and a long tail of rare ones
+COMMON_WORDS = [
+    'coffee', 'groceries', 'uber', 'taxi', 'lunch', 'dinner', 'rent', 'electricity', 'netflix', 'spotify',
+    'gym', 'pharmacy', 'books', 'amazon', 'flight', 'hotel', 'train', 'bus', 'parking', 'fuel', 'cinema',
+    'concert', 'gift', 'insurance', 'phone', 'internet', 'water', 'restaurant', 'bakery', 'market',
+    'Café', 'Crème brûlée', 'co-op', "Ana's birthday",
+]
+QUERIES = [
+    ('coffee', {}),
+    ('co', {}),
+    ('w1234x', {}),
+    ('ana birth', {}),
+    ('food', {}),
+    ('groc', {'min_amount': 100, 'start_date': '2020-01-01', 'end_date': '2020-12-31'}),
+    ('cafe', {'max_amount': 20}),
+]
+
+
+def synthetic_expenses(count, seed=0, vocabulary=20_000):
+    rng = random.Random(seed)
+    words = COMMON_WORDS + [f'w{index}x' for index in range(vocabulary)]
+    cumulative = list(itertools.accumulate(1 / rank ** 1.1 for rank in range(1, len(words) + 1)))
+    expenses = []
+    for index, (amount, code, category, day) in enumerate(synthetic_rows(count, seed)):
+        note = ' '.join(rng.choices(words, cum_weights=cumulative, k=rng.randint(0, 4)))
+        expenses.append({'id': index + 1, 'amount': amount, 'currencyCode': code, 'category': category,
+                         'date': day, 'note': note})
+    return expenses
+
+
+def time_queries(target, repeat):
+    for text, filters in QUERIES:
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            results = target.search(text, **filters)
+            timings.append(time.perf_counter() - started)
+        label = text + ''.join(f' {key}={value}' for key, value in filters.items())
+        print(f'  {label:<64} {len(results):3} results {min(timings) * 1000:8.1f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--dir', help='where to put the test files (default: a temporary directory)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(dir=args.dir)
+    try:
+        expenses = synthetic_expenses(args.rows)
+        sqlite = ExpenseStore(os.path.join(workdir, 'search.db'))
+        started = time.perf_counter()
+        for start in range(0, len(expenses), 50_000):
+            sqlite.add_expenses(expenses[start:start + 50_000])
+        print(f'SQLite FTS5 ({args.rows:,} notes, inserted with the index in {time.perf_counter() - started:.0f} s)')
+        time_queries(sqlite, args.repeat)
+        sqlite.close()
+
+        memory = JournalStore(os.path.join(workdir, 'journal'), sync='none')
+        memory.add_expenses(expenses)
+        started = time.perf_counter()
+        memory.search('warm up')
+        print(f'\nJournalStore inverted index (built on the first search in {time.perf_counter() - started:.1f} s)')
+        time_queries(memory, args.repeat)
+        memory.close()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
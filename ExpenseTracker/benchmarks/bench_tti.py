@@ -0,0 +1,110 @@
+"""
+Headless page-load timings: the old page (one inline document with a render-blocking Chart.js <script>
+from the CDN in <head>) vs. the current one (fingerprinted assets, Chart.js loaded lazily and self-hosted).
+
+Both pages run against the same in-process API. For every run a fresh browser context (cold cache)
+loads the page and reports first contentful paint, DOMContentLoaded, the load event and
+time-to-interactive: the 'expense-tracker-ready' mark set once init() has rendered the data.
+
+    pip install playwright && playwright install chromium
+    python app.py fetch-vendor            # otherwise "current" also uses the CDN
+    python -m benchmarks.bench_tti --runs 10
+    python -m benchmarks.bench_tti --offline   # outside hosts unreachable
+"""
+import argparse
+import statistics
+import threading
+
+from flask import Flask
+from werkzeug.serving import make_server
+
+from app import HTML_CONTENT, app as tracker_app
+from vendor import VENDOR_FILES
+
+CHART_JS_CDN = VENDOR_FILES['chart.umd.min.js'][0]
+
+METRICS = ('fcp', 'domContentLoaded', 'load', 'tti')
+
+COLLECT_TIMINGS = """() => {
+    const nav = performance.getEntriesByType('navigation')[0];
+    const paint = performance.getEntriesByName('first-contentful-paint')[0];
+    const ready = performance.getEntriesByName('expense-tracker-ready')[0];
+    return {
+        fcp: paint ? paint.startTime : null,
+        domContentLoaded: nav.domContentLoadedEventEnd,
+        load: nav.loadEventEnd,
+        tti: ready ? ready.startTime : null,
+    };
+}"""
+
+
+def legacy_html():
+    """The page as it was: one inline document whose <head> blocks on the Chart.js CDN."""
+    # Chart is then defined before the page script runs, so renderCharts() never lazy-loads it.
+    return HTML_CONTENT.replace('<style>', f'<script src="{CHART_JS_CDN}"></script>\n    <style>', 1)
+
+
+def make_legacy_app():
+    legacy = Flask('legacy')
+    legacy.extensions['expense_store'] = tracker_app.extensions['expense_store']
+    legacy.register_blueprint(tracker_app.blueprints['api'])
+    page = legacy_html()
+
+    @legacy.route('/')
+    def home():
+        return page
+
+    return legacy
+
+
+def start_server(wsgi_app):
+    server = make_server('127.0.0.1', 0, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}/'
+
+
+def measure(browser, url, runs, offline):
+    samples = {metric: [] for metric in METRICS}
+    for _ in range(runs):
+        context = browser.new_context()
+        if offline:
+            context.route('**/*', lambda route: route.continue_() if route.request.url.startswith('http://127.0.0.1')
+                          else route.abort())
+        page = context.new_page()
+        page.goto(url, wait_until='load')
+        page.wait_for_function("performance.getEntriesByName('expense-tracker-ready').length > 0", timeout=30000)
+        timings = page.evaluate(COLLECT_TIMINGS)
+        for metric in METRICS:
+            if timings[metric] is not None:
+                samples[metric].append(timings[metric])
+        context.close()
+    return {metric: statistics.median(values) if values else None for metric, values in samples.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='cold-cache page loads per variant (median reported)')
+    parser.add_argument('--offline', action='store_true', help='abort every request to a host other than the app')
+    args = parser.parse_args()
+
+    try:
+        from playwright.sync_api import sync_playwright
+    except ImportError:
+        raise SystemExit("This benchmark needs Playwright: pip install playwright && playwright install chromium")
+
+    servers = {'legacy (CDN, blocking)': start_server(make_legacy_app()), 'current': start_server(tracker_app)}
+    with sync_playwright() as playwright:
+        browser = playwright.chromium.launch()
+        results = {name: measure(browser, url, args.runs, args.offline) for name, (_, url) in servers.items()}
+        browser.close()
+    for server, _ in servers.values():
+        server.shutdown()
+
+    print(f"{'page':<24}" + ''.join(f"{metric:>18}" for metric in METRICS) + "   (median ms)")
+    for name, timings in results.items():
+        cells = ''.join(f"{'-' if value is None else f'{value:.0f}':>18}" for value in timings.values())
+        print(f"{name:<24}{cells}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,149 @@
+"""
+Seeded synthetic expense histories for the benchmarks. The same arguments always give the same data.
+
+synthetic_rows() is the flat generator the older benchmarks use. Its rows are uniform over ten years,
+categories and currencies.
+
+expense_history() looks like a real person's ledger instead:
+- Monthly bills (rent rising each year, utilities, phone, subscriptions, yearly insurance).
+- Everyday spending at per-category rates with long-tailed amounts.
+- A December bump in gifts and shopping.
+- Two or three trips a year, spent in a foreign currency.
+- Occasional online purchases in EUR or GBP.
+"""
+import calendar
+from datetime import date, timedelta
+
+import numpy as np
+
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD
+
+CATEGORIES = ['Food', 'Travel', 'Shopping', 'Utilities', 'Health', 'Entertainment', 'Other']
+
+# category: (expenses per week, median amount in USD, lognormal sigma, notes)
+EVERYDAY_SPENDING = {
+    'Groceries': (2.0, 55, 0.5, ['weekly shop', 'market', 'Whole Foods', 'Trader Joe\'s', '']),
+    'Dining': (2.5, 28, 0.6, ['lunch', 'dinner with friends', 'takeout', 'pizza', 'sushi', '']),
+    'Coffee': (4.0, 4.5, 0.3, ['coffee', 'latte', 'café', '']),
+    'Transport': (3.0, 9, 0.7, ['bus', 'metro card', 'taxi', 'uber', '']),
+    'Fuel': (0.8, 48, 0.3, ['gas station', 'fuel', '']),
+    'Shopping': (1.2, 40, 0.9, ['amazon', 'clothes', 'shoes', 'electronics', 'home goods', '']),
+    'Entertainment': (0.8, 25, 0.7, ['cinema', 'concert', 'books', 'game', '']),
+    'Health': (0.3, 45, 0.8, ['pharmacy', 'dentist', 'doctor', 'vitamins', '']),
+    'Personal Care': (0.4, 30, 0.5, ['haircut', 'toiletries', '']),
+    'Gifts': (0.2, 45, 0.7, ['birthday gift', 'wedding gift', 'flowers', '']),
+    'Education': (0.1, 60, 0.8, ['course', 'textbook', '']),
+    'Pets': (0.3, 35, 0.6, ['pet food', 'vet', '']),
+    'Other': (0.3, 20, 1.0, ['', 'misc']),
+}
+# category: (day of month, USD amount in the first year, yearly increase, note)
+MONTHLY_BILLS = {
+    'Rent': (1, 1450, 0.035, 'rent'),
+    'Utilities': (12, 95, 0.03, 'electricity and water'),
+    'Phone': (18, 45, 0.0, 'phone plan'),
+    'Internet': (20, 60, 0.02, 'internet'),
+    'Subscriptions': (7, 15.99, 0.05, 'streaming'),
+}
+FOREIGN_CURRENCIES = [code for code in CURRENCY_OPTIONS if code != 'USD']
+
+
+def synthetic_rows(count, seed=0):
+    """(amount, currency_code, category, date) rows spread over ten years."""
+    rng = np.random.default_rng(seed)
+    amounts = np.round(rng.lognormal(3, 1, count), 2)
+    currencies = rng.integers(0, len(CURRENCY_OPTIONS), count)
+    categories = rng.integers(0, len(CATEGORIES), count)
+    days = rng.integers(0, 3650, count)
+    dates = (np.datetime64('2015-01-01') + days).astype(str)
+    return [
+        (float(amount), CURRENCY_OPTIONS[currency], CATEGORIES[category], date)
+        for amount, currency, category, date in zip(amounts, currencies, categories, dates)
+    ]
+
+
+def _in_currency(usd_amount, currency_code):
+    """A USD amount as it would appear on a receipt in `currency_code` (whole units for JPY, INR and NPR)."""
+    amount = float(usd_amount) / CURRENCY_RATES_TO_USD[currency_code]
+    return float(round(amount)) if currency_code in ('JPY', 'NPR', 'INR') else round(amount, 2)
+
+
+def expense_history(years=10, scale=1.0, seed=0, start=date(2015, 1, 1), home_currency='USD'):
+    """
+    About 75 * `scale` expenses per month for `years` years from `start`, oldest first with ids 1..n,
+    in the page's shape ({id, amount, currencyCode, category, date, note}).
+    """
+    rng = np.random.default_rng(seed)
+    end = date(start.year + years, start.month, 1)
+    total_days = (end - start).days
+    weeks = total_days / 7
+    rows = []  # (date, category, amount in USD, currency, note)
+
+    for month_start in _month_starts(start, end):
+        year = month_start.year - start.year
+        for category, (day, amount, growth, note) in MONTHLY_BILLS.items():
+            bill_day = min(day, calendar.monthrange(month_start.year, month_start.month)[1])
+            wobble = rng.normal(1, 0.08) if category == 'Utilities' else 1
+            rows.append((month_start.replace(day=bill_day), category, amount * (1 + growth) ** year * wobble,
+                         home_currency, note))
+        if month_start.month == 3:
+            rows.append((month_start.replace(day=15), 'Insurance', 900 * 1.04 ** year, home_currency, 'yearly insurance'))
+
+    for category, (per_week, median, sigma, notes) in EVERYDAY_SPENDING.items():
+        count = rng.poisson(per_week * weeks * scale)
+        offsets = rng.integers(0, total_days, count)
+        amounts = rng.lognormal(np.log(median), sigma, count)
+        note_ids = rng.integers(0, len(notes), count)
+        online = rng.random(count) < (0.08 if category == 'Shopping' else 0.01)
+        online_currency = rng.integers(0, 2, count)
+        for offset, amount, note_id, abroad, which in zip(offsets, amounts, note_ids, online, online_currency):
+            day = start + timedelta(days=int(offset))
+            if category in ('Gifts', 'Shopping') and day.month == 12:
+                amount *= 1.8
+            currency = ('EUR', 'GBP')[which] if abroad else home_currency
+            rows.append((day, category, amount, currency, notes[note_id]))
+
+    for _ in range(int(rng.poisson(2.5 * years))):
+        # Late enough that the flight, booked up to 60 days ahead, is still inside the history
+        first_day = start + timedelta(days=int(rng.integers(60, max(61, total_days - 14))))
+        rows.extend(_trip(rng, first_day, scale))
+
+    rows.sort(key=lambda row: row[0])
+    return [
+        {'id': index + 1, 'amount': _in_currency(usd, currency) or 0.01, 'currencyCode': currency,
+         'category': category, 'date': day.isoformat(), 'note': note}
+        for index, (day, category, usd, currency, note) in enumerate(rows)
+    ]
+
+
+def _trip(rng, first_day, scale):
+    """A 3-12 day trip abroad: flight and hotel up front, then daily spending in the local currency."""
+    currency = FOREIGN_CURRENCIES[int(rng.integers(0, len(FOREIGN_CURRENCIES)))]
+    length = int(rng.integers(3, 13))
+    rows = [
+        (first_day - timedelta(days=int(rng.integers(10, 60))), 'Travel', rng.lognormal(np.log(450), 0.4), 'USD',
+         'flight'),
+        (first_day, 'Travel', 110 * length * rng.lognormal(0, 0.3), currency, 'hotel'),
+    ]
+    for offset in range(length):
+        day = first_day + timedelta(days=offset)
+        for _ in range(int(rng.poisson(4 * scale))):
+            category = ('Dining', 'Transport', 'Entertainment', 'Shopping')[int(rng.integers(0, 4))]
+            rows.append((day, category, rng.lognormal(np.log(18), 0.8), currency, 'trip'))
+    return rows
+
+
+def _month_starts(start, end):
+    month = start.replace(day=1)
+    while month < end:
+        yield month
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def monthly_budgets(expenses, seed=0):
+    """{month: budget in USD}, set near each month's spending so some months come in over budget."""
+    rng = np.random.default_rng(seed)
+    spent = {}
+    for expense in expenses:
+        month = expense['date'][:7]
+        spent[month] = spent.get(month, 0) + expense['amount'] * CURRENCY_RATES_TO_USD[expense['currencyCode']]
+    return {month: float(round(total * rng.uniform(0.9, 1.25), -1)) for month, total in sorted(spent.items())}
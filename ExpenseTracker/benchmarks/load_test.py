@@ -0,0 +1,104 @@
+"""
+HTTP load test against a running server, e.g. one started with `python app.py serve --workers 4`.
+
+Client processes (each with several keep-alive connections on threads) hit a mix of page and API
+routes for a fixed time, then report throughput, latency percentiles and requests/sec per server core.
+
+    python -m benchmarks.load_test --url http://127.0.0.1:5000 --seconds 20 --server-cores 4
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+DEFAULT_PATHS = [
+    '/',
+    '/api/expenses?month={month}&limit=50',
+    '/api/summary/{month}?primary=EUR',
+    '/api/budgets',
+]
+
+
+def _client_thread(host, port, paths, deadline, latencies, errors, headers=None):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {'Accept-Encoding': 'gzip, br', **(headers or {})}
+    i = 0
+    while time.perf_counter() < deadline:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            conn.request('GET', path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append('connection')
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - started)
+    conn.close()
+
+
+def _client_process(args):
+    host, port, paths, seconds, connections = args
+    deadline = time.perf_counter() + seconds
+    latencies, errors = [], []
+    threads = [
+        threading.Thread(target=_client_thread, args=(host, port, paths, deadline, latencies, errors))
+        for _ in range(connections)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, len(errors)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='client processes')
+    parser.add_argument('--connections', type=int, default=8, help='keep-alive connections per client process')
+    parser.add_argument('--server-cores', type=int, default=os.cpu_count() or 1,
+                        help='cores the server may use (its --workers); used for the per-core figure')
+    parser.add_argument('--path', action='append', help='path to request (repeatable); defaults to a page/API mix')
+    args = parser.parse_args()
+
+    target = urlsplit(args.url)
+    month = date.today().strftime('%Y-%m')
+    paths = [path.format(month=month) for path in (args.path or DEFAULT_PATHS)]
+
+    jobs = [(target.hostname, target.port or 80, paths, args.seconds, args.connections)] * args.processes
+    started = time.perf_counter()
+    with multiprocessing.Pool(args.processes) as pool:
+        results = pool.map(_client_process, jobs)
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(count for _, count in results)
+    throughput = len(latencies) / elapsed
+
+    print(f"target           {args.url}  ({len(paths)} paths, {args.processes}x{args.connections} connections)")
+    print(f"requests         {len(latencies):,} ok, {errors:,} errors in {elapsed:.1f}s")
+    print(f"throughput       {throughput:,.0f} req/s")
+    print(f"per server core  {throughput / args.server_cores:,.0f} req/s/core ({args.server_cores} cores)")
+    print(f"latency          p50 {percentile(latencies, 0.5) * 1000:.1f} ms   "
+          f"p95 {percentile(latencies, 0.95) * 1000:.1f} ms   p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
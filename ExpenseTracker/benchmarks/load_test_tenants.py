@@ -0,0 +1,131 @@
+"""
+Multi-tenant HTTP load test: many accounts with their own data hitting one multi-user server at once.
+
+Seeds `--tenants` accounts straight into the server's database (one "heavy" account with a large
+history, the rest small), each with an API token. Then every client connection acts as one tenant:
+the heavy one runs full-history reports while the others use the page's everyday routes. Reports
+latency per group, so you can see whether one big account slows everyone else down, and finally
+checks that each tenant still sees exactly its own rows.
+
+    EXPENSE_MULTI_USER=1 EXPENSE_DB=load.db python app.py serve --workers 4
+    python -m benchmarks.load_test_tenants --db load.db --url http://127.0.0.1:5000 --tenants 50
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import secrets
+import threading
+import time
+from datetime import date
+from urllib.parse import urlsplit
+
+from auth import issue_token
+from benchmarks.generators import synthetic_rows
+from benchmarks.load_test import DEFAULT_PATHS, _client_thread, percentile
+from store import ExpenseStore
+
+HEAVY_PATHS = ['/api/report?primary=EUR', '/api/summary/{month}?primary=EUR']
+
+
+def seed_tenants(db_path, tenants, rows, heavy_rows):
+    """Creates the accounts and their data; returns [(username, token, row_count)], the heavy tenant first."""
+    store = ExpenseStore(db_path)
+    run = secrets.token_hex(3)
+    this_month = date.today().strftime('%Y-%m')
+    seeded = []
+    for index in range(tenants):
+        count = heavy_rows if index == 0 else rows
+        username = f'tenant-{run}-{index}'
+        user_id = store.add_user(username, None)  # token-only account
+        expenses = [
+            # Keep a tenth of each history in the current month, so the everyday routes have data
+            {'amount': amount, 'currencyCode': code, 'category': category, 'note': '',
+             'date': f'{this_month}-{int(day[-2:]) % 28 + 1:02d}' if position % 10 == 0 else day}
+            for position, (amount, code, category, day) in enumerate(synthetic_rows(count, seed=index))
+        ]
+        store.add_expenses(expenses, user_id=user_id)
+        seeded.append((username, issue_token(store, user_id), count))
+    return seeded
+
+
+def _tenant_process(args):
+    host, port, tenants, seconds = args
+    deadline = time.perf_counter() + seconds
+    results = {}
+    threads = []
+    for group, token, paths in tenants:
+        latencies, errors = results.setdefault(group, ([], []))
+        threads.append(threading.Thread(target=_client_thread, args=(
+            host, port, paths, deadline, latencies, errors, {'Authorization': f'Bearer {token}'},
+        )))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return {group: (latencies, len(errors)) for group, (latencies, errors) in results.items()}
+
+
+def check_isolation(host, port, seeded):
+    """Every tenant's full sync snapshot holds exactly the rows seeded for it."""
+    conn = http.client.HTTPConnection(host, port, timeout=120)
+    for username, token, count in seeded:
+        cursor, seen = '', 0
+        while True:
+            conn.request('GET', f'/api/changes?since={cursor}&limit=50000', headers={'Authorization': f'Bearer {token}'})
+            page = json.loads(conn.getresponse().read())
+            seen += len(page['expenses'])
+            cursor = page['cursor']
+            if not page['more']:
+                break
+        assert seen == count, f'{username} sees {seen:,} rows, expected {count:,}'
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', required=True, help="the server's EXPENSE_DB, to seed accounts into")
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--tenants', type=int, default=20)
+    parser.add_argument('--rows', type=int, default=2_000, help='expenses per ordinary tenant')
+    parser.add_argument('--heavy-rows', type=int, default=200_000, help='expenses for the one heavy tenant')
+    parser.add_argument('--heavy-connections', type=int, default=2)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--processes', type=int, default=os.cpu_count() or 1, help='client processes')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    seeded = seed_tenants(args.db, args.tenants, args.rows, args.heavy_rows)
+    print(f"seeded           {args.tenants} tenants ({args.heavy_rows:,} + {args.tenants - 1}x{args.rows:,} rows) "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    target = urlsplit(args.url)
+    month = date.today().strftime('%Y-%m')
+    light_paths = [path.format(month=month) for path in DEFAULT_PATHS if path.startswith('/api/')]
+    heavy_paths = [path.format(month=month) for path in HEAVY_PATHS]
+    connections = [('heavy', seeded[0][1], heavy_paths)] * args.heavy_connections
+    connections += [('light', token, light_paths) for _, token, _ in seeded[1:]]
+
+    # Deal the connections out across the client processes
+    jobs = [(target.hostname, target.port or 80, connections[i::args.processes], args.seconds)
+            for i in range(min(args.processes, len(connections)))]
+    started = time.perf_counter()
+    with multiprocessing.Pool(len(jobs)) as pool:
+        results = pool.map(_tenant_process, jobs)
+    elapsed = time.perf_counter() - started
+
+    print(f"target           {args.url}  ({len(connections)} connections, {elapsed:.1f}s)")
+    for group in ('light', 'heavy'):
+        latencies = sorted(value for result in results for value in result.get(group, ([], 0))[0])
+        errors = sum(result.get(group, ([], 0))[1] for result in results)
+        print(f"{group:<16} {len(latencies) / elapsed:8,.0f} req/s  {errors:,} errors   "
+              f"p50 {percentile(latencies, 0.5) * 1000:.1f} ms   p95 {percentile(latencies, 0.95) * 1000:.1f} ms   "
+              f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms")
+
+    check_isolation(target.hostname, target.port or 80, seeded)
+    print(f"isolation        OK (each of {len(seeded)} tenants sees exactly its own rows)")
+
+
+if __name__ == '__main__':
+    main()
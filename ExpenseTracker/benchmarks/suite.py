@@ -0,0 +1,405 @@
+"""
+Benchmark suite: times the server's hot paths on a seeded, realistic history and flags regressions.
+
+    python -m benchmarks.suite --output baseline.json                      # record a baseline
+    python -m benchmarks.suite --baseline baseline.json --output new.json  # compare (exit status 1 on a regression)
+
+The history comes from generators.expense_history(): ten years of bills, everyday spending and trips,
+with every currency in CURRENCY_RATES_TO_USD. `--scale` multiplies its density (1 is about 80
+expenses a month). Each case runs `--repeat` times in each of `--processes` fresh processes, since
+timings differ more between processes than within one. Every run's time is recorded, with the min, median,
+max and the case's noise (the interquartile range of all runs relative to their median).
+
+A comparison looks at the median time per operation. A case only counts as a regression when it is slower
+than the baseline by more than all of these:
+- `--threshold` (25% by default);
+- NOISE_MULTIPLIER times the noisier of the two runs' noise, so a case that varies by 20% from run to run
+  on this machine needs to get about 40% slower;
+- MIN_CHANGE_MS per run, so a few hundred microseconds on a small case never count.
+Only compare results taken with the same parameters on the same machine.
+
+The page's own functions (getExpensesForMonth, convertToPrimary) run in the browser. Here they are
+covered by their server-side counterparts: month listing, rollups and convert_to_primary().
+The focused benchmarks (bench_*.py) go deeper on one component each.
+"""
+import argparse
+import fnmatch
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+from benchmarks.generators import expense_history, monthly_budgets
+
+CASES = []  # (name, function(context) -> operations performed)
+
+# A slowdown must exceed the threshold, this many times the case's measured noise, and MIN_CHANGE_MS
+NOISE_MULTIPLIER = 2
+MIN_CHANGE_MS = 1.0
+
+
+def case(name):
+    def register(function):
+        CASES.append((name, function))
+        return function
+    return register
+
+
+class Context:
+    """The store, test client and sample months the cases share."""
+
+    def __init__(self, workdir, history, budgets, seed):
+        # The app builds its store from the environment on import: point it at a scratch SQLite file
+        os.environ['EXPENSE_DB'] = os.path.join(workdir, 'suite.db')
+        for name in ('EXPENSE_JOURNAL', 'EXPENSE_MULTI_USER'):
+            os.environ.pop(name, None)
+        from app import app
+
+        self.workdir = workdir
+        self.history = history
+        self.app = app
+        self.client = app.test_client()
+        self.store = app.extensions['expense_store']
+        self.store.add_expenses(history)
+        for month, amount in budgets.items():
+            self.store.set_budget(month, amount)
+        months = self.store.months()
+        # A fixed spread of months (the same for every run with the same seed and parameters)
+        self.months = [months[(index * 7 + seed) % len(months)] for index in range(24)]
+        self.next_id = len(history) + 1
+
+    def new_expenses(self, count):
+        expenses = [
+            dict(expense, id=self.next_id + index)
+            for index, expense in enumerate(self.history[:count])
+        ]
+        self.next_id += count
+        return expenses
+
+
+# --- STORAGE ---
+
+@case('store.add_expense')
+def store_add_expense(context):
+    for expense in context.new_expenses(200):
+        context.store.add_expense(expense)
+    return 200
+
+
+@case('store.add_expenses.bulk')
+def store_add_expenses_bulk(context):
+    from store import ExpenseStore
+
+    path = os.path.join(context.workdir, 'bulk.db')
+    store = ExpenseStore(path)
+    try:
+        store.add_expenses(context.history)
+    finally:
+        store.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return len(context.history)
+
+
+@case('store.list_expenses.month')
+def store_list_month(context):
+    for month in context.months:
+        context.store.list_expenses(month)
+    return len(context.months)
+
+
+@case('store.list_expenses.page')
+def store_list_page(context):
+    for month in context.months:
+        context.store.list_expenses(month, 50)
+    return len(context.months)
+
+
+@case('store.search')
+def store_search(context):
+    queries = ['coffee', 'din', 'trip', 'amazon', 'rent']
+    for query in queries:
+        context.store.search(query)
+    return len(queries)
+
+
+# --- ROLLUPS & REPORTS ---
+
+@case('rollups.summarize_month')
+def rollups_summarize(context):
+    from rollups import summarize_month
+
+    for month in context.months:
+        summarize_month(month, context.store.month_rollups(month), 'EUR', context.store.get_budget(month))
+    return len(context.months)
+
+
+@case('rollups.rebuild')
+def rollups_rebuild(context):
+    context.store.rebuild_rollups()
+    return 1
+
+
+@case('convert.per_row')
+def convert_per_row(context):
+    from currency import convert_to_primary
+
+    for expense in context.history:
+        convert_to_primary(expense['amount'], expense['currencyCode'], 'EUR')
+    return len(context.history)
+
+
+@case('report.frame')
+def report_frame(context):
+    from aggregate import ExpenseFrame
+
+    ExpenseFrame.from_store(context.store).report('EUR')
+    return 1
+
+
+@case('export.csv')
+def export_csv(context):
+    import exporter
+
+    for _ in exporter.stream_csv(exporter.export_rows(context.store, 'EUR')):
+        pass
+    return 1
+
+
+# --- HTTP (in-process WSGI test client: server work only, no sockets) ---
+
+def _get(context, path, **kwargs):
+    response = context.client.get(path, **kwargs)
+    assert response.status_code == 200, (path, response.status_code)
+    response.get_data()
+
+
+@case('http.home')
+def http_home(context):
+    for _ in range(50):
+        _get(context, '/', headers={'Accept-Encoding': 'gzip, br'})
+    return 50
+
+
+@case('http.expenses.month')
+def http_expenses_month(context):
+    for month in context.months:
+        _get(context, f'/api/expenses?month={month}')
+    return len(context.months)
+
+
+@case('http.summary')
+def http_summary(context):
+    for month in context.months:
+        _get(context, f'/api/summary/{month}?primary=EUR')
+    return len(context.months)
+
+
+@case('http.report')
+def http_report(context):
+    _get(context, '/api/report?primary=EUR')
+    return 1
+
+
+@case('http.report.stream')
+def http_report_stream(context):
+    _get(context, '/api/report/stream?primary=EUR')
+    return 1
+
+
+@case('http.changes.snapshot')
+def http_changes(context):
+    _get(context, '/api/changes?limit=50000')
+    return 1
+
+
+@case('http.search')
+def http_search(context):
+    for query in ('coffee', 'din', 'trip'):
+        _get(context, f'/api/search?q={query}')
+    return 3
+
+
+@case('http.export.csv')
+def http_export(context):
+    _get(context, '/api/export/csv?primary=EUR')
+    return 1
+
+
+@case('http.post_expense')
+def http_post_expense(context):
+    for expense in context.new_expenses(50):
+        response = context.client.post('/api/expenses', json=expense)
+        assert response.status_code == 201, response.status_code
+    return 50
+
+
+# --- RUNNING & COMPARING ---
+
+def run_case(function, context, repeat):
+    function(context)  # warm up caches and lazy imports
+    timings, operations = [], 0
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        operations = function(context)
+        timings.append((time.perf_counter() - started) * 1000)
+    return operations, timings
+
+
+def run_process(names, years, scale, seed, repeat, directory):
+    """Runs the named cases `repeat` times each on a fresh history; {name: (operations, [ms per run])}."""
+    history = expense_history(years, scale, seed)
+    workdir = tempfile.mkdtemp(dir=directory)
+    try:
+        context = Context(workdir, history, monthly_budgets(history, seed), seed)
+        timings = {name: run_case(function, context, repeat) for name, function in CASES if name in names}
+        context.store.close()
+        return timings
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def summarize(operations, timings):
+    median = statistics.median(timings)
+    quartiles = statistics.quantiles(timings, n=4) if len(timings) > 1 else [median] * 3
+    return {
+        'operations': operations,
+        'min_ms': round(min(timings), 3),
+        'median_ms': round(median, 3),
+        'max_ms': round(max(timings), 3),
+        'noise': round((quartiles[2] - quartiles[0]) / median, 4),
+        'per_operation_us': round(median * 1000 / operations, 3),
+        'runs_ms': [round(timing, 3) for timing in timings],
+    }
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ''
+    return {
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'commit': commit or None,
+    }
+
+
+def _median_per_operation_us(stats):
+    # From the median run, also for baselines recorded when per_operation_us came from the fastest one
+    return stats['median_ms'] * 1000 / stats['operations']
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints each case against the baseline; returns the names of cases whose median got slower by more than
+    `threshold`, the noise allowance and MIN_CHANGE_MS (see the module docstring).
+    """
+    if results['parameters'] != baseline.get('parameters'):
+        print(f"warning: parameters differ from the baseline's ({baseline.get('parameters')}); "
+              'the comparison is not like for like')
+    if any('noise' not in stats for stats in baseline.get('cases', {}).values()):
+        print('warning: the baseline has no noise figures (recorded by an older suite); record it again')
+    regressions = []
+    print(f"\n{'case':<28} {'baseline':>12} {'now':>12} {'change':>8} {'allowed':>8}")
+    for name, current in results['cases'].items():
+        before = baseline.get('cases', {}).get(name)
+        now_us = _median_per_operation_us(current)
+        if before is None:
+            print(f"{name:<28} {'-':>12} {now_us:10.1f}us {'new':>8}")
+            continue
+        before_us = _median_per_operation_us(before)
+        ratio = now_us / before_us
+        allowed = max(threshold, NOISE_MULTIPLIER * max(before.get('noise', 0), current['noise']))
+        change_ms = abs(now_us - before_us) * current['operations'] / 1000
+        flag = ''
+        if ratio > 1 + allowed and change_ms >= MIN_CHANGE_MS:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        elif ratio < 1 - allowed and change_ms >= MIN_CHANGE_MS:
+            flag = '  faster'
+        print(f"{name:<28} {before_us:10.1f}us {now_us:10.1f}us {(ratio - 1) * 100:+7.1f}% {allowed * 100:7.0f}%{flag}")
+    for name in sorted(baseline.get('cases', {}).keys() - results['cases'].keys()):
+        print(f'{name:<28} (in the baseline, not run now)')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--scale', type=float, default=5.0, help='history density (1 = about 80 expenses a month)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=3,
+                        help='fresh processes to run the cases in, one after another (default 3)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of each case per process (default 3)')
+    parser.add_argument('--only', action='append', help='run only cases matching this glob (repeatable)')
+    parser.add_argument('--list', action='store_true', help='list the cases and exit')
+    parser.add_argument('--output', help='write the results here as JSON')
+    parser.add_argument('--baseline', help='results JSON from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='flag cases slower than the baseline by more than this fraction (default 0.25)')
+    parser.add_argument('--dir', help='where to put the test database (default: a temporary directory)')
+    args = parser.parse_args()
+
+    selected = [name for name, _ in CASES
+                if not args.only or any(fnmatch.fnmatch(name, pattern) for pattern in args.only)]
+    if args.list:
+        print('\n'.join(selected))
+        return 0
+
+    expenses = len(expense_history(args.years, args.scale, args.seed))
+    print(f'{expenses:,} expenses over {args.years} years '
+          f'(seed {args.seed}), {args.processes} processes x {args.repeat} repeats')
+    # One process's timings can sit 30% above or below another's for the same code (memory layout, what
+    # else the machine is doing), which more repeats in one process don't average out
+    runs = {name: (0, []) for name in selected}
+    for process in range(args.processes):
+        with ProcessPoolExecutor(1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            timings = pool.submit(run_process, selected, args.years, args.scale, args.seed, args.repeat,
+                                  args.dir).result()
+        for name, (operations, process_runs) in timings.items():
+            runs[name] = (operations, runs[name][1] + process_runs)
+        print(f'  process {process + 1}/{args.processes} done')
+
+    results = {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'parameters': {'years': args.years, 'scale': args.scale, 'seed': args.seed,
+                       'processes': args.processes, 'repeat': args.repeat},
+        'expenses': expenses,
+        'cases': {name: summarize(*runs[name]) for name in selected},
+    }
+    for name, stats in results['cases'].items():
+        print(f"  {name:<28} {stats['median_ms']:10.2f} ms  ({stats['operations']} ops, "
+              f"{stats['per_operation_us']:.1f} us/op, noise {stats['noise'] * 100:.0f}%)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as handle:
+            json.dump(results, handle, indent=2)
+            handle.write('\n')
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as handle:
+            regressions = compare(results, json.load(handle), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s): {', '.join(regressions)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""
+Server-side rendering of the page's category pie chart, for emailed reports and low-power clients.
+
+Both renderers take a month summary from rollups.summarize_month(), so a chart costs one rollup read
+whatever the number of expenses. SVG is written by hand (no dependencies); PNG needs matplotlib.
+"""
+import io
+import math
+import re
+import zlib
+from datetime import date
+from html import escape
+
+from currency import format_currency
+
+try:
+    from matplotlib.figure import Figure
+except ImportError:  # PNG charts are optional
+    Figure = None
+
+FORMATS = {'svg': 'image/svg+xml', 'png': 'image/png'}
+
+# Mirrors the page's chart colors (renderCharts / chartThemeColors) and card background.
+THEMES = {
+    'light': {'background': '#ffffff', 'text': '#1e293b', 'muted': '#64748b', 'border': '#e2e8f0'},
+    'dark': {'background': '#334155', 'text': '#f1f5f9', 'muted': '#94a3b8', 'border': '#475569'},
+}
+
+# The page's EXPANDED_COLOR_PALETTE, for categories that have no saved color yet.
+PALETTE = [
+    '#0f76e6', '#10b981', '#f59e0b', '#ef4444', '#8b5cf6',
+    '#06b6d4', '#f97316', '#34d399', '#6366f1', '#fb7185',
+    '#3b82f6', '#4ade80', '#fb923c', '#be123c', '#a855f7',
+    '#0891b2', '#ea580c', '#059669', '#3730a3', '#e11d48',
+]
+
+WIDTH, HEIGHT = 640, 360
+LEGEND_ROW = 20
+# Saved colors from before colors were validated may be anything; only #rrggbb is drawn
+_COLOR = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+def category_color(category, saved_colors):
+    """The category's saved #rrggbb color, else a stable palette pick."""
+    saved = saved_colors.get(category)
+    if saved and _COLOR.fullmatch(saved):
+        return saved
+    return PALETTE[zlib.crc32(category.encode('utf-8')) % len(PALETTE)]
+
+
+def _attr(value):
+    """A value escaped for a double-quoted SVG attribute."""
+    return escape(str(value), quote=True)
+
+
+def chart_title(summary):
+    year, month = summary['month'].split('-')
+    label = date(int(year), int(month), 1).strftime('%B %Y')
+    return f"{label}: Expenses by Category (Total in {summary['primaryCurrency']})"
+
+
+def _legend_rows(categories):
+    """How many categories fit in the legend; the rest are summarized in one '+N more' row."""
+    capacity = (HEIGHT - 60) // LEGEND_ROW
+    return categories if len(categories) <= capacity else categories[:capacity - 1]
+
+
+def render_svg(summary, saved_colors, theme='light'):
+    colors = THEMES[theme]
+    categories = [entry for entry in summary['categories'] if entry['total'] > 0]
+    total = sum(entry['total'] for entry in categories)
+    cx, cy, radius = 180, 200, 140
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{WIDTH}" height="{HEIGHT}" '
+        f'viewBox="0 0 {WIDTH} {HEIGHT}" font-family="Inter, system-ui, sans-serif">',
+        f'<rect width="100%" height="100%" rx="12" fill="{_attr(colors["background"])}"/>',
+        f'<text x="{WIDTH / 2}" y="28" text-anchor="middle" font-size="14" font-weight="bold" '
+        f'fill="{_attr(colors["text"])}">{escape(chart_title(summary))}</text>',
+    ]
+
+    if not categories:
+        parts.append(f'<text x="{WIDTH / 2}" y="{HEIGHT / 2}" text-anchor="middle" font-size="13" '
+                     f'fill="{_attr(colors["muted"])}">No expenses this month.</text>')
+    elif len(categories) == 1:
+        parts.append(f'<circle cx="{cx}" cy="{cy}" r="{radius}" stroke="{_attr(colors["border"])}" '
+                     f'fill="{_attr(category_color(categories[0]["category"], saved_colors))}"/>')
+    else:
+        # Clockwise from 12 o'clock, like Chart.js
+        angle = -math.pi / 2
+        for entry in categories:
+            sweep = 2 * math.pi * entry['total'] / total
+            x0, y0 = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+            angle += sweep
+            x1, y1 = cx + radius * math.cos(angle), cy + radius * math.sin(angle)
+            large_arc = 1 if sweep > math.pi else 0
+            parts.append(
+                f'<path d="M{cx},{cy} L{x0:.2f},{y0:.2f} A{radius},{radius} 0 {large_arc} 1 {x1:.2f},{y1:.2f} Z" '
+                f'fill="{_attr(category_color(entry["category"], saved_colors))}" stroke="{_attr(colors["border"])}">'
+                f'<title>{escape(entry["category"])}</title></path>'
+            )
+
+    shown = _legend_rows(categories)
+    y = 60
+    for entry in shown:
+        label = f"{entry['category']}  {format_currency(entry['total'], summary['primaryCurrency'])}"
+        parts.append(f'<rect x="350" y="{y - 11}" width="15" height="12" '
+                     f'fill="{_attr(category_color(entry["category"], saved_colors))}"/>')
+        parts.append(f'<text x="372" y="{y}" font-size="12" fill="{_attr(colors["text"])}">{escape(label)}</text>')
+        y += LEGEND_ROW
+    if len(shown) < len(categories):
+        parts.append(f'<text x="372" y="{y}" font-size="12" fill="{_attr(colors["muted"])}">'
+                     f'+{len(categories) - len(shown)} more</text>')
+
+    parts.append('</svg>')
+    return '\n'.join(parts).encode('utf-8')
+
+
+def render_png(summary, saved_colors, theme='light', dpi=100):
+    if Figure is None:
+        raise RuntimeError("PNG charts need matplotlib (pip install matplotlib).")
+    colors = THEMES[theme]
+    categories = [entry for entry in summary['categories'] if entry['total'] > 0]
+
+    figure = Figure(figsize=(WIDTH / dpi, HEIGHT / dpi), dpi=dpi, facecolor=colors['background'])
+    axes = figure.add_axes([0.02, 0.04, 0.52, 0.82])
+    axes.set_axis_off()
+    figure.suptitle(chart_title(summary), color=colors['text'], fontsize=11, fontweight='bold')
+
+    if categories:
+        wedges, _ = axes.pie(
+            [entry['total'] for entry in categories],
+            colors=[category_color(entry['category'], saved_colors) for entry in categories],
+            startangle=90, counterclock=False,
+            wedgeprops={'edgecolor': colors['border'], 'linewidth': 1},
+        )
+        shown = _legend_rows(categories)
+        labels = [f"{entry['category']}  {format_currency(entry['total'], summary['primaryCurrency'])}" for entry in shown]
+        figure.legend(wedges[:len(shown)], labels, loc='upper left', bbox_to_anchor=(0.55, 0.86),
+                      frameon=False, fontsize=9, labelcolor=colors['text'])
+        if len(shown) < len(categories):
+            figure.text(0.57, 0.03, f"+{len(categories) - len(shown)} more", fontsize=9, color=colors['muted'])
+    else:
+        axes.text(0.5, 0.5, 'No expenses this month.', ha='center', va='center', color=colors['muted'])
+
+    output = io.BytesIO()
+    figure.savefig(output, format='png', facecolor=colors['background'])
+    return output.getvalue()
+
+
+RENDERERS = {'svg': render_svg, 'png': render_png}
@@ -0,0 +1,47 @@
+"""Currency constants shared by the server-side code. They mirror the page's CURRENCY_RATES_TO_USD / CURRENCY_SYMBOLS."""
+
+from decimal import ROUND_HALF_UP, Decimal
+
+# Fixed Conversion Rates to USD (keep in sync with the JavaScript constants in HTML_CONTENT)
+CURRENCY_RATES_TO_USD = {
+    'USD': 1.0,
+    'EUR': 1.08,    # 1 USD = 0.93 EUR -> 1 EUR = 1.08 USD
+    'GBP': 1.25,    # 1 USD = 0.8 GBP -> 1 GBP = 1.25 USD
+    'JPY': 0.0066,  # 1 USD = 150 JPY -> 1 JPY = 0.0066 USD
+    'INR': 0.012,   # 1 USD = 83 INR -> 1 INR = 0.012 USD
+    'NPR': 0.0077,  # 1 USD = 130 NPR -> 1 NPR = 0.0077 USD
+}
+
+CURRENCY_SYMBOLS = {
+    'USD': '$',
+    'EUR': '€',
+    'GBP': '£',
+    'JPY': '¥',
+    'INR': '₹',
+    'NPR': 'रु',
+}
+
+CURRENCY_OPTIONS = list(CURRENCY_RATES_TO_USD)
+
+
+def convert_to_primary(amount, from_code, primary_code):
+    """Same math as the page's convertToPrimary(): via USD, and untouched when the codes already match."""
+    if from_code == primary_code:
+        return amount
+    return amount * CURRENCY_RATES_TO_USD[from_code] / CURRENCY_RATES_TO_USD[primary_code]
+
+
+# What the page's formatCurrency() puts in front of the digits. en-US Intl formatting writes NPR as
+# "NPR 1.00" and the page strips the code, so NPR amounts carry no symbol there (or here).
+DISPLAY_PREFIXES = {code: '' if code == 'NPR' else symbol for code, symbol in CURRENCY_SYMBOLS.items()}
+
+_CENT = Decimal('0.01')
+
+
+def format_currency(amount, code):
+    """
+    The text the page's formatCurrency() shows: no sign, thousands separators, two decimals rounded
+    half away from zero on the shortest decimal form of the number (as Intl.NumberFormat does).
+    """
+    cents = Decimal(repr(abs(float(amount)))).quantize(_CENT, rounding=ROUND_HALF_UP)
+    return f"{DISPLAY_PREFIXES[code]}{cents:,.2f}"
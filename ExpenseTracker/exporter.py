@@ -0,0 +1,163 @@
+"""
+Streaming export of the expense history as CSV, NDJSON or Parquet.
+
+Rows are read month by month through a cursor and written out in small chunks, so memory stays flat
+however long the history is. Every row also carries its amount converted to a chosen primary currency,
+using the same math as the page's convertToPrimary().
+"""
+import csv
+import io
+import json
+from datetime import date
+
+from currency import convert_to_primary
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = pq = None
+
+# Flush output roughly every this many bytes (text formats) / rows (Parquet row groups).
+CHUNK_BYTES = 64 * 1024
+ROW_GROUP_SIZE = 64 * 1024
+
+FORMATS = {
+    'csv': ('text/csv; charset=utf-8', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+COLUMNS = ['id', 'date', 'category', 'amount', 'currencyCode', 'primaryAmount', 'primaryCurrency', 'note']
+
+
+def export_rows(store, primary_code, start_month=None, end_month=None, progress=None):
+    """
+    Yields export records (dicts in COLUMNS order), oldest month first. `progress(months done, months)`
+    is called before each month and once at the end.
+    """
+    months = store.months(start_month, end_month)
+    for done, month in enumerate(months):
+        if progress is not None:
+            progress(done, len(months))
+        for row in store.iter_month_expenses(month):
+            yield {
+                'id': row['id'],
+                'date': row['date'],
+                'category': row['category'],
+                'amount': row['amount'],
+                'currencyCode': row['currency_code'],
+                'primaryAmount': convert_to_primary(row['amount'], row['currency_code'], primary_code),
+                'primaryCurrency': primary_code,
+                'note': row['note'],
+            }
+    if progress is not None:
+        progress(len(months), len(months))
+
+
+def _buffered(pieces):
+    """Joins small string pieces into ~CHUNK_BYTES encoded chunks."""
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= CHUNK_BYTES:
+            yield ''.join(buffer).encode('utf-8')
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer).encode('utf-8')
+
+
+def stream_csv(records):
+    def lines():
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(COLUMNS)
+        for record in records:
+            writer.writerow(record.values())
+            yield out.getvalue()
+            out.seek(0)
+            out.truncate()
+        yield out.getvalue()
+    return _buffered(lines())
+
+
+def stream_ndjson(records):
+    return _buffered(json.dumps(record, ensure_ascii=False) + '\n' for record in records)
+
+
+class _ChunkSink(io.RawIOBase):
+    """A write-only file for ParquetWriter that hands the written bytes back in pieces."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def parquet_schema():
+    return pa.schema([
+        ('id', pa.int64()),
+        ('date', pa.date32()),
+        ('category', pa.dictionary(pa.int32(), pa.string())),
+        ('amount', pa.float64()),
+        ('currencyCode', pa.dictionary(pa.int8(), pa.string())),
+        ('primaryAmount', pa.float64()),
+        ('primaryCurrency', pa.dictionary(pa.int8(), pa.string())),
+        ('note', pa.string()),
+    ])
+
+
+def stream_parquet(records):
+    """Writes one row group per ROW_GROUP_SIZE records and yields the file as it grows."""
+    if pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+    schema = parquet_schema()
+
+    def chunks():
+        sink = _ChunkSink()
+        writer = pq.ParquetWriter(sink, schema, compression='zstd')
+        columns = {name: [] for name in COLUMNS}
+
+        def write_group():
+            dates = [date.fromisoformat(value) for value in columns['date']]
+            writer.write_table(pa.table(dict(columns, date=dates), schema=schema))
+            for values in columns.values():
+                values.clear()
+
+        for record in records:
+            for name in COLUMNS:
+                columns[name].append(record[name])
+            if len(columns['id']) >= ROW_GROUP_SIZE:
+                write_group()
+                yield sink.drain()
+        if columns['id']:
+            write_group()
+        writer.close()
+        yield sink.drain()
+
+    return chunks()
+
+
+WRITERS = {'csv': stream_csv, 'ndjson': stream_ndjson, 'parquet': stream_parquet}
+
+
+def stream_export(store, fmt, primary_code, start_month=None, end_month=None, progress=None):
+    """Byte chunks of the whole export in `fmt` (see export_rows() for `progress`)."""
+    return WRITERS[fmt](export_rows(store, primary_code, start_month, end_month, progress))
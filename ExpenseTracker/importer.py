@@ -0,0 +1,259 @@
+"""
+Streaming import of bank statements (CSV and OFX).
+
+Files are read incrementally and inserted in chunked transactions, so memory use depends on the chunk
+size, not the file size. Every row is checked with store.validate_expense(), the same rules as the
+page's form. Progress and per-row errors come back as a stream of events:
+
+    {"event": "error", "row": 17, "error": "Amount must be greater than zero."}
+    {"event": "progress", "rows": 1000, "imported": 998, "errors": 2}
+    {"event": "done", "rows": 1234, "imported": 1231, "errors": 3}
+"""
+import csv
+import io
+import re
+from datetime import datetime
+
+from store import ValidationError, validate_expense
+
+CHUNK_SIZE = 1000
+
+# Recognized (lower-cased) CSV header names for each expense field.
+CSV_COLUMNS = {
+    'amount': ('amount', 'value', 'debit', 'sum', 'transaction amount'),
+    'currencyCode': ('currency', 'currencycode', 'currency_code', 'currency code', 'ccy'),
+    'category': ('category', 'type'),
+    'date': ('date', 'transaction date', 'posted date', 'posting date', 'booking date', 'value date'),
+    'note': ('note', 'description', 'memo', 'details', 'payee', 'narrative', 'name'),
+}
+
+# Decimal separators an amount may use; the other one is taken as the thousands separator.
+DECIMAL_SEPARATORS = ('.', ',')
+
+_AMOUNT_NOISE = re.compile(r"[^\d.,\-]")
+# A whole part with thousands separators: '1,234,567', or Indian lakh/crore grouping such as '12,34,567'
+_GROUPED = {
+    separator: re.compile(r'-?(?:\d{1,3}(?:S\d{3})+|\d{1,2}(?:S\d{2})+S\d{3})'.replace('S', re.escape(separator)))
+    for separator in DECIMAL_SEPARATORS
+}
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+
+class ImportOptions:
+    """How to interpret a statement's rows."""
+
+    def __init__(self, currency=None, category='Other', negate=False, date_format=None, decimal=None):
+        self.currency = currency          # used when a row has no currency column
+        self.category = category          # used when a row has no category column
+        self.negate = negate              # statements that record debits as negative amounts
+        self.date_format = date_format    # strptime format for non-ISO dates, e.g. '%d/%m/%Y'
+        self.decimal = decimal            # '.' or ','; None detects it per amount (see parse_amount())
+
+
+def _decimal_separator(cleaned, text):
+    """
+    The decimal separator of an amount with only digits, '-', '.' and ','. With both, the last one is
+    the decimal separator; a single separator repeated ('1,234,567') groups thousands. A single separator
+    followed by exactly three digits ('1,234', '1.234') could be either, so the row is refused.
+    """
+    last_dot, last_comma = cleaned.rfind('.'), cleaned.rfind(',')
+    if last_dot >= 0 and last_comma >= 0:
+        return '.' if last_dot > last_comma else ','
+    if last_dot < 0 and last_comma < 0:
+        return '.'
+    separator = '.' if last_dot >= 0 else ','
+    groups = cleaned.split(separator)
+    if len(groups) > 2:
+        return ',' if separator == '.' else '.'
+    if len(groups[1]) == 3:
+        raise ValidationError(
+            f"Amount {text!r} is ambiguous: {separator!r} may separate decimals or thousands. "
+            "Set the decimal separator ('.' or ',') for this statement.")
+    return separator
+
+
+def parse_amount(text, negate=False, decimal=None):
+    """
+    '1,234.50', '1.234,50', '12,50', '$12', '(12.00)' -> float. Parentheses mean negative, as in
+    accounting exports. `decimal` ('.' or ',') says which separator is the decimal one; the other is
+    then ignored as a thousands separator. None detects it (see _decimal_separator()).
+    """
+    text = str(text).strip()
+    negative = text.startswith('(') and text.endswith(')')
+    cleaned = _AMOUNT_NOISE.sub('', text)
+    if not cleaned:
+        raise ValidationError("Amount is required.")
+    decimal = decimal or _decimal_separator(cleaned, text)
+    thousands = ',' if decimal == '.' else '.'
+    whole, _, fraction = cleaned.rpartition(decimal) if decimal in cleaned else (cleaned, '', '')
+    try:
+        # Thousands separators must group the whole part's digits ('12,50' is not a thousands figure)
+        if thousands in whole and not _GROUPED[thousands].fullmatch(whole):
+            raise ValueError
+        amount = float(f"{whole.replace(thousands, '')}.{fraction}")
+    except ValueError:
+        raise ValidationError(f"Invalid amount {text!r}.") from None
+    if negative:
+        amount = -amount
+    return -amount if negate else amount
+
+
+def parse_date(text, date_format=None):
+    """Returns an ISO YYYY-MM-DD string (validate_expense() does the final check)."""
+    text = str(text).strip()
+    if date_format:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            raise ValidationError(f"Date {text!r} does not match {date_format!r}.") from None
+    return text[:10]
+
+
+def detect_format(filename, declared=None):
+    """'csv' or 'ofx', from an explicit format or the file extension."""
+    fmt = (declared or '').lower()
+    if fmt in ('csv', 'ofx'):
+        return fmt
+    if fmt and fmt != 'auto':
+        raise ValidationError(f"Unsupported import format {declared!r}; use csv or ofx.")
+    if filename and filename.lower().endswith(('.ofx', '.qfx')):
+        return 'ofx'
+    return 'csv'
+
+
+def as_text(stream):
+    """Wraps a binary stream for incremental text reading (BOM-tolerant)."""
+    if isinstance(stream, io.TextIOBase):
+        return stream
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+# --- READERS: yield (row number, payload or ValidationError) ---
+
+def read_csv(stream, options):
+    reader = csv.reader(as_text(stream))
+    header = next(reader, None)
+    if header is None:
+        return
+
+    normalized = [name.strip().lower() for name in header]
+    columns = {}
+    for field, aliases in CSV_COLUMNS.items():
+        for alias in aliases:
+            if alias in normalized:
+                columns[field] = normalized.index(alias)
+                break
+    missing = [field for field in ('amount', 'date') if field not in columns]
+    if missing:
+        raise ValidationError(f"CSV header is missing required column(s): {', '.join(missing)}.")
+
+    for line_number, record in enumerate(reader, start=2):
+        if not any(cell.strip() for cell in record):
+            continue
+
+        def cell(field, default=None):
+            index = columns.get(field)
+            if index is None or index >= len(record) or not record[index].strip():
+                return default
+            return record[index]
+
+        try:
+            yield line_number, {
+                'amount': parse_amount(cell('amount', ''), options.negate, options.decimal),
+                'currencyCode': cell('currencyCode', options.currency),
+                'category': cell('category', options.category),
+                'date': parse_date(cell('date', ''), options.date_format),
+                'note': cell('note', ''),
+            }
+        except ValidationError as error:
+            yield line_number, error
+
+
+def _ofx_tokens(text_stream, chunk_size=64 * 1024):
+    """Yields (closing, tag, value) from an OFX v1 (SGML) or v2 (XML) body without reading it whole."""
+    buffer = ''
+    while True:
+        chunk = text_stream.read(chunk_size)
+        buffer += chunk
+        # Only tokenize up to the last '<': the tag after it may be split across chunks.
+        cut = len(buffer) if not chunk else buffer.rfind('<')
+        if cut > 0:
+            for match in _OFX_TAG.finditer(buffer, 0, cut):
+                yield match.group(1) == '/', match.group(2).upper(), match.group(3).strip()
+            buffer = buffer[cut:]
+        if not chunk:
+            return
+
+
+def read_ofx(stream, options):
+    """Each <STMTTRN> is one row. OFX debits are negative, so they become positive expense amounts."""
+    currency = options.currency
+    transaction = None
+    number = 0
+    for closing, tag, value in _ofx_tokens(as_text(stream)):
+        if tag == 'CURDEF' and not closing and not options.currency:
+            currency = value
+        elif tag == 'STMTTRN':
+            if not closing:
+                transaction = {}
+                number += 1
+                continue
+            if transaction is None:
+                continue
+            try:
+                amount = -parse_amount(transaction.get('TRNAMT', ''), options.negate, options.decimal)
+                if amount < 0:
+                    raise ValidationError(f"Credit of {-amount:.2f} is not an expense.")
+                raw_date = transaction.get('DTPOSTED', '')
+                note = ' '.join(part for part in (transaction.get('NAME'), transaction.get('MEMO')) if part)
+                yield number, {
+                    'amount': amount,
+                    'currencyCode': currency,
+                    'category': options.category,
+                    'date': f'{raw_date[:4]}-{raw_date[4:6]}-{raw_date[6:8]}',
+                    'note': note,
+                }
+            except ValidationError as error:
+                yield number, error
+            transaction = None
+        elif transaction is not None and not closing:
+            transaction[tag] = value
+
+
+READERS = {'csv': read_csv, 'ofx': read_ofx}
+
+
+def import_statement(store, stream, fmt, options=None, chunk_size=CHUNK_SIZE):
+    """Validates and inserts a statement chunk by chunk; yields progress/error events as it goes."""
+    options = options or ImportOptions()
+    rows = imported = errors = 0
+    chunk = []
+
+    def flush():
+        nonlocal imported
+        if chunk:
+            imported += store.add_expenses(chunk)
+            chunk.clear()
+
+    try:
+        for row_number, payload in READERS[fmt](stream, options):
+            rows += 1
+            try:
+                if isinstance(payload, ValidationError):
+                    raise payload
+                chunk.append(validate_expense(payload))
+            except ValidationError as error:
+                errors += 1
+                yield {'event': 'error', 'row': row_number, 'error': str(error)}
+
+            if len(chunk) >= chunk_size:
+                flush()
+                yield {'event': 'progress', 'rows': rows, 'imported': imported, 'errors': errors}
+        flush()
+    except (ValidationError, csv.Error, UnicodeDecodeError) as error:
+        # A malformed file (rather than a bad row): keep what was committed and stop.
+        flush()
+        yield {'event': 'failed', 'rows': rows, 'imported': imported, 'errors': errors, 'error': str(error)}
+        return
+
+    yield {'event': 'done', 'rows': rows, 'imported': imported, 'errors': errors}
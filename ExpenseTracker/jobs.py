@@ -0,0 +1,421 @@
+"""
+Background jobs: statement imports, exports and rollup rebuilds that run outside the HTTP request.
+
+The queue is a small SQLite database of its own (not the expense database, so a job's progress writes
+never wait on the writer lock its own import holds). Every job has a row there from submission to
+cleanup, so its status, progress and result are visible from any server process and survive restarts:
+- POST /api/jobs/<kind> inserts a 'queued' row and hands the job to a pool of worker processes.
+- The worker that starts it claims the row ('queued' -> 'running' in one UPDATE). A job submitted twice,
+  for example by two server processes resuming the queue after a restart, therefore still runs once.
+- While it runs, the job writes its progress every PROGRESS_INTERVAL seconds at most, and at each write
+  it checks whether someone asked to cancel it.
+- It ends as 'done' (with a JSON result), 'failed' (with an error) or 'cancelled'.
+
+Jobs run in separate processes, each with its own connection to the expense database, so parsing and
+conversion use every core. SQLite still commits one write at a time. With the journal store, whose data
+lives in the server process, jobs run on threads instead.
+
+Files a job needs or makes (the uploaded statement, the finished export) live in the queue's directory
+until the job is pruned, JOB_RETENTION_DAYS after it finished.
+"""
+import functools
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import exporter
+from importer import ImportOptions, import_statement
+from store import ExpenseStore
+
+PROGRESS_INTERVAL = 0.25
+JOB_RETENTION_DAYS = 7
+# An import keeps this many of its row errors in the job result (the full count is always there)
+MAX_REPORTED_ERRORS = 100
+# The name of a job's uploaded input file (see JobQueue.submit())
+UPLOAD = 'upload'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress_done REAL NOT NULL DEFAULT 0,
+    progress_total REAL,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker_pid INTEGER,
+    result TEXT,
+    error TEXT,
+    created_at TEXT NOT NULL DEFAULT (datetime('now')),
+    started_at TEXT,
+    finished_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs (user_id, id);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status);
+'''
+
+
+class JobCancelled(Exception):
+    """Raised inside a job at its next progress report after a cancel request."""
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    return conn
+
+
+def job_from_row(row):
+    """A jobs row in the API's JSON shape."""
+    return {
+        'id': row['id'],
+        'kind': row['kind'],
+        'status': row['status'],
+        'progress': {'done': row['progress_done'], 'total': row['progress_total']},
+        'params': json.loads(row['params']),
+        'result': json.loads(row['result']) if row['result'] else None,
+        'error': row['error'],
+        'cancelRequested': bool(row['cancel_requested']),
+        'createdAt': row['created_at'],
+        'startedAt': row['started_at'],
+        'finishedAt': row['finished_at'],
+    }
+
+
+class JobQueue:
+    """
+    The jobs table at `path`, plus the pool that runs them.
+
+    `store` is the app's expense store. An ExpenseStore's jobs run in `workers` processes, each of which
+    opens the database itself; any other store's run on `workers` threads of this process.
+    """
+
+    def __init__(self, path, directory, store, workers=None):
+        self.path = path
+        self.directory = directory
+        self.store = store
+        self.workers = workers or os.cpu_count() or 1
+        self._local = threading.local()
+        self._executor_lock = threading.Lock()
+        self._executor = None
+        os.makedirs(directory, exist_ok=True)
+        conn = _connect(path)
+        try:
+            conn.executescript(SCHEMA)
+        finally:
+            conn.close()
+
+    @property
+    def conn(self):
+        """The calling thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = _connect(self.path)
+        return conn
+
+    def _pool(self):
+        with self._executor_lock:
+            if self._executor is None:
+                if isinstance(self.store, ExpenseStore):
+                    # spawn, not fork: the server process has threads and open SQLite connections
+                    self._executor = ProcessPoolExecutor(
+                        self.workers, mp_context=multiprocessing.get_context('spawn'),
+                        initializer=_start_worker, initargs=(self.store.path,))
+                else:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='jobs')
+            return self._executor
+
+    def _dispatch(self, job_id):
+        if isinstance(self.store, ExpenseStore):
+            task = functools.partial(_run_in_worker, job_id, self.path, self.directory)
+        else:
+            task = functools.partial(run_job, self.store, job_id, self.path, self.directory)
+        executor = self._pool()
+        try:
+            future = executor.submit(task)
+        except BrokenProcessPool:
+            self._replace_pool(executor)
+            future = self._pool().submit(task)
+        future.add_done_callback(functools.partial(self._dispatched, job_id, executor))
+
+    def _replace_pool(self, broken):
+        with self._executor_lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatched(self, job_id, executor, future):
+        # run_job() records its own outcome; an exception here means the worker itself died
+        error = future.exception() if not future.cancelled() else None
+        if error is None:
+            return
+        conn = _connect(self.path)
+        try:
+            conn.execute(
+                "UPDATE jobs SET status = 'failed', error = ?, finished_at = datetime('now') "
+                "WHERE id = ? AND status IN ('queued', 'running')",
+                (f'The job worker stopped unexpectedly ({type(error).__name__}).', job_id),
+            )
+        finally:
+            conn.close()
+        if isinstance(error, BrokenProcessPool):
+            self._replace_pool(executor)
+
+    # --- SUBMITTING & INSPECTING ---
+
+    def submit(self, user_id, kind, params, upload=None):
+        """
+        Queues a job of `kind` (one of JOB_KINDS) and returns it. `upload`, a binary file, is copied to
+        the job's UPLOAD file first (and removed once the job ends).
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f'Unknown job kind {kind!r}.')
+        job_id = self.conn.execute(
+            'INSERT INTO jobs (user_id, kind, params) VALUES (?, ?, ?)', (user_id, kind, json.dumps(params)),
+        ).lastrowid
+        if upload is not None:
+            try:
+                with open(self.file_path(job_id, UPLOAD), 'wb') as saved:
+                    shutil.copyfileobj(upload, saved, 1024 * 1024)
+            except BaseException:
+                self.conn.execute('DELETE FROM jobs WHERE id = ?', (job_id,))
+                _remove(self.file_path(job_id, UPLOAD))
+                raise
+        self._dispatch(job_id)
+        return self.get(job_id, user_id)
+
+    def get(self, job_id, user_id):
+        """The user's job, or None."""
+        row = self.conn.execute('SELECT * FROM jobs WHERE id = ? AND user_id = ?', (job_id, user_id)).fetchone()
+        return job_from_row(row) if row else None
+
+    def list_jobs(self, user_id, limit=50):
+        """The user's most recent jobs, newest first."""
+        rows = self.conn.execute(
+            'SELECT * FROM jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?', (user_id, limit),
+        ).fetchall()
+        return [job_from_row(row) for row in rows]
+
+    def cancel(self, job_id, user_id):
+        """
+        Cancels a queued job at once, or asks a running one to stop at its next progress report.
+        Returns the job (None if the user has no such job). Finished jobs are left as they are.
+        """
+        if self.conn.execute(
+            "UPDATE jobs SET status = 'cancelled', finished_at = datetime('now') "
+            "WHERE id = ? AND user_id = ? AND status = 'queued'", (job_id, user_id),
+        ).rowcount:
+            _remove(self.file_path(job_id, UPLOAD))
+        self.conn.execute(
+            "UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND user_id = ? AND status = 'running'",
+            (job_id, user_id),
+        )
+        return self.get(job_id, user_id)
+
+    def file_path(self, job_id, name):
+        """Where job `job_id` keeps its file called `name`."""
+        return job_file(self.directory, job_id, name)
+
+    # --- RESTARTS & CLEANUP ---
+
+    def resume(self):
+        """
+        Hands every queued job to the pool again and fails running jobs whose worker process is gone.
+        Call once when a server process starts using the queue.
+        """
+        running = self.conn.execute("SELECT id, worker_pid FROM jobs WHERE status = 'running'").fetchall()
+        for row in running:
+            if row['worker_pid'] is None or not _process_alive(row['worker_pid']):
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, finished_at = datetime('now') "
+                    "WHERE id = ? AND status = 'running'",
+                    ('The server stopped while this job was running.', row['id']),
+                )
+        for row in self.conn.execute("SELECT id FROM jobs WHERE status = 'queued' ORDER BY id").fetchall():
+            self._dispatch(row['id'])
+
+    def prune(self, days=JOB_RETENTION_DAYS):
+        """Deletes jobs that finished more than `days` ago, with their files."""
+        rows = self.conn.execute(
+            "SELECT id FROM jobs WHERE status IN ('done', 'failed', 'cancelled') "
+            "AND finished_at < datetime('now', ?)", (f'-{days} days',),
+        ).fetchall()
+        for row in rows:
+            prefix = f"{row['id']}-"
+            for name in os.listdir(self.directory):
+                if name.startswith(prefix):
+                    os.remove(os.path.join(self.directory, name))
+            self.conn.execute('DELETE FROM jobs WHERE id = ?', (row['id'],))
+        return len(rows)
+
+    def close(self):
+        with self._executor_lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def job_file(directory, job_id, name):
+    return os.path.join(directory, f'{job_id}-{name}')
+
+
+def _remove(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+# --- RUNNING (in a worker process or thread) ---
+
+class JobContext:
+    """What a running job sees: its id, parameters and files, and a progress() that also checks for cancellation."""
+
+    def __init__(self, conn, job_id, params, directory):
+        self.conn = conn
+        self.job_id = job_id
+        self.params = params
+        self.directory = directory
+        self._last_report = 0.0
+        self._total = None
+
+    def file(self, name):
+        return job_file(self.directory, self.job_id, name)
+
+    def progress(self, done, total=None, force=False):
+        """
+        Records progress (at most every PROGRESS_INTERVAL seconds, unless the total changes); raises
+        JobCancelled if asked to stop.
+        """
+        now = time.monotonic()
+        if not force and total == self._total and now - self._last_report < PROGRESS_INTERVAL:
+            return
+        self._last_report, self._total = now, total
+        row = self.conn.execute(
+            'UPDATE jobs SET progress_done = ?, progress_total = ? WHERE id = ? RETURNING cancel_requested',
+            (done, total, self.job_id),
+        ).fetchall()  # fetch every row: a RETURNING statement holds the write lock until it completes
+        if row and row[0]['cancel_requested']:
+            raise JobCancelled()
+
+
+def run_job(store, job_id, queue_path, directory):
+    """Claims job `job_id` and runs it against `store`, recording the outcome. Does nothing if it isn't queued."""
+    conn = _connect(queue_path)
+    try:
+        claimed = conn.execute(
+            "UPDATE jobs SET status = 'running', started_at = datetime('now'), worker_pid = ? "
+            "WHERE id = ? AND status = 'queued' RETURNING user_id, kind, params",
+            (os.getpid(), job_id),
+        ).fetchall()
+        if not claimed:
+            return  # cancelled while queued, or already run by another process
+        claimed = claimed[0]
+        context = JobContext(conn, job_id, json.loads(claimed['params']), directory)
+        status, result, error = 'done', None, None
+        try:
+            context.progress(0, None, force=True)
+            result = JOB_KINDS[claimed['kind']](store.for_user(claimed['user_id']), context)
+        except JobCancelled:
+            status = 'cancelled'
+        except Exception as failure:
+            status, error = 'failed', str(failure) or type(failure).__name__
+        finally:
+            _remove(context.file(UPLOAD))
+        conn.execute(
+            "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = datetime('now') WHERE id = ?",
+            (status, json.dumps(result) if result is not None else None, error, job_id),
+        )
+        if status == 'done':
+            conn.execute(
+                'UPDATE jobs SET progress_done = coalesce(progress_total, 1), progress_total = coalesce(progress_total, 1) '
+                'WHERE id = ?', (job_id,),
+            )
+    finally:
+        conn.close()
+
+
+_worker_store = None
+
+
+def _start_worker(store_path):
+    """ProcessPoolExecutor initializer: each worker process opens the expense database once."""
+    global _worker_store
+    _worker_store = ExpenseStore(store_path)
+
+
+def _run_in_worker(job_id, queue_path, directory):
+    run_job(_worker_store, job_id, queue_path, directory)
+
+
+# --- JOB KINDS: function(store scoped to the job's user, JobContext) -> JSON-ready result ---
+
+def import_job(store, job):
+    """
+    Imports the job's UPLOAD file. Params: format, options (ImportOptions' fields) and chunk_size.
+    Progress is in bytes of the file. Chunks committed before the job is cancelled, or before the file
+    turns out to be malformed, stay imported (as with POST /api/import).
+    """
+    params = job.params
+    options = ImportOptions(**params.get('options', {}))
+    summary = {'rows': 0, 'imported': 0, 'errors': 0, 'rowErrors': []}
+    with open(job.file(UPLOAD), 'rb') as statement:
+        size = os.fstat(statement.fileno()).st_size
+        for event in import_statement(store, statement, params['format'], options, params.get('chunk_size') or 1000):
+            if event['event'] == 'error':
+                if len(summary['rowErrors']) < MAX_REPORTED_ERRORS:
+                    summary['rowErrors'].append({'row': event['row'], 'error': event['error']})
+                continue
+            summary.update(rows=event['rows'], imported=event['imported'], errors=event['errors'])
+            if event['event'] == 'failed':
+                raise ValueError(f"{event['error']} ({event['imported']} rows were imported before it)")
+            if event['event'] == 'progress':
+                job.progress(statement.tell(), size)
+    return summary
+
+
+def export_job(store, job):
+    """Writes the export to a file. Params: format, primary, from, to. Progress is in months."""
+    params = job.params
+    extension = exporter.FORMATS[params['format']][1]
+    name = f'expenses.{extension}'
+    partial = job.file(name + '.partial')
+    try:
+        with open(partial, 'wb') as output:
+            for chunk in exporter.stream_export(store, params['format'], params.get('primary') or 'USD',
+                                                params.get('from'), params.get('to'), job.progress):
+                output.write(chunk)
+        os.replace(partial, job.file(name))
+    finally:
+        _remove(partial)
+    return {'file': name, 'bytes': os.path.getsize(job.file(name))}
+
+
+def rebuild_rollups_job(store, job):
+    """Recomputes the user's monthly rollups from their expenses."""
+    store.rebuild_rollups()
+    return {'rebuilt': True}
+
+
+JOB_KINDS = {
+    'import': import_job,
+    'export': export_job,
+    'rebuild-rollups': rebuild_rollups_job,
+}
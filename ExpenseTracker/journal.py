@@ -0,0 +1,914 @@
+"""
+File-backed expense store: an append-only operation journal plus periodic snapshots.
+
+An alternative to the SQLite ExpenseStore with the same methods, for setups that want plain files.
+All data is held in memory. Every change appends one record to the journal; records are
+group-committed by a background writer, so concurrent writers share each fsync. When the journal has
+grown by `compact_bytes`, a background compaction does three things:
+1. Writes the whole state to a new snapshot: write to a temporary file, fsync it, then rename it.
+2. Starts a new journal segment.
+3. Deletes the segments and snapshots the new snapshot covers.
+
+Opening the directory loads the newest snapshot and replays only the journal records after it.
+
+Layout of the directory:
+
+    snapshot-<seq>.json      state as of journal record <seq>
+    journal-<seq>.log        records from <seq> on, one per line: "<crc32 hex> <json>"
+
+A crash can at worst leave a torn record at the end of the last segment. Replay detects it by its
+checksum and cuts it off. Damage anywhere else raises JournalCorruptError instead of silently losing data.
+
+Durability (`sync`):
+- 'always' (default): a write returns only once its record is fsynced.
+- 'interval': the writer fsyncs every `flush_interval` seconds, so a power cut can lose that much.
+- 'none': leaves flushing to the OS.
+
+The state lives in one process, so serve it with a single worker (threads are fine).
+"""
+import bisect
+import gc
+import glob
+import heapq
+import json
+import math
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from store import DEFAULT_USER_ID, SEARCH_CANDIDATES, UserStore, ValidationError, search_terms
+
+SYNC_MODES = ('always', 'interval', 'none')
+SNAPSHOT_FORMAT = 1
+
+
+class JournalCorruptError(RuntimeError):
+    """A journal or snapshot is damaged somewhere other than a torn final record."""
+
+
+def encode_record(record):
+    payload = json.dumps(record, separators=(',', ':'), ensure_ascii=False)
+    return f'{zlib.crc32(payload.encode("utf-8")):08x} {payload}\n'
+
+
+def decode_record(line):
+    """The record on one journal line, or None if it is torn or fails its checksum."""
+    if not line.endswith('\n') or len(line) < 10 or line[8] != ' ':
+        return None
+    payload = line[9:-1]
+    try:
+        if int(line[:8], 16) != zlib.crc32(payload.encode('utf-8')):
+            return None
+        return json.loads(payload)
+    except ValueError:
+        return None
+
+
+def _sequence_number(path):
+    return int(os.path.basename(path).split('-')[1].split('.')[0])
+
+
+def _fsync_directory(directory):
+    if os.name == 'nt':  # directories can't be opened for fsync on Windows
+        return
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _now():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _expense_dict(row):
+    expense_id, amount, currency_code, category, date, note = row
+    return {'id': expense_id, 'amount': amount, 'currencyCode': currency_code,
+            'category': category, 'date': date, 'note': note}
+
+
+class _ChangeLog:
+    """One user's delta-sync log: the latest (seq, op) of every entity, readable in seq order."""
+
+    def __init__(self, entries=()):
+        # (seq, entity, key, op), ascending seq; superseded entries are skipped
+        self.entries = [tuple(entry) for entry in entries]
+        # (entity, key) -> seq of its live entry
+        self.latest = {(entity, key): seq for seq, entity, key, _ in self.entries}
+
+    def record(self, seq, entity, key, op):
+        self.entries.append((seq, entity, key, op))
+        self.latest[entity, key] = seq
+        # Drop superseded entries once they make up most of the list (amortized O(1) per record)
+        if len(self.entries) > 2 * len(self.latest) + 1024:
+            self.entries = self.live()
+
+    def live(self):
+        return [entry for entry in self.entries if self.latest[entry[1], entry[2]] == entry[0]]
+
+    def last_seq(self):
+        return self.entries[-1][0] if self.entries else 0
+
+    def since(self, seq, limit):
+        """
+        Live entries after `seq`: `limit` of them, or more to finish the last one's seq. All the rows of
+        one add_expenses() record share its seq, and a cursor can't point inside a record.
+        """
+        found = []
+        for entry in self.entries[bisect.bisect_left(self.entries, (seq + 1,)):]:
+            if len(found) >= limit and entry[0] != found[-1][0]:
+                break
+            if self.latest[entry[1], entry[2]] == entry[0]:
+                found.append(entry)
+        return found
+
+
+class _SearchIndex:
+    """
+    Inverted index over category and note words, for search(): word -> {expense id: term frequency}.
+    Scores follow FTS5's bm25(): category words count double in the term frequency (the column weights
+    ExpenseStore passes), while row lengths are plain word counts.
+    """
+
+    CATEGORY_WEIGHT = 2
+    K1, B = 1.2, 0.75  # the BM25 constants FTS5 uses
+
+    def __init__(self, rows=()):
+        self.postings = {}
+        self.lengths = {}  # expense id -> word count
+        self.total_length = 0
+        for row in rows:
+            self.add(row[0], row[3], row[5], bulk=True)
+        self.words = sorted(self.postings)  # the vocabulary, for prefix lookups
+
+    def _counts(self, category, note):
+        """({word: weighted frequency}, word count)."""
+        counts = {}
+        category_words, note_words = search_terms(category), search_terms(note)
+        for word in category_words:
+            counts[word] = counts.get(word, 0) + self.CATEGORY_WEIGHT
+        for word in note_words:
+            counts[word] = counts.get(word, 0) + 1
+        return counts, len(category_words) + len(note_words)
+
+    def add(self, expense_id, category, note, bulk=False):
+        counts, length = self._counts(category, note)
+        for word, count in counts.items():
+            posting = self.postings.get(word)
+            if posting is None:
+                posting = self.postings[word] = {}
+                if not bulk:
+                    bisect.insort(self.words, word)
+            posting[expense_id] = count
+        self.lengths[expense_id] = length
+        self.total_length += length
+
+    def remove(self, expense_id, category, note):
+        for word in self._counts(category, note)[0]:
+            posting = self.postings[word]
+            del posting[expense_id]
+            if not posting:
+                del self.postings[word]
+                del self.words[bisect.bisect_left(self.words, word)]
+        self.total_length -= self.lengths.pop(expense_id)
+
+    def _prefix_postings(self, prefix):
+        """{expense id: summed frequency} over every word starting with `prefix` (read-only)."""
+        first = bisect.bisect_left(self.words, prefix)
+        last = first
+        while last < len(self.words) and self.words[last].startswith(prefix):
+            last += 1
+        if last - first == 1:
+            return self.postings[self.words[first]]
+        merged = {}
+        for word in self.words[first:last]:
+            for expense_id, count in self.postings[word].items():
+                merged[expense_id] = merged.get(expense_id, 0) + count
+        return merged
+
+    def scores(self, terms, accept, candidates):
+        """
+        {expense id: BM25 score (higher is better)} for the newest `candidates` ids that match every term as
+        a word prefix and pass accept(id) (if given).
+        """
+        documents = len(self.lengths)
+        if not documents or not terms:
+            return {}
+        # Rarest term first, so the intersection starts small
+        postings = sorted((self._prefix_postings(term) for term in terms), key=len)
+        matches = postings[0]
+        if len(postings) > 1:
+            matches = (expense_id for expense_id in matches if all(expense_id in other for other in postings[1:]))
+        if accept is not None:
+            matches = filter(accept, matches)
+        average_length = self.total_length / documents
+        weights = [
+            (max(math.log((documents - len(frequencies) + 0.5) / (len(frequencies) + 0.5)), 1e-6), frequencies)
+            for frequencies in postings
+        ]
+        return {
+            expense_id: sum(
+                idf * frequencies[expense_id] * (self.K1 + 1) / (frequencies[expense_id] + self.K1 * (
+                    1 - self.B + self.B * self.lengths[expense_id] / average_length))
+                for idf, frequencies in weights
+            )
+            # Ids arrive roughly in insertion order, which sorts in about linear time (nlargest would not)
+            for expense_id in sorted(matches)[-candidates:]
+        }
+
+
+class _UserData:
+    """Everything one user owns, with the same secondary structures the SQLite indexes provide."""
+
+    def __init__(self):
+        self.expenses = {}  # id -> (id, amount, currency_code, category, date, note)
+        self.months = {}    # 'YYYY-MM' -> sorted [(date, id)]
+        self.rollups = {}   # 'YYYY-MM' -> {(category, currency_code): [total, count]}
+        self.budgets = {}
+        self.colors = {}
+        self.changes = _ChangeLog()
+        self.epoch = 1
+        self.search_index = None  # built on the first search
+
+    def insert(self, row):
+        expense_id, amount, currency_code, category, date = row[:5]
+        self.expenses[expense_id] = row
+        bisect.insort(self.months.setdefault(date[:7], []), (date, expense_id))
+        totals = self.rollups.setdefault(date[:7], {}).setdefault((category, currency_code), [0.0, 0])
+        totals[0] += amount
+        totals[1] += 1
+        if self.search_index is not None:
+            self.search_index.add(expense_id, category, row[5])
+
+    def load(self, rows):
+        """Bulk insert for snapshots: one sort per month instead of one insort per row."""
+        expenses, months, rollups = self.expenses, self.months, self.rollups
+        for expense_id, amount, currency_code, category, date, note in rows:
+            month = date[:7]
+            expenses[expense_id] = (expense_id, amount, currency_code, category, date, note)
+            keys = months.get(month)
+            if keys is None:
+                keys = months[month] = []
+                rollups[month] = {}
+            keys.append((date, expense_id))
+            totals = rollups[month].get((category, currency_code))
+            if totals is None:
+                totals = rollups[month][category, currency_code] = [0.0, 0]
+            totals[0] += amount
+            totals[1] += 1
+        for keys in months.values():
+            keys.sort()
+        self.search_index = None
+
+    def remove(self, expense_id):
+        row = self.expenses.pop(expense_id)
+        _, amount, currency_code, category, date = row[:5]
+        month = date[:7]
+        keys = self.months[month]
+        del keys[bisect.bisect_left(keys, (date, expense_id))]
+        if not keys:
+            del self.months[month]
+        month_rollups = self.rollups[month]
+        totals = month_rollups[category, currency_code]
+        totals[0] -= amount
+        totals[1] -= 1
+        if totals[1] <= 0:
+            del month_rollups[category, currency_code]
+            if not month_rollups:
+                del self.rollups[month]
+        if self.search_index is not None:
+            self.search_index.remove(expense_id, category, row[5])
+        return row
+
+    def search(self, terms, accept, candidates):
+        if self.search_index is None:
+            self.search_index = _SearchIndex(self.expenses.values())
+        return self.search_index.scores(terms, accept, candidates)
+
+    def months_between(self, start_month=None, end_month=None):
+        return sorted(month for month in self.months
+                      if (start_month is None or month >= start_month) and (end_month is None or month <= end_month))
+
+
+class JournalStore:
+    """Journal-and-snapshot persistence with the ExpenseStore interface (see the module docstring)."""
+
+    def __init__(self, directory, sync='always', flush_interval=0.05, compact_bytes=64 * 1024 * 1024):
+        if sync not in SYNC_MODES:
+            raise ValueError(f"sync must be one of {', '.join(SYNC_MODES)}.")
+        self.directory = directory
+        self.sync = sync
+        self.flush_interval = flush_interval
+        self.compact_bytes = compact_bytes
+
+        self._lock = threading.RLock()
+        self._work = threading.Condition(self._lock)     # the writer waits here for records
+        self._durable = threading.Condition(self._lock)  # writes wait here for their fsync
+        self._compact_lock = threading.Lock()
+        self._pending = []          # (seq, line), or (seq, None) to start a new segment at seq
+        self._durable_seq = 0
+        self._snapshot_seq = 0
+        self._journal_bytes = 0     # appended since the last snapshot
+        self._writer_pid = None
+        self._writer_error = None
+        self._closing = False
+        self._compactor = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._reset_state()
+        # Recovery allocates millions of small acyclic objects; pausing the cycle collector saves ~30%
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            self._recover()
+        finally:
+            if collecting:
+                gc.enable()
+
+    def for_user(self, user_id):
+        """A view of this store limited to one user's data."""
+        return UserStore(self, user_id)
+
+    def _reset_state(self):
+        self._seq = 0
+        self._users = {}            # user_id -> _UserData
+        self._accounts = {DEFAULT_USER_ID: {'id': DEFAULT_USER_ID, 'username': 'default',
+                                            'password_hash': None, 'created_at': _now()}}
+        self._tokens = {}           # token hash -> user_id
+        self._expense_owner = {}    # expense id -> user_id (ids are unique across users)
+        self._next_expense_id = 1
+
+    def _user(self, user_id):
+        data = self._users.get(user_id)
+        if data is None:
+            data = self._users[user_id] = _UserData()
+        return data
+
+    # --- RECOVERY ---
+
+    def _recover(self):
+        snapshots = sorted(glob.glob(os.path.join(self.directory, 'snapshot-*.json')), key=_sequence_number)
+        if snapshots:
+            try:
+                with open(snapshots[-1], encoding='utf-8') as handle:
+                    self._load_snapshot(json.load(handle))
+                self._snapshot_seq = self._seq
+            except (OSError, ValueError, KeyError) as error:
+                raise JournalCorruptError(f"{snapshots[-1]}: unreadable snapshot ({error}).") from None
+
+        segments = sorted(glob.glob(os.path.join(self.directory, 'journal-*.log')), key=_sequence_number)
+        for index, path in enumerate(segments):
+            if index + 1 < len(segments) and _sequence_number(segments[index + 1]) <= self._seq + 1:
+                continue  # wholly covered by the snapshot
+            self._replay_segment(path, last=index == len(segments) - 1)
+        self._durable_seq = self._seq
+
+    def _replay_segment(self, path, last):
+        with open(path, 'rb') as handle:
+            data = handle.read()
+        offset = 0
+        for raw in data.splitlines(keepends=True):
+            record = decode_record(raw.decode('utf-8', errors='replace'))
+            if record is None:
+                if last:
+                    # A torn write from a crash: keep everything before it
+                    with open(path, 'r+b') as handle:
+                        handle.truncate(offset)
+                        os.fsync(handle.fileno())
+                    return
+                raise JournalCorruptError(f"{path}: damaged record at byte {offset}.")
+            offset += len(raw)
+            if record['seq'] <= self._seq:
+                continue
+            if record['seq'] != self._seq + 1:
+                raise JournalCorruptError(f"{path}: records {self._seq + 1} to {record['seq'] - 1} are missing.")
+            self._apply(record)
+            self._seq = record['seq']
+            self._journal_bytes += len(raw)
+
+    def _load_snapshot(self, snapshot):
+        if snapshot.get('format') != SNAPSHOT_FORMAT:
+            raise ValueError(f"unsupported snapshot format {snapshot.get('format')!r}")
+        self._reset_state()
+        self._seq = snapshot['seq']
+        self._next_expense_id = snapshot['nextExpenseId']
+        for user_id, username, password_hash, created_at in snapshot['accounts']:
+            self._accounts[user_id] = {'id': user_id, 'username': username,
+                                       'password_hash': password_hash, 'created_at': created_at}
+        self._tokens = dict(snapshot['tokens'])
+        for user_id, saved in snapshot['users'].items():
+            data = self._user(int(user_id))
+            data.epoch = saved['epoch']
+            data.load(saved['expenses'])
+            self._expense_owner.update(dict.fromkeys(data.expenses, int(user_id)))
+            data.budgets = saved['budgets']
+            data.colors = saved['colors']
+            data.changes = _ChangeLog(saved['changes'])
+
+    def _snapshot_state(self):
+        """The whole state as JSON-ready data. Rows are immutable tuples, so copying the containers suffices."""
+        return {
+            'format': SNAPSHOT_FORMAT,
+            'seq': self._seq,
+            'nextExpenseId': self._next_expense_id,
+            'accounts': [[a['id'], a['username'], a['password_hash'], a['created_at']]
+                         for a in self._accounts.values() if a['id'] != DEFAULT_USER_ID or a['password_hash']],
+            'tokens': dict(self._tokens),
+            'users': {
+                str(user_id): {
+                    'epoch': data.epoch,
+                    'expenses': list(data.expenses.values()),
+                    'budgets': dict(data.budgets),
+                    'colors': dict(data.colors),
+                    'changes': data.changes.live(),
+                }
+                for user_id, data in self._users.items()
+            },
+        }
+
+    # --- JOURNAL WRITER ---
+
+    def _commit(self, record):
+        """Applies `record` and queues it for the journal; with sync='always', returns once it is on disk."""
+        with self._lock:
+            if self._writer_error is not None:
+                raise OSError(f"The journal can't be written: {self._writer_error}")
+            if self._closing:
+                raise RuntimeError("The journal store is closed.")
+            self._start_writer()
+            record = dict(record, seq=self._seq + 1)
+            result = self._apply(record)
+            self._seq = record['seq']
+            line = encode_record(record)
+            self._pending.append((self._seq, line))
+            self._journal_bytes += len(line)
+            self._work.notify()
+            if self._journal_bytes >= self.compact_bytes and self._compactor is None:
+                self._compactor = threading.Thread(target=self._background_compact, daemon=True)
+                self._compactor.start()
+            if self.sync == 'always':
+                self._wait_durable(self._seq)
+        return result
+
+    def _start_writer(self):
+        # After a fork (e.g. a gunicorn worker) the parent's writer thread doesn't exist: start our own
+        if self._writer_pid != os.getpid():
+            self._writer_pid = os.getpid()
+            threading.Thread(target=self._write_loop, daemon=True).start()
+
+    def _wait_durable(self, seq):
+        with self._lock:
+            while self._durable_seq < seq and self._writer_error is None:
+                self._durable.wait()
+            if self._durable_seq < seq:
+                raise OSError(f"The journal can't be written: {self._writer_error}")
+
+    def _write_loop(self):
+        segment = None
+        while True:
+            with self._lock:
+                while not self._pending and not self._closing:
+                    self._work.wait()
+                if self.sync == 'interval' and not self._closing:
+                    self._work.wait(self.flush_interval)  # let more records join this fsync
+                batch, self._pending = self._pending, []
+                if not batch and self._closing:
+                    break
+            try:
+                lines = []
+                for seq, line in batch:
+                    if line is None or segment is None:
+                        if segment is not None:
+                            self._flush(segment, lines)
+                            segment.close()
+                            lines = []
+                        segment = open(os.path.join(self.directory, f'journal-{seq:016d}.log'), 'a',
+                                       encoding='utf-8', newline='')
+                        _fsync_directory(self.directory)
+                    if line is not None:
+                        lines.append(line)
+                self._flush(segment, lines)
+            except OSError as error:
+                with self._lock:
+                    self._writer_error = error
+                    self._durable.notify_all()
+                return
+            with self._lock:
+                self._durable_seq = max(self._durable_seq, batch[-1][0] - (batch[-1][1] is None))
+                self._durable.notify_all()
+        if segment is not None:
+            segment.close()
+
+    def _flush(self, segment, lines):
+        segment.write(''.join(lines))
+        segment.flush()
+        if self.sync != 'none':
+            os.fsync(segment.fileno())
+
+    # --- COMPACTION ---
+
+    def compact(self):
+        """Writes a snapshot of the current state and deletes the journal segments and snapshots it covers."""
+        with self._compact_lock:
+            with self._lock:
+                state = self._snapshot_state()
+                seq = state['seq']
+                if seq == self._snapshot_seq:
+                    return
+                self._start_writer()
+                self._pending.append((seq + 1, None))  # records after the snapshot go to a new segment
+                self._journal_bytes = 0
+                self._work.notify()
+
+            path = os.path.join(self.directory, f'snapshot-{seq:016d}.json')
+            temporary = path + '.tmp'
+            with open(temporary, 'w', encoding='utf-8') as handle:
+                json.dump(state, handle, separators=(',', ':'), ensure_ascii=False)
+                handle.flush()
+                os.fsync(handle.fileno())
+            os.replace(temporary, path)
+            _fsync_directory(self.directory)
+            self._snapshot_seq = seq
+
+            # Only now is it safe to drop what the snapshot replaces
+            for old in glob.glob(os.path.join(self.directory, 'journal-*.log')):
+                if _sequence_number(old) <= seq:
+                    self._remove(old)
+            for old in glob.glob(os.path.join(self.directory, 'snapshot-*.json')):
+                if _sequence_number(old) < seq:
+                    self._remove(old)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:  # e.g. still open on Windows; replay skips what a newer snapshot covers
+            pass
+
+    def _background_compact(self):
+        try:
+            self.compact()
+        finally:
+            with self._lock:
+                self._compactor = None
+
+    def close(self):
+        """Flushes every queued record and stops the writer thread."""
+        with self._lock:
+            self._closing = True
+            self._work.notify_all()
+            seq = self._seq
+        if self._writer_pid == os.getpid():
+            self._wait_durable(seq)
+
+    # --- TRANSACTIONS ---
+
+    @contextmanager
+    def transaction(self):
+        """Holds the store lock; each operation inside is still its own journal record."""
+        with self._lock:
+            yield self
+
+    @contextmanager
+    def read_transaction(self):
+        """One consistent view across several reads."""
+        with self._lock:
+            yield self
+
+    # --- APPLYING RECORDS (live writes and replay share this) ---
+
+    def _apply(self, record):
+        return getattr(self, f'_apply_{record["op"]}')(record)
+
+    def _log(self, data, seq, entity, key, op):
+        data.changes.record(seq, entity, str(key), op)
+
+    def _apply_add_expenses(self, record):
+        data = self._user(record['user'])
+        for row in record['rows']:
+            row = tuple(row)
+            data.insert(row)
+            self._expense_owner[row[0]] = record['user']
+            self._next_expense_id = max(self._next_expense_id, row[0] + 1)
+            self._log(data, record['seq'], 'expense', row[0], 'upsert')
+        return len(record['rows'])
+
+    def _apply_update_expense(self, record):
+        data = self._user(record['user'])
+        data.remove(record['row'][0])
+        data.insert(tuple(record['row']))
+        self._log(data, record['seq'], 'expense', record['row'][0], 'upsert')
+
+    def _apply_delete_expense(self, record):
+        data = self._user(record['user'])
+        data.remove(record['id'])
+        del self._expense_owner[record['id']]
+        self._log(data, record['seq'], 'expense', record['id'], 'delete')
+
+    def _apply_set_budget(self, record):
+        data = self._user(record['user'])
+        data.budgets[record['month']] = record['amount']
+        self._log(data, record['seq'], 'budget', record['month'], 'upsert')
+
+    def _apply_set_category_color(self, record):
+        data = self._user(record['user'])
+        data.colors[record['category']] = record['color']
+        self._log(data, record['seq'], 'categoryColor', record['category'], 'upsert')
+
+    def _apply_clear_all(self, record):
+        old = self._users.pop(record['user'], None)
+        data = self._user(record['user'])
+        if old is not None:
+            for expense_id in old.expenses:
+                del self._expense_owner[expense_id]
+            data.epoch = old.epoch + 1
+        else:
+            data.epoch = 2
+
+    def _apply_add_user(self, record):
+        self._accounts[record['id']] = {'id': record['id'], 'username': record['username'],
+                                        'password_hash': record['passwordHash'], 'created_at': record['createdAt']}
+        return record['id']
+
+    def _apply_set_password(self, record):
+        self._accounts[record['id']]['password_hash'] = record['passwordHash']
+
+    def _apply_add_token(self, record):
+        self._tokens[record['tokenHash']] = record['user']
+
+    def _apply_delete_token(self, record):
+        self._tokens.pop(record['tokenHash'], None)
+
+    # --- EXPENSES ---
+
+    def list_expenses(self, month=None, limit=None, after=None, user_id=DEFAULT_USER_ID):
+        """Expenses newest first (all, or one month's); `limit`/`after` give keyset pages as in ExpenseStore."""
+        found = []
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            months = [month] if month is not None else sorted(data.months, reverse=True)
+            for current in months:
+                if after is not None and current > after[0][:7]:
+                    continue
+                keys = data.months.get(current, [])
+                end = bisect.bisect_left(keys, tuple(after)) if after is not None else len(keys)
+                for _, expense_id in reversed(keys[:end]):
+                    found.append(_expense_dict(data.expenses[expense_id]))
+                    if limit is not None and len(found) == limit:
+                        return found
+        return found
+
+    def expense_rows(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """(amount, currency_code, category, date) rows, optionally within an inclusive month range."""
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            return [data.expenses[expense_id][1:5]
+                    for month in data.months_between(start_month, end_month)
+                    for _, expense_id in data.months[month]]
+
+    def months(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """Months that have expenses, oldest first."""
+        with self._lock:
+            return (self._users.get(user_id) or _UserData()).months_between(start_month, end_month)
+
+    def iter_month_expenses(self, month, user_id=DEFAULT_USER_ID):
+        """One month's rows oldest first, with the SQL column names the exporter reads."""
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            rows = [data.expenses[expense_id] for _, expense_id in data.months.get(month, [])]
+        return [dict(zip(('id', 'amount', 'currency_code', 'category', 'date', 'note'), row)) for row in rows]
+
+    def get_expense(self, expense_id, user_id=DEFAULT_USER_ID):
+        with self._lock:
+            data = self._users.get(user_id)
+            row = data.expenses.get(expense_id) if data else None
+        return _expense_dict(row) if row else None
+
+    @staticmethod
+    def _row(expense_id, expense):
+        return [expense_id, expense['amount'], expense['currencyCode'], expense['category'],
+                expense['date'], expense['note']]
+
+    def add_expense(self, expense, user_id=DEFAULT_USER_ID):
+        """Inserts one validated expense and returns it with its id."""
+        with self._lock:
+            expense_id = expense.get('id')
+            if self._expense_owner.get(expense_id, user_id) != user_id:
+                expense_id = None  # another user's id: a new one, as in ExpenseStore
+            elif expense_id in self._expense_owner:
+                raise ValidationError(f"Expense {expense_id} already exists.")
+            if expense_id is None:
+                expense_id = self._next_expense_id
+            self._commit({'op': 'add_expenses', 'user': user_id, 'rows': [self._row(expense_id, expense)]})
+        return dict(expense, id=expense_id)
+
+    def add_expenses(self, expenses, user_id=DEFAULT_USER_ID):
+        """
+        Bulk-inserts validated expenses as one journal record. Rows whose id the user already has are skipped;
+        an id another user has is replaced with a new one (as in ExpenseStore).
+        """
+        with self._lock:
+            rows, taken, next_id = [], set(), self._next_expense_id
+            for expense in expenses:
+                expense_id = expense.get('id')
+                if expense_id is None or self._expense_owner.get(expense_id, user_id) != user_id:
+                    expense_id = next_id
+                elif expense_id in self._expense_owner or expense_id in taken:
+                    continue
+                next_id = max(next_id, expense_id + 1)
+                taken.add(expense_id)
+                rows.append(self._row(expense_id, expense))
+            return self._commit({'op': 'add_expenses', 'user': user_id, 'rows': rows}) if rows else 0
+
+    def update_expense(self, expense_id, expense, user_id=DEFAULT_USER_ID):
+        """Replaces an expense's fields. Returns the updated expense, or None if it doesn't exist."""
+        with self._lock:
+            if self._expense_owner.get(expense_id) != user_id:
+                return None
+            self._commit({'op': 'update_expense', 'user': user_id, 'row': self._row(expense_id, expense)})
+        return dict(expense, id=expense_id)
+
+    def delete_expense(self, expense_id, user_id=DEFAULT_USER_ID):
+        with self._lock:
+            if self._expense_owner.get(expense_id) != user_id:
+                return False
+            self._commit({'op': 'delete_expense', 'user': user_id, 'id': expense_id})
+        return True
+
+    # --- SEARCH ---
+
+    def search(self, text, min_amount=None, max_amount=None, start_date=None, end_date=None, limit=50,
+               user_id=DEFAULT_USER_ID):
+        """Same contract as ExpenseStore.search(), from an in-memory inverted index."""
+        terms = search_terms(text)
+        with self._lock:
+            data = self._users.get(user_id)
+            if data is None or not terms:
+                return []
+            expenses = data.expenses
+
+            def accept(expense_id):
+                row = expenses[expense_id]
+                return ((min_amount is None or row[1] >= min_amount) and (max_amount is None or row[1] <= max_amount)
+                        and (start_date is None or row[4] >= start_date) and (end_date is None or row[4] <= end_date))
+
+            filtered = (min_amount, max_amount, start_date, end_date) != (None, None, None, None)
+            scores = data.search(terms, accept if filtered else None, SEARCH_CANDIDATES)
+            matches = [(-score, expenses[expense_id]) for expense_id, score in scores.items()]
+            # Newest first among equal scores, then best score first (both sorts are stable)
+            matches.sort(key=lambda match: (match[1][4], match[1][0]), reverse=True)
+            best = heapq.nsmallest(limit, matches, key=lambda match: match[0])
+        return [_expense_dict(row) for _, row in best]
+
+    # --- BUDGETS & CATEGORY COLORS ---
+
+    def list_budgets(self, user_id=DEFAULT_USER_ID):
+        with self._lock:
+            return dict((self._users.get(user_id) or _UserData()).budgets)
+
+    def get_budget(self, month, user_id=DEFAULT_USER_ID):
+        with self._lock:
+            return (self._users.get(user_id) or _UserData()).budgets.get(month, 0)
+
+    def set_budget(self, month, amount, user_id=DEFAULT_USER_ID):
+        self._commit({'op': 'set_budget', 'user': user_id, 'month': month, 'amount': amount})
+
+    def list_category_colors(self, user_id=DEFAULT_USER_ID):
+        with self._lock:
+            return dict((self._users.get(user_id) or _UserData()).colors)
+
+    def set_category_color(self, category, color, user_id=DEFAULT_USER_ID):
+        self._commit({'op': 'set_category_color', 'user': user_id, 'category': category, 'color': color})
+
+    # --- MONTHLY ROLLUPS ---
+
+    def month_rollups(self, month, user_id=DEFAULT_USER_ID):
+        """The month's {category, currency_code, total, count} rows."""
+        with self._lock:
+            rollups = (self._users.get(user_id) or _UserData()).rollups.get(month, {})
+            return [{'category': category, 'currency_code': currency_code, 'total': total, 'count': count}
+                    for (category, currency_code), (total, count) in rollups.items()]
+
+    def month_counts(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """[(month, expenses)] for the months that have expenses, oldest first."""
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            return [(month, len(data.months[month])) for month in data.months_between(start_month, end_month)
+                    if data.months[month]]
+
+    def rebuild_rollups(self, user_id=None):
+        """Recomputes the rollups of every user, or only `user_id` (rollups are derived, so nothing is journaled)."""
+        with self._lock:
+            if user_id is None:
+                users = list(self._users.values())
+            else:
+                users = [self._users[user_id]] if user_id in self._users else []
+            for data in users:
+                data.rollups = {}
+                for row in data.expenses.values():
+                    totals = data.rollups.setdefault(row[4][:7], {}).setdefault((row[3], row[2]), [0.0, 0])
+                    totals[0] += row[1]
+                    totals[1] += 1
+
+    # --- DELTA SYNC ---
+
+    def data_version(self, user_id=DEFAULT_USER_ID):
+        """An opaque token that changes whenever any of the user's expenses, budgets or category colors does."""
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            return f'{data.epoch}:{data.changes.last_seq()}'
+
+    def changes_since(self, cursor, limit=5000, user_id=DEFAULT_USER_ID):
+        """
+        Same contract as ExpenseStore.changes_since(), except that a page can run past `limit` to finish
+        an add_expenses() batch, whose rows share one seq.
+        """
+        with self._lock:
+            data = self._users.get(user_id) or _UserData()
+            epoch, latest = data.epoch, data.changes.last_seq()
+            try:
+                client_epoch, since = (int(part) for part in str(cursor).split(':'))
+            except ValueError:
+                client_epoch, since = None, None
+
+            if client_epoch != epoch:
+                return {
+                    'full': True,
+                    'cursor': f'{epoch}:{latest}',
+                    'more': False,
+                    'expenses': self.list_expenses(user_id=user_id),
+                    'budgets': dict(data.budgets),
+                    'categoryColors': dict(data.colors),
+                }
+
+            entries = data.changes.since(since, limit)
+            changes = []
+            for _, entity, key, op in entries:
+                change = {'entity': entity, 'key': key, 'op': op}
+                if op == 'upsert':
+                    if entity == 'expense':
+                        change['data'] = _expense_dict(data.expenses[int(key)])
+                    elif entity == 'budget':
+                        change['data'] = {'month': key, 'amount': data.budgets[key]}
+                    else:
+                        change['data'] = {'category': key, 'color': data.colors[key]}
+                changes.append(change)
+
+        more = len(entries) >= limit
+        last = entries[-1][0] if more else latest
+        return {'full': False, 'cursor': f'{epoch}:{last}', 'more': more, 'changes': changes}
+
+    def clear_all(self, user_id=DEFAULT_USER_ID):
+        """Deletes the user's expenses, budgets and category colors, and starts a new sync epoch."""
+        self._commit({'op': 'clear_all', 'user': user_id})
+
+    # --- USERS & API TOKENS ---
+
+    def add_user(self, username, password_hash):
+        """Creates an account and returns its id; usernames are unique, ignoring case."""
+        with self._lock:
+            if self.find_user(username) is not None:
+                raise ValidationError(f"User {username!r} already exists.")
+            return self._commit({'op': 'add_user', 'id': max(self._accounts) + 1, 'username': username,
+                                 'passwordHash': password_hash, 'createdAt': _now()})
+
+    def find_user(self, username):
+        """{id, username, password_hash} for a username, or None."""
+        with self._lock:
+            for account in self._accounts.values():
+                if account['username'].lower() == username.lower():
+                    return {key: account[key] for key in ('id', 'username', 'password_hash')}
+        return None
+
+    def set_password(self, username, password_hash):
+        """Replaces an account's password hash; False if there is no such user."""
+        with self._lock:
+            account = self.find_user(username)
+            if account is None:
+                return False
+            self._commit({'op': 'set_password', 'id': account['id'], 'passwordHash': password_hash})
+        return True
+
+    def list_users(self):
+        with self._lock:
+            return [{key: account[key] for key in ('id', 'username', 'created_at')}
+                    for _, account in sorted(self._accounts.items())]
+
+    def add_token(self, token_hash, user_id):
+        self._commit({'op': 'add_token', 'tokenHash': token_hash, 'user': user_id})
+
+    def user_for_token(self, token_hash):
+        """{id, username} of the token's owner, or None for an unknown/revoked token."""
+        with self._lock:
+            user_id = self._tokens.get(token_hash)
+            if user_id is None:
+                return None
+            return {'id': user_id, 'username': self._accounts[user_id]['username']}
+
+    def delete_token(self, token_hash):
+        with self._lock:
+            if token_hash in self._tokens:
+                self._commit({'op': 'delete_token', 'tokenHash': token_hash})
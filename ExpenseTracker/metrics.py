@@ -0,0 +1,282 @@
+"""
+Opt-in request instrumentation: latency histograms, SQL query counts and timings, cache hit rates,
+and sampled profiles.
+
+Nothing here runs unless it is switched on (see install()):
+- EXPENSE_METRICS=1 records metrics and serves them at /metrics in the Prometheus text format.
+- EXPENSE_PROFILE_RATE=0.01 profiles about 1% of requests with cProfile, or with pyinstrument when
+  EXPENSE_PROFILER=pyinstrument. Each profile is written under EXPENSE_PROFILE_DIR (default: profiles/).
+  Open .prof files with `python -m pstats` or snakeviz; pyinstrument writes .html.
+
+Metrics live in the process that served the request. Under a multi-worker server each scrape of
+/metrics sees one worker, so scrape workers individually (or run one worker with threads).
+Streamed responses (export, import) are timed up to the first byte.
+"""
+import bisect
+import importlib.util
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+from flask import Response, g, request
+
+# Upper bounds in seconds, like Prometheus client defaults but finer below 10 ms
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 500)
+
+_SQL_VERB = re.compile(r'\s*(\w+)')
+
+
+class Histogram:
+    """A thread-safe Prometheus-style histogram: cumulative bucket counts plus a running sum."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self, name, labels):
+        """Exposition lines: one per bucket (cumulative), then _sum and _count."""
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, running = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            running += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            lines.append(f'{name}_bucket{_labels(labels, le=le)} {running}')
+        lines.append(f'{name}_sum{_labels(labels)} {total!r}')
+        lines.append(f'{name}_count{_labels(labels)} {running}')
+        return lines
+
+
+def _labels(labels, **extra):
+    pairs = {**labels, **extra}
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in pairs.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(pairs, escaped)) + '}'
+
+
+class Metrics:
+    """Every metric the app records, keyed by label values, and their /metrics rendering."""
+
+    def __init__(self):
+        self.requests = {}  # (method, route, status) -> Histogram of seconds
+        self.queries = {}   # SQL verb -> Histogram of seconds
+        self.queries_per_request = Histogram(QUERY_COUNT_BUCKETS)
+        self.caches = {}    # name -> callable returning LRUCache.stats()-shaped dicts
+        self.profiles_written = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _histogram(self, table, key, buckets=LATENCY_BUCKETS):
+        histogram = table.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = table.setdefault(key, Histogram(buckets))
+        return histogram
+
+    def profile_written(self):
+        with self._lock:  # request threads finish profiles concurrently
+            self.profiles_written += 1
+
+    def observe_request(self, method, route, status, seconds, queries=None):
+        self._histogram(self.requests, (method, route, status)).observe(seconds)
+        if queries is not None:
+            self.queries_per_request.observe(queries)
+
+    def observe_query(self, sql, seconds):
+        """ExpenseStore.query_observer: records one statement's time and counts it against the current request."""
+        match = _SQL_VERB.match(sql)
+        self._histogram(self.queries, match.group(1).upper() if match else 'OTHER').observe(seconds)
+        if getattr(self._local, 'queries', None) is not None:
+            self._local.queries += 1
+
+    def start_request(self):
+        self._local.queries = 0
+
+    def finish_request(self):
+        """The number of statements the request ran (None if start_request() wasn't called)."""
+        count, self._local.queries = getattr(self._local, 'queries', None), None
+        return count
+
+    def add_cache(self, name, stats):
+        """Reports hit rates for a cache; stats() returns an LRUCache.stats() dict (or None if not built yet)."""
+        self.caches[name] = stats
+
+    def render(self):
+        with self._lock:  # new label combinations may be added while this renders
+            requests, queries = sorted(self.requests.items()), sorted(self.queries.items())
+        lines = [
+            '# HELP expense_http_request_duration_seconds Time to build each response, by route.',
+            '# TYPE expense_http_request_duration_seconds histogram',
+        ]
+        for (method, route, status), histogram in requests:
+            lines += histogram.samples('expense_http_request_duration_seconds',
+                                       {'method': method, 'route': route, 'status': status})
+        lines += [
+            '# HELP expense_db_query_duration_seconds SQL statement time, by statement type.',
+            '# TYPE expense_db_query_duration_seconds histogram',
+        ]
+        for verb, histogram in queries:
+            lines += histogram.samples('expense_db_query_duration_seconds', {'statement': verb})
+        lines += [
+            '# HELP expense_db_queries_per_request SQL statements run while handling one request.',
+            '# TYPE expense_db_queries_per_request histogram',
+            *self.queries_per_request.samples('expense_db_queries_per_request', {}),
+        ]
+        cache_stats = {name: stats() for name, stats in sorted(self.caches.items())}
+        cache_stats = {name: stats for name, stats in cache_stats.items() if stats is not None}
+        for metric, key, kind, description in (
+            ('expense_cache_hits_total', 'hits', 'counter', 'Cache lookups that found an entry.'),
+            ('expense_cache_misses_total', 'misses', 'counter', 'Cache lookups that missed.'),
+            ('expense_cache_hit_ratio', 'hitRate', 'gauge', 'Hits over lookups since the process started.'),
+            ('expense_cache_entries', 'size', 'gauge', 'Entries currently cached.'),
+        ):
+            lines += [f'# HELP {metric} {description}', f'# TYPE {metric} {kind}']
+            lines += [f'{metric}{_labels({"cache": name})} {stats[key]!r}' for name, stats in cache_stats.items()]
+        lines += [
+            '# HELP expense_profiles_written_total Sampled request profiles written to disk.',
+            '# TYPE expense_profiles_written_total counter',
+            f'expense_profiles_written_total {self.profiles_written}',
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+class SampledProfiler:
+    """Profiles a random `rate` of requests, one at a time, and writes each profile to `directory`."""
+
+    def __init__(self, rate, directory, kind='cprofile'):
+        if kind not in ('cprofile', 'pyinstrument'):
+            raise ValueError(f"Unknown profiler {kind!r}; use cprofile or pyinstrument.")
+        if kind == 'pyinstrument':
+            if importlib.util.find_spec('pyinstrument') is None:
+                raise RuntimeError("EXPENSE_PROFILER=pyinstrument needs pyinstrument (pip install pyinstrument).")
+        self.rate = rate
+        self.directory = directory
+        self.kind = kind
+        # Python allows one active profiler per process (3.12+) or it would mix requests together:
+        # a request that comes up for sampling while another is being profiled is skipped.
+        self._busy = threading.Lock()
+
+    def start(self):
+        """A started profiler for this request, or None if it isn't sampled."""
+        if random.random() >= self.rate or not self._busy.acquire(blocking=False):
+            return None
+        try:
+            if self.kind == 'pyinstrument':
+                from pyinstrument import Profiler
+                profiler = Profiler()
+                profiler.start()
+            else:
+                import cProfile
+                profiler = cProfile.Profile()
+                profiler.enable()
+        except BaseException:
+            self._busy.release()
+            raise
+        return profiler
+
+    def finish(self, profiler, method, route, seconds):
+        """Stops `profiler` and writes it as <time>-<method>-<route>-<ms>ms.prof (or .html)."""
+        try:
+            if self.kind == 'cprofile':
+                profiler.disable()
+            else:
+                profiler.stop()
+        finally:
+            self._busy.release()
+        os.makedirs(self.directory, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S.%f')
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(self.directory, f'{stamp}-{method}-{slug}-{seconds * 1000:.0f}ms')
+        if self.kind == 'cprofile':
+            profiler.dump_stats(path + '.prof')
+        else:
+            with open(path + '.html', 'w', encoding='utf-8') as handle:
+                handle.write(profiler.output_html())
+
+
+def install(app):
+    """
+    Hooks the instrumentation into `app` as configured by METRICS, PROFILE_RATE, PROFILE_DIR and
+    PROFILER. Returns the Metrics (or None when metrics are off).
+    """
+    metrics = Metrics() if app.config.get('METRICS') else None
+    rate = app.config.get('PROFILE_RATE') or 0
+    profiler = SampledProfiler(rate, app.config.get('PROFILE_DIR') or 'profiles',
+                               app.config.get('PROFILER') or 'cprofile') if rate > 0 else None
+    if metrics is None and profiler is None:
+        return None
+
+    if metrics is not None:
+        app.extensions['metrics'] = metrics
+        store = app.extensions.get('expense_store')
+        if hasattr(store, 'query_observer'):  # the journal store runs no SQL
+            store.query_observer = metrics.observe_query
+        metrics.add_cache('chart', lambda: _chart_cache_stats(app))
+
+        @app.route('/metrics')
+        def metrics_endpoint():
+            """Prometheus text exposition of this process's metrics."""
+            return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.before_request
+    def start_timing():
+        g.request_started = time.perf_counter()
+        g.profiler = profiler.start() if profiler is not None else None
+        if metrics is not None:
+            metrics.start_request()
+
+    @app.after_request
+    def record_timing(response):
+        started = g.pop('request_started', None)
+        if started is None:
+            return response
+        seconds = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else '<unmatched>'
+        active = g.pop('profiler', None)
+        if active is not None:
+            profiler.finish(active, request.method, route, seconds)
+            if metrics is not None:
+                metrics.profile_written()
+        if metrics is not None:
+            queries = metrics.finish_request()
+            if route != '/metrics':
+                metrics.observe_request(request.method, route, str(response.status_code), seconds, queries)
+        return response
+
+    @app.teardown_request
+    def stop_abandoned_profiler(error=None):
+        # after_request never runs when a view raises: don't leave the profiler running
+        active = g.pop('profiler', None)
+        if active is not None:
+            profiler.finish(active, request.method, 'error', 0.0)
+
+    return metrics
+
+
+def _chart_cache_stats(app):
+    """Summed stats of every user's chart cache (api.get_chart_cache())."""
+    users = app.extensions.get('chart_cache')
+    if users is None:
+        return None
+    caches = users.values()
+    hits = sum(cache.hits for cache in caches)
+    misses = sum(cache.misses for cache in caches)
+    return {
+        'size': sum(len(cache) for cache in caches),
+        'hits': hits,
+        'misses': misses,
+        'hitRate': hits / (hits + misses) if hits + misses else 0.0,
+    }
@@ -0,0 +1,104 @@
+"""
+Multi-core reports over long histories.
+
+ExpenseFrame.from_store(...).report() loads every row and aggregates it on one core, and loading is most
+of the work: on 1M rows the load takes seconds and the NumPy passes tens of milliseconds. For histories
+of PARALLEL_MIN_ROWS rows or more, ParallelReporter does the following instead:
+1. Reads the range's expense count per month from the rollups, without touching the expenses.
+2. Splits the months into contiguous runs with about the same number of rows, a few runs per worker.
+3. Has a ProcessPoolExecutor report on each run. Every worker opened the database and received the rate
+   table once, when it started, so a task carries only the user, two months and the primary currency. The
+   worker loads its months into its own columns and aggregates them there; only the small report
+   dicts come back.
+4. Merges the partial reports with aggregate.merge_reports().
+
+The runs are whole months, so each month is summed by one worker. The result equals ExpenseFrame.report()
+up to float rounding, since the totals across months are added in a different order.
+Only the SQLite store can be read from several processes; with the journal store reports stay in one
+process. Small histories gain nothing from it: the process round trips cost more than they save below
+about PARALLEL_MIN_ROWS rows, so those are computed in the calling thread.
+"""
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from aggregate import ExpenseFrame, merge_reports
+from store import DEFAULT_USER_ID, ExpenseStore
+
+PARALLEL_MIN_ROWS = 1_000_000
+# Partitions per worker: more than one, so a worker that finishes early picks up another
+PARTITIONS_PER_WORKER = 4
+
+
+def month_partitions(month_counts, parts):
+    """
+    [(month, expenses)] sorted by month -> [(first, last)] inclusive month ranges, at most `parts` of
+    them, each holding about the same number of expenses.
+    """
+    total = sum(count for _, count in month_counts)
+    partitions, seen = [], 0
+    for month, count in month_counts:
+        # Start partition k + 1 once the first k hold k / parts of the rows
+        if not partitions or seen >= total * len(partitions) / parts:
+            partitions.append([month, month])
+        else:
+            partitions[-1][1] = month
+        seen += count
+    return [tuple(partition) for partition in partitions]
+
+
+_worker_store = None
+_worker_rates = None
+
+
+def _start_worker(store_path, rates):
+    """ProcessPoolExecutor initializer: each worker opens the database and receives the rate table once."""
+    global _worker_store, _worker_rates
+    _worker_store = ExpenseStore(store_path)
+    _worker_rates = rates
+
+
+def _partial_report(user_id, first, last, primary_code):
+    """Worker task: the report of the user's expenses from month `first` to `last`."""
+    frame = ExpenseFrame.from_store(_worker_store.for_user(user_id), first, last, rates=_worker_rates)
+    return frame.report(primary_code)
+
+
+class ParallelReporter:
+    """Reports on an ExpenseStore computed by `workers` processes (see the module docstring)."""
+
+    def __init__(self, store, rates=None, workers=None):
+        self.store = store
+        self.rates = rates  # a rates.RateTable, as for ExpenseFrame; None uses the fixed rates
+        self.workers = workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn, not fork: the server process has threads and open SQLite connections
+                self._executor = ProcessPoolExecutor(
+                    self.workers, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_start_worker, initargs=(self.store.path, self.rates))
+            return self._executor
+
+    def report(self, start_month, end_month, primary_code, user_id=DEFAULT_USER_ID):
+        """The ExpenseFrame report of the user's expenses in the inclusive month range (None: unbounded)."""
+        month_counts = self.store.month_counts(start_month, end_month, user_id=user_id)
+        if sum(count for _, count in month_counts) < PARALLEL_MIN_ROWS:
+            scoped = self.store.for_user(user_id)
+            return ExpenseFrame.from_store(scoped, start_month, end_month, rates=self.rates).report(primary_code)
+        pool = self._pool()
+        futures = [
+            pool.submit(_partial_report, user_id, first, last, primary_code)
+            for first, last in month_partitions(month_counts, self.workers * PARTITIONS_PER_WORKER)
+        ]
+        return merge_reports([future.result() for future in futures], primary_code)
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
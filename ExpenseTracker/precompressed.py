@@ -0,0 +1,130 @@
+import gzip
+import hashlib
+from datetime import datetime, timezone
+
+from flask import Response
+from werkzeug.http import http_date, parse_date
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+def _parse_accept_encoding(header):
+    """Returns {coding: q} for an Accept-Encoding header value."""
+    codings = {}
+    for part in (header or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        codings[name] = q
+    return codings
+
+
+def _etag_matches(header, etags):
+    """True when an If-None-Match header names any of our (weakly compared) tags."""
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate in etags:
+            return True
+    return False
+
+
+class PrecompressedAsset:
+    """
+    A response body that is encoded once, up front, in every supported content-coding.
+
+    Each request then only picks a representation: no compression work happens per hit,
+    and conditional requests are answered with an empty 304.
+    """
+
+    # Preference order when the client accepts several codings with the same q-value.
+    PREFERENCE = ('br', 'gzip', 'identity')
+
+    def __init__(self, body, content_type='text/html; charset=utf-8', cache_control='no-cache', last_modified=None,
+                 compress=True):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.last_modified = (last_modified or datetime.now(timezone.utc)).replace(microsecond=0)
+        self.digest = hashlib.sha256(body).hexdigest()
+
+        # Each representation gets its own strong validator, all derived from the same content hash.
+        self.variants = {'identity': (body, f'"{self.digest[:32]}"')}
+        if compress:  # already-compressed formats (fonts, images) are served as they are
+            self.variants['gzip'] = (gzip.compress(body, compresslevel=9, mtime=0), f'"{self.digest[:32]}-gz"')
+        if compress and brotli is not None:
+            self.variants['br'] = (brotli.compress(body, quality=11), f'"{self.digest[:32]}-br"')
+        self._etags = {etag for _, etag in self.variants.values()}
+        self._last_modified_header = http_date(self.last_modified)
+        # Browsers send a handful of distinct Accept-Encoding strings; remember each decision.
+        self._coding_cache = {}
+
+    def choose_encoding(self, accept_encoding):
+        """Picks the best available coding for an Accept-Encoding header."""
+        cached = self._coding_cache.get(accept_encoding)
+        if cached is not None:
+            return cached
+
+        accepted = _parse_accept_encoding(accept_encoding)
+        wildcard = accepted.get('*')
+
+        best, best_q = None, 0.0
+        for coding in self.PREFERENCE:
+            if coding not in self.variants:
+                continue
+            q = accepted.get(coding, wildcard)
+            if q is None:
+                # identity is acceptable unless explicitly refused
+                q = 1.0 if coding == 'identity' else 0.0
+            if q > best_q:
+                best, best_q = coding, q
+
+        best = best or 'identity'
+        if len(self._coding_cache) < 256:
+            self._coding_cache[accept_encoding] = best
+        return best
+
+    def is_not_modified(self, request):
+        """Evaluates If-None-Match (preferred) or If-Modified-Since against this asset."""
+        if_none_match = request.headers.get('If-None-Match')
+        if if_none_match is not None:
+            return _etag_matches(if_none_match, self._etags)
+
+        since = parse_date(request.headers.get('If-Modified-Since'))
+        return since is not None and since >= self.last_modified
+
+    def respond(self, request):
+        """Builds the Flask response (200 or 304) for the current request."""
+        coding = self.choose_encoding(request.headers.get('Accept-Encoding'))
+        body, etag = self.variants[coding]
+
+        headers = {
+            'ETag': etag,
+            'Last-Modified': self._last_modified_header,
+            'Cache-Control': self.cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+
+        if request.method in ('GET', 'HEAD') and self.is_not_modified(request):
+            return Response(status=304, headers=headers)
+
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return Response(body, content_type=self.content_type, headers=headers)
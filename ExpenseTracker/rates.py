@@ -0,0 +1,154 @@
+"""
+Historical, date-effective exchange rates.
+
+Daily rates are loaded from a CSV file with one observation per line (USD per unit of the currency,
+the same convention as CURRENCY_RATES_TO_USD):
+
+    date,currency,rate
+    2024-01-02,EUR,1.0945
+    2024-01-02,GBP,1.2710
+
+A lookup "as of" a date uses the latest observation on or before it (the earliest one for dates
+before the series starts), found by bisect on a sorted day array. Currencies without any observations
+keep the fixed rate from currency.py, so with no file at all every conversion matches convert_to_primary().
+Batch conversion resolves a whole column of rows with one NumPy searchsorted per currency.
+"""
+import bisect
+import csv
+import os
+from datetime import date
+
+import numpy as np
+
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD
+
+DEFAULT_RATES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rates.csv')
+
+_COLUMN_ALIASES = {
+    'date': ('date', 'day'),
+    'currency': ('currency', 'currencycode', 'currency_code', 'code'),
+    'rate': ('rate', 'rate_to_usd', 'usd'),
+}
+
+_EPOCH = date(1970, 1, 1)
+
+
+def day_number(value):
+    """'YYYY-MM-DD' or a date -> days since 1970-01-01 (NumPy's datetime64[D] epoch)."""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    return (value - _EPOCH).days
+
+
+class RateTable:
+    """Per-currency daily rate series with as-of lookups and column-at-a-time conversion."""
+
+    def __init__(self, series=None, fallback=CURRENCY_RATES_TO_USD):
+        """`series` is {code: iterable of (date, rate_to_usd)}; later duplicates of a date win."""
+        self.fallback = dict(fallback)
+        self._days = {}       # code -> sorted list of day numbers (for bisect)
+        self._day_array = {}  # code -> the same days as an int64 array (for searchsorted)
+        self._rates = {}      # code -> float64 array aligned with the days
+        for code, observations in (series or {}).items():
+            by_day = {day_number(when): float(rate) for when, rate in observations}
+            if not by_day:
+                continue
+            days = sorted(by_day)
+            self._days[code] = days
+            self._day_array[code] = np.array(days, dtype=np.int64)
+            self._rates[code] = np.array([by_day[day] for day in days], dtype=np.float64)
+
+    @classmethod
+    def from_csv(cls, path):
+        series = {}
+        with open(path, newline='', encoding='utf-8-sig') as handle:
+            reader = csv.reader(handle)
+            header = [name.strip().lower() for name in next(reader, [])]
+            columns = {}
+            for field, aliases in _COLUMN_ALIASES.items():
+                found = [header.index(alias) for alias in aliases if alias in header]
+                if not found:
+                    raise ValueError(f"{path}: header is missing a {field!r} column.")
+                columns[field] = found[0]
+
+            for line_number, record in enumerate(reader, start=2):
+                if not any(cell.strip() for cell in record):
+                    continue
+                try:
+                    when = date.fromisoformat(record[columns['date']].strip())
+                    code = record[columns['currency']].strip().upper()
+                    rate = float(record[columns['rate']])
+                except (IndexError, ValueError):
+                    raise ValueError(f"{path}, line {line_number}: expected date,currency,rate.") from None
+                if not rate > 0:
+                    raise ValueError(f"{path}, line {line_number}: rate must be greater than zero.")
+                series.setdefault(code, []).append((when, rate))
+        return cls(series)
+
+    @classmethod
+    def load(cls, path=None):
+        """The table from `path` (default rates.csv next to this file), or fixed rates only if it doesn't exist."""
+        path = path or DEFAULT_RATES_PATH
+        return cls.from_csv(path) if os.path.exists(path) else cls()
+
+    def currencies(self):
+        """Currency codes that have a historical series."""
+        return sorted(self._days)
+
+    # --- SINGLE LOOKUPS ---
+
+    def rate(self, code, on):
+        """USD per unit of `code` as of the date `on`."""
+        days = self._days.get(code)
+        if days is None:
+            return self.fallback[code]
+        index = bisect.bisect_right(days, day_number(on)) - 1
+        return float(self._rates[code][max(index, 0)])
+
+    def rates_on(self, on):
+        """{code: rate_to_usd} for every supported currency as of `on`."""
+        return {code: self.rate(code, on) for code in CURRENCY_OPTIONS}
+
+    def convert(self, amount, from_code, primary_code, on):
+        """convert_to_primary() at the rates in effect on `on`."""
+        if from_code == primary_code:
+            return amount
+        return amount * self.rate(from_code, on) / self.rate(primary_code, on)
+
+    # --- BATCH CONVERSION ---
+
+    def rates_for(self, code, days):
+        """USD rates of `code` for an int array of day numbers (one searchsorted for the whole column)."""
+        if code not in self._day_array:
+            return np.full(len(days), self.fallback[code], dtype=np.float64)
+        index = np.searchsorted(self._day_array[code], days, side='right') - 1
+        return self._rates[code][np.maximum(index, 0)]
+
+    def convert_columns(self, amounts, currency_ids, dates, primary_code):
+        """
+        Converts columns of amounts (float), currency ids (indexes into CURRENCY_OPTIONS) and dates
+        (datetime64[D]) to the primary currency, each row at the rates of its own date.
+        """
+        amounts = np.asarray(amounts, dtype=np.float64)
+        currency_ids = np.asarray(currency_ids)
+        days = np.asarray(dates, dtype='datetime64[D]').astype(np.int64)
+
+        to_usd = np.empty(len(amounts), dtype=np.float64)
+        for currency_id in np.unique(currency_ids):
+            rows = currency_ids == currency_id
+            to_usd[rows] = self.rates_for(CURRENCY_OPTIONS[currency_id], days[rows])
+
+        primary_id = CURRENCY_OPTIONS.index(primary_code)
+        via_usd = amounts * to_usd / self.rates_for(primary_code, days)
+        return np.where(currency_ids == primary_id, amounts, via_usd)
+
+    def convert_many(self, rows, primary_code):
+        """[(amount, currency_code, date), ...] -> array of primary-currency amounts."""
+        currency_index = {code: index for index, code in enumerate(CURRENCY_OPTIONS)}
+        amounts, currency_ids, dates = [], [], []
+        for amount, currency_code, when in rows:
+            amounts.append(amount)
+            currency_ids.append(currency_index[currency_code])
+            dates.append(when)
+        return self.convert_columns(amounts, np.array(currency_ids, dtype=np.int8),
+                                    np.array(dates, dtype='datetime64[D]'), primary_code)
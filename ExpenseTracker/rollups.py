@@ -0,0 +1,33 @@
+from currency import convert_to_primary
+
+
+def summarize_month(month, rollup_rows, primary_code, budget=0):
+    """
+    Builds the dashboard/pie-chart summary for one month from its monthly_rollups rows.
+
+    Each (category, currency) subtotal is converted once, so the work is bounded by the
+    number of categories and currencies used that month, not by how many expenses it holds.
+    """
+    categories = {}
+    for row in rollup_rows:
+        entry = categories.setdefault(row['category'], {
+            'category': row['category'],
+            'total': 0.0,
+            'count': 0,
+            'byCurrency': {},
+        })
+        entry['total'] += convert_to_primary(row['total'], row['currency_code'], primary_code)
+        entry['count'] += row['count']
+        entry['byCurrency'][row['currency_code']] = row['total']
+
+    ordered = sorted(categories.values(), key=lambda entry: entry['total'], reverse=True)
+    spent = sum(entry['total'] for entry in ordered)
+    return {
+        'month': month,
+        'primaryCurrency': primary_code,
+        'budget': budget,
+        'spent': spent,
+        'left': budget - spent,
+        'count': sum(entry['count'] for entry in ordered),
+        'categories': ordered,
+    }
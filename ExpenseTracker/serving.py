@@ -0,0 +1,69 @@
+"""
+Production serving for the Flask app: the same `app` under a multi-process / multi-threaded WSGI server.
+
+gunicorn (POSIX) is used when installed: `workers` forked processes with `threads` threads each.
+Otherwise waitress (pure Python, also works on Windows) serves from one process with `threads` threads.
+"""
+import importlib.util
+import os
+
+
+def default_workers():
+    """One worker per core is a good start for this I/O-light, SQLite-backed app."""
+    return os.cpu_count() or 1
+
+
+def available_servers():
+    return [name for name in ('gunicorn', 'waitress') if importlib.util.find_spec(name) is not None]
+
+
+def run_gunicorn(app, host, port, workers, threads, timeout=60):
+    from gunicorn.app.base import BaseApplication
+
+    class StandaloneApplication(BaseApplication):
+        def __init__(self, application, options):
+            self.application = application
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return self.application
+
+    options = {
+        'bind': f'{host}:{port}',
+        'workers': workers,
+        'threads': threads,
+        # gthread keeps slow clients (streamed exports/imports) from pinning a whole worker
+        'worker_class': 'gthread' if threads > 1 else 'sync',
+        'timeout': timeout,
+        'accesslog': None,
+    }
+    StandaloneApplication(app, options).run()
+
+
+def run_waitress(app, host, port, threads):
+    from waitress import serve
+    serve(app, host=host, port=port, threads=threads)
+
+
+def serve(app, host='0.0.0.0', port=5000, workers=None, threads=4, server='auto'):
+    """Runs `app` until interrupted. `server` is 'auto', 'gunicorn' or 'waitress'."""
+    installed = available_servers()
+    if server == 'auto':
+        if not installed:
+            raise RuntimeError("No production server installed: pip install gunicorn (or waitress on Windows).")
+        server = installed[0]
+    elif server not in installed:
+        raise RuntimeError(f"{server} is not installed: pip install {server}.")
+
+    workers = workers or default_workers()
+    if server == 'gunicorn':
+        run_gunicorn(app, host, port, workers, threads)
+    else:
+        if workers > 1:
+            print(f"  ℹ️  waitress runs a single process; using {threads} threads and ignoring --workers {workers}.")
+        run_waitress(app, host, port, threads)
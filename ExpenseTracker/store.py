@@ -0,0 +1,929 @@
+import functools
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from contextlib import contextmanager
+from datetime import date as Date
+
+from currency import CURRENCY_RATES_TO_USD
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'expenses.db')
+
+# Owner of all data in single-user mode (and of everything stored before accounts existed).
+DEFAULT_USER_ID = 1
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit an entry once released; append a new one instead.
+MIGRATIONS = [
+    # 1: initial schema
+    """
+    CREATE TABLE expenses (
+        id INTEGER PRIMARY KEY,
+        amount REAL NOT NULL CHECK (amount > 0),
+        currency_code TEXT NOT NULL,
+        category TEXT NOT NULL,
+        date TEXT NOT NULL,                                      -- YYYY-MM-DD
+        month TEXT GENERATED ALWAYS AS (substr(date, 1, 7)) VIRTUAL, -- YYYY-MM
+        note TEXT NOT NULL DEFAULT ''
+    );
+    CREATE INDEX idx_expenses_date ON expenses (date);
+    CREATE INDEX idx_expenses_month ON expenses (month);
+    CREATE INDEX idx_expenses_category ON expenses (category);
+    CREATE INDEX idx_expenses_currency ON expenses (currency_code);
+
+    CREATE TABLE budgets (
+        month TEXT PRIMARY KEY,
+        amount REAL NOT NULL CHECK (amount >= 0)
+    );
+
+    CREATE TABLE category_colors (
+        category TEXT PRIMARY KEY,
+        color TEXT NOT NULL
+    );
+    """,
+    # 2: month-partitioned index, already in display order, so a month view reads
+    #    just its own rows and never sorts (replaces the plain month index)
+    """
+    DROP INDEX idx_expenses_month;
+    CREATE INDEX idx_expenses_month_date ON expenses (month, date DESC, id DESC);
+    """,
+    # 3: per (month, category, currency) totals, maintained by triggers on every write
+    """
+    CREATE TABLE monthly_rollups (
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        currency_code TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (month, category, currency_code)
+    ) WITHOUT ROWID;
+
+    INSERT INTO monthly_rollups (month, category, currency_code, total, count)
+    SELECT month, category, currency_code, SUM(amount), COUNT(*) FROM expenses
+    GROUP BY month, category, currency_code;
+
+    CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO monthly_rollups (month, category, currency_code, total, count)
+        VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.currency_code, NEW.amount, 1)
+        ON CONFLICT (month, category, currency_code)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    END;
+
+    CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses BEGIN
+        UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND currency_code = OLD.currency_code;
+        DELETE FROM monthly_rollups
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND currency_code = OLD.currency_code
+          AND count <= 0;
+    END;
+
+    CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF amount, currency_code, category, date ON expenses BEGIN
+        UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND currency_code = OLD.currency_code;
+        DELETE FROM monthly_rollups
+        WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND currency_code = OLD.currency_code
+          AND count <= 0;
+        INSERT INTO monthly_rollups (month, category, currency_code, total, count)
+        VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.currency_code, NEW.amount, 1)
+        ON CONFLICT (month, category, currency_code)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    END;
+    """,
+    # 4: change log for delta sync. Triggers keep only the latest change per record,
+    #    so the log is bounded by the number of live records plus delete tombstones.
+    """
+    CREATE TABLE changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        entity TEXT NOT NULL,      -- 'expense' | 'budget' | 'categoryColor'
+        entity_key TEXT NOT NULL,  -- expense id, budget month or category
+        op TEXT NOT NULL           -- 'upsert' | 'delete'
+    );
+    CREATE UNIQUE INDEX idx_changes_entity ON changes (entity, entity_key);
+
+    -- Bumped by clear_all(); a cursor from an older epoch gets a full snapshot instead of deltas.
+    CREATE TABLE sync_state (id INTEGER PRIMARY KEY CHECK (id = 1), epoch INTEGER NOT NULL);
+    INSERT INTO sync_state (id, epoch) VALUES (1, 1);
+
+    CREATE TRIGGER expenses_log_insert AFTER INSERT ON expenses BEGIN
+        DELETE FROM changes WHERE entity = 'expense' AND entity_key = CAST(NEW.id AS TEXT);
+        INSERT INTO changes (entity, entity_key, op) VALUES ('expense', CAST(NEW.id AS TEXT), 'upsert');
+    END;
+
+    CREATE TRIGGER expenses_log_update AFTER UPDATE ON expenses BEGIN
+        DELETE FROM changes WHERE entity = 'expense' AND entity_key = CAST(NEW.id AS TEXT);
+        INSERT INTO changes (entity, entity_key, op) VALUES ('expense', CAST(NEW.id AS TEXT), 'upsert');
+    END;
+
+    CREATE TRIGGER expenses_log_delete AFTER DELETE ON expenses BEGIN
+        DELETE FROM changes WHERE entity = 'expense' AND entity_key = CAST(OLD.id AS TEXT);
+        INSERT INTO changes (entity, entity_key, op) VALUES ('expense', CAST(OLD.id AS TEXT), 'delete');
+    END;
+
+    CREATE TRIGGER budgets_log_insert AFTER INSERT ON budgets BEGIN
+        DELETE FROM changes WHERE entity = 'budget' AND entity_key = NEW.month;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('budget', NEW.month, 'upsert');
+    END;
+
+    CREATE TRIGGER budgets_log_update AFTER UPDATE ON budgets BEGIN
+        DELETE FROM changes WHERE entity = 'budget' AND entity_key = NEW.month;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('budget', NEW.month, 'upsert');
+    END;
+
+    CREATE TRIGGER budgets_log_delete AFTER DELETE ON budgets BEGIN
+        DELETE FROM changes WHERE entity = 'budget' AND entity_key = OLD.month;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('budget', OLD.month, 'delete');
+    END;
+
+    CREATE TRIGGER category_colors_log_insert AFTER INSERT ON category_colors BEGIN
+        DELETE FROM changes WHERE entity = 'categoryColor' AND entity_key = NEW.category;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('categoryColor', NEW.category, 'upsert');
+    END;
+
+    CREATE TRIGGER category_colors_log_update AFTER UPDATE ON category_colors BEGIN
+        DELETE FROM changes WHERE entity = 'categoryColor' AND entity_key = NEW.category;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('categoryColor', NEW.category, 'upsert');
+    END;
+
+    CREATE TRIGGER category_colors_log_delete AFTER DELETE ON category_colors BEGIN
+        DELETE FROM changes WHERE entity = 'categoryColor' AND entity_key = OLD.category;
+        INSERT INTO changes (entity, entity_key, op) VALUES ('categoryColor', OLD.category, 'delete');
+    END;
+    """,
+    # 5: accounts and per-user partitioning. Every table and index leads with user_id, so each
+    #    user's reads are index seeks into their own range; existing data becomes user 1's.
+    """
+    CREATE TABLE users (
+        id INTEGER PRIMARY KEY,
+        username TEXT NOT NULL UNIQUE COLLATE NOCASE,
+        password_hash TEXT,                                       -- NULL: can't sign in
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    );
+    INSERT INTO users (id, username) VALUES (1, 'default');
+
+    CREATE TABLE api_tokens (
+        token_hash TEXT PRIMARY KEY,                              -- sha256 of the bearer token
+        user_id INTEGER NOT NULL REFERENCES users (id) ON DELETE CASCADE,
+        created_at TEXT NOT NULL DEFAULT (datetime('now'))
+    ) WITHOUT ROWID;
+
+    DROP TRIGGER expenses_rollup_insert;
+    DROP TRIGGER expenses_rollup_delete;
+    DROP TRIGGER expenses_rollup_update;
+    DROP TRIGGER expenses_log_insert;
+    DROP TRIGGER expenses_log_update;
+    DROP TRIGGER expenses_log_delete;
+
+    ALTER TABLE expenses ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1;
+    DROP INDEX idx_expenses_date;
+    DROP INDEX idx_expenses_month_date;
+    DROP INDEX idx_expenses_category;
+    DROP INDEX idx_expenses_currency;
+    CREATE INDEX idx_expenses_user_date ON expenses (user_id, date DESC, id DESC);
+    CREATE INDEX idx_expenses_user_month_date ON expenses (user_id, month, date DESC, id DESC);
+    CREATE INDEX idx_expenses_user_category ON expenses (user_id, category);
+    CREATE INDEX idx_expenses_user_currency ON expenses (user_id, currency_code);
+
+    CREATE TABLE budgets_v5 (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        amount REAL NOT NULL CHECK (amount >= 0),
+        PRIMARY KEY (user_id, month)
+    ) WITHOUT ROWID;
+    INSERT INTO budgets_v5 (user_id, month, amount) SELECT 1, month, amount FROM budgets;
+    DROP TABLE budgets;
+    ALTER TABLE budgets_v5 RENAME TO budgets;
+
+    CREATE TABLE category_colors_v5 (
+        user_id INTEGER NOT NULL,
+        category TEXT NOT NULL,
+        color TEXT NOT NULL,
+        PRIMARY KEY (user_id, category)
+    ) WITHOUT ROWID;
+    INSERT INTO category_colors_v5 (user_id, category, color) SELECT 1, category, color FROM category_colors;
+    DROP TABLE category_colors;
+    ALTER TABLE category_colors_v5 RENAME TO category_colors;
+
+    CREATE TABLE monthly_rollups_v5 (
+        user_id INTEGER NOT NULL,
+        month TEXT NOT NULL,
+        category TEXT NOT NULL,
+        currency_code TEXT NOT NULL,
+        total REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (user_id, month, category, currency_code)
+    ) WITHOUT ROWID;
+    INSERT INTO monthly_rollups_v5 (user_id, month, category, currency_code, total, count)
+    SELECT 1, month, category, currency_code, total, count FROM monthly_rollups;
+    DROP TABLE monthly_rollups;
+    ALTER TABLE monthly_rollups_v5 RENAME TO monthly_rollups;
+
+    CREATE TABLE changes_v5 (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        entity TEXT NOT NULL,      -- 'expense' | 'budget' | 'categoryColor'
+        entity_key TEXT NOT NULL,  -- expense id, budget month or category
+        op TEXT NOT NULL           -- 'upsert' | 'delete'
+    );
+    INSERT INTO changes_v5 (seq, user_id, entity, entity_key, op) SELECT seq, 1, entity, entity_key, op FROM changes;
+    DROP TABLE changes;
+    ALTER TABLE changes_v5 RENAME TO changes;
+    CREATE UNIQUE INDEX idx_changes_user_entity ON changes (user_id, entity, entity_key);
+    CREATE INDEX idx_changes_user_seq ON changes (user_id, seq);
+
+    CREATE TABLE sync_state_v5 (user_id INTEGER PRIMARY KEY, epoch INTEGER NOT NULL);
+    INSERT INTO sync_state_v5 (user_id, epoch) SELECT 1, epoch FROM sync_state;
+    DROP TABLE sync_state;
+    ALTER TABLE sync_state_v5 RENAME TO sync_state;
+
+    CREATE TRIGGER expenses_rollup_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO monthly_rollups (user_id, month, category, currency_code, total, count)
+        VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category, NEW.currency_code, NEW.amount, 1)
+        ON CONFLICT (user_id, month, category, currency_code)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    END;
+
+    CREATE TRIGGER expenses_rollup_delete AFTER DELETE ON expenses BEGIN
+        UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category
+          AND currency_code = OLD.currency_code;
+        DELETE FROM monthly_rollups
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category
+          AND currency_code = OLD.currency_code AND count <= 0;
+    END;
+
+    CREATE TRIGGER expenses_rollup_update AFTER UPDATE OF amount, currency_code, category, date ON expenses BEGIN
+        UPDATE monthly_rollups SET total = total - OLD.amount, count = count - 1
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category
+          AND currency_code = OLD.currency_code;
+        DELETE FROM monthly_rollups
+        WHERE user_id = OLD.user_id AND month = substr(OLD.date, 1, 7) AND category = OLD.category
+          AND currency_code = OLD.currency_code AND count <= 0;
+        INSERT INTO monthly_rollups (user_id, month, category, currency_code, total, count)
+        VALUES (NEW.user_id, substr(NEW.date, 1, 7), NEW.category, NEW.currency_code, NEW.amount, 1)
+        ON CONFLICT (user_id, month, category, currency_code)
+        DO UPDATE SET total = total + excluded.total, count = count + 1;
+    END;
+
+    CREATE TRIGGER expenses_log_insert AFTER INSERT ON expenses BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'expense' AND entity_key = CAST(NEW.id AS TEXT);
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'expense', CAST(NEW.id AS TEXT), 'upsert');
+    END;
+
+    CREATE TRIGGER expenses_log_update AFTER UPDATE ON expenses BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'expense' AND entity_key = CAST(NEW.id AS TEXT);
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'expense', CAST(NEW.id AS TEXT), 'upsert');
+    END;
+
+    CREATE TRIGGER expenses_log_delete AFTER DELETE ON expenses BEGIN
+        DELETE FROM changes WHERE user_id = OLD.user_id AND entity = 'expense' AND entity_key = CAST(OLD.id AS TEXT);
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (OLD.user_id, 'expense', CAST(OLD.id AS TEXT), 'delete');
+    END;
+
+    CREATE TRIGGER budgets_log_insert AFTER INSERT ON budgets BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'budget' AND entity_key = NEW.month;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'budget', NEW.month, 'upsert');
+    END;
+
+    CREATE TRIGGER budgets_log_update AFTER UPDATE ON budgets BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'budget' AND entity_key = NEW.month;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'budget', NEW.month, 'upsert');
+    END;
+
+    CREATE TRIGGER budgets_log_delete AFTER DELETE ON budgets BEGIN
+        DELETE FROM changes WHERE user_id = OLD.user_id AND entity = 'budget' AND entity_key = OLD.month;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (OLD.user_id, 'budget', OLD.month, 'delete');
+    END;
+
+    CREATE TRIGGER category_colors_log_insert AFTER INSERT ON category_colors BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'categoryColor' AND entity_key = NEW.category;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'categoryColor', NEW.category, 'upsert');
+    END;
+
+    CREATE TRIGGER category_colors_log_update AFTER UPDATE ON category_colors BEGIN
+        DELETE FROM changes WHERE user_id = NEW.user_id AND entity = 'categoryColor' AND entity_key = NEW.category;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (NEW.user_id, 'categoryColor', NEW.category, 'upsert');
+    END;
+
+    CREATE TRIGGER category_colors_log_delete AFTER DELETE ON category_colors BEGIN
+        DELETE FROM changes WHERE user_id = OLD.user_id AND entity = 'categoryColor' AND entity_key = OLD.category;
+        INSERT INTO changes (user_id, entity, entity_key, op) VALUES (OLD.user_id, 'categoryColor', OLD.category, 'delete');
+    END;
+    """,
+    # 6: full-text index over categories and notes for /api/search. External content (the text stays
+    #    only in expenses); triggers keep it in step with every insert, edit and delete. Prefix indexes
+    #    for 2- and 3-character prefixes keep short search-as-you-type queries fast.
+    """
+    CREATE VIRTUAL TABLE expenses_fts USING fts5(
+        category, note,
+        content = 'expenses', content_rowid = 'id',
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    );
+    INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild');
+
+    CREATE TRIGGER expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, category, note) VALUES (NEW.id, NEW.category, NEW.note);
+    END;
+
+    CREATE TRIGGER expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, category, note) VALUES ('delete', OLD.id, OLD.category, OLD.note);
+    END;
+
+    CREATE TRIGGER expenses_fts_update AFTER UPDATE OF category, note ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, category, note) VALUES ('delete', OLD.id, OLD.category, OLD.note);
+        INSERT INTO expenses_fts (rowid, category, note) VALUES (NEW.id, NEW.category, NEW.note);
+    END;
+    """,
+]
+
+EXPENSE_COLUMNS = 'id, amount, currency_code, category, date, note'
+
+
+def _split_statements(script):
+    """Splits a migration script into statements (trigger bodies contain ';' too)."""
+    statement = ''
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ''
+    if statement.strip():
+        yield statement.strip()
+
+
+class ValidationError(ValueError):
+    """Raised when a payload breaks the same rules the page's forms enforce."""
+
+
+def validate_month(value):
+    """Validates a YYYY-MM string."""
+    try:
+        year, month = str(value).split('-')
+        if len(year) != 4 or len(month) != 2 or not 1 <= int(month) <= 12:
+            raise ValueError
+        int(year)
+    except ValueError:
+        raise ValidationError(f"Invalid month {value!r}; expected YYYY-MM.") from None
+    return str(value)
+
+
+_COLOR = re.compile(r'#[0-9a-fA-F]{6}')
+
+
+def validate_color(value):
+    """Validates a #rrggbb color, the only form the page saves (it is written into SVG attributes)."""
+    color = str(value or '').strip()
+    if not _COLOR.fullmatch(color):
+        raise ValidationError(f"Invalid color {color!r}; expected #rrggbb.")
+    return color
+
+
+def validate_expense(payload):
+    """
+    Normalizes an expense payload ({amount, currencyCode, category, date, note}).
+    Applies the same rules as handleAddExpense(): amount > 0, a known currency, a category and a valid date.
+    """
+    if not isinstance(payload, dict):
+        raise ValidationError("Expense must be a JSON object.")
+
+    try:
+        amount = float(payload.get('amount'))
+    except (TypeError, ValueError):
+        raise ValidationError("Amount must be a number.") from None
+    if not math.isfinite(amount) or amount <= 0:
+        raise ValidationError("Amount must be greater than zero.")
+
+    currency_code = str(payload.get('currencyCode') or '').strip().upper()
+    if currency_code not in CURRENCY_RATES_TO_USD:
+        raise ValidationError(f"Unsupported currency {currency_code!r}.")
+
+    category = str(payload.get('category') or '').strip()
+    if not category:
+        raise ValidationError("Category is required.")
+
+    try:
+        date = Date.fromisoformat(str(payload.get('date') or '')).isoformat()
+    except ValueError:
+        raise ValidationError("Date must be a valid YYYY-MM-DD date.") from None
+
+    expense = {
+        'amount': amount,
+        'currencyCode': currency_code,
+        'category': category,
+        'date': date,
+        'note': str(payload.get('note') or '').strip(),
+    }
+    if payload.get('id') is not None:
+        try:
+            expense['id'] = int(payload['id'])
+        except (TypeError, ValueError):
+            raise ValidationError("Expense id must be an integer.") from None
+        if expense['id'] <= 0:
+            raise ValidationError("Expense id must be a positive integer.")
+    return expense
+
+
+def search_terms(text):
+    """
+    The words of a search box query, normalized like the unicode61 tokenizer does (case-folded,
+    accents removed, split on anything that isn't a letter or digit).
+    """
+    decomposed = unicodedata.normalize('NFKD', str(text).casefold())
+    return _SEARCH_WORD.findall(''.join(char for char in decomposed if not unicodedata.combining(char)))
+
+
+_SEARCH_WORD = re.compile(r'[^\W_]+')
+
+# search() ranks at most this many matches, the newest by id. Scoring every row that contains a common
+# word ("food" in a million notes) takes most of a second; streaming the newest ones out of the index
+# and stopping early keeps it to tens of milliseconds.
+SEARCH_CANDIDATES = 5000
+
+
+# VALUES for an expenses insert that keeps a client-supplied id unless another user has it. Ids are one
+# keyspace (the rowid) for every user, so such a row gets a new id instead: failing or skipping it
+# would tell the client that some other account holds that id.
+_KEEP_CLIENT_ID = (
+    'SELECT CASE WHEN EXISTS (SELECT 1 FROM expenses WHERE id = ?1 AND user_id <> ?2) THEN NULL ELSE ?1 END, '
+    '?2, ?3, ?4, ?5, ?6, ?7'
+)
+
+
+def expense_from_row(row):
+    """Converts an expenses row into the page's JSON shape."""
+    return {
+        'id': row['id'],
+        'amount': row['amount'],
+        'currencyCode': row['currency_code'],
+        'category': row['category'],
+        'date': row['date'],
+        'note': row['note'],
+    }
+
+
+class ExpenseStore:
+    """
+    SQLite-backed persistence for expenses, budgets and category colors.
+
+    The database runs in WAL mode so readers never block the single writer, and every
+    thread gets its own connection (sqlite3 connections must not be shared across threads).
+    """
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        self._local = threading.local()
+        # Optional callable(sql, seconds) told about every statement (metrics.py sets it when enabled)
+        self.query_observer = None
+        self.migrate()
+
+    def for_user(self, user_id):
+        """A view of this store limited to one user's data."""
+        return UserStore(self, user_id)
+
+    # --- CONNECTIONS & TRANSACTIONS ---
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute('PRAGMA foreign_keys = ON')
+        return conn
+
+    @property
+    def conn(self):
+        """The calling thread's connection, opened on first use."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def close(self):
+        """Closes the calling thread's connection (other threads keep theirs)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def execute(self, sql, params=()):
+        """Runs one statement on this thread's connection. All SQL goes through here."""
+        if self.query_observer is None:
+            return self.conn.execute(sql, params)
+        return self._observed(sql, lambda: self.conn.execute(sql, params))
+
+    def executemany(self, sql, rows):
+        if self.query_observer is None:
+            return self.conn.executemany(sql, rows)
+        return self._observed(sql, lambda: self.conn.executemany(sql, rows))
+
+    def query(self, sql, params=()):
+        if self.query_observer is None:
+            return self.conn.execute(sql, params).fetchall()
+        # Timed through fetchall(): a SELECT does most of its work while rows are read
+        return self._observed(sql, lambda: self.conn.execute(sql, params).fetchall())
+
+    def _observed(self, sql, run):
+        started = time.perf_counter()
+        try:
+            return run()
+        finally:
+            self.query_observer(sql, time.perf_counter() - started)
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT, rolled back on error. Nested use joins the outer transaction."""
+        if self.conn.in_transaction:
+            yield self
+            return
+        self.execute('BEGIN IMMEDIATE')
+        try:
+            yield self
+        except BaseException:
+            self.execute('ROLLBACK')
+            raise
+        self.execute('COMMIT')
+
+    @contextmanager
+    def read_transaction(self):
+        """One consistent snapshot across several reads (in WAL mode readers never block the writer)."""
+        if self.conn.in_transaction:
+            yield self
+            return
+        self.execute('BEGIN')
+        try:
+            yield self
+        finally:
+            self.execute('COMMIT')
+
+    def migrate(self):
+        """Applies any pending MIGRATIONS. Safe to call from several processes at once."""
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+            for number, script in enumerate(MIGRATIONS[version:], start=version + 1):
+                # executescript() would COMMIT first, so run the statements one by one.
+                for statement in _split_statements(script):
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+            conn.execute('COMMIT')
+        finally:
+            # Don't keep the connection: this may run in a pre-fork master process.
+            conn.close()
+
+    # --- EXPENSES ---
+
+    def list_expenses(self, month=None, limit=None, after=None, user_id=DEFAULT_USER_ID):
+        """
+        Expenses newest first: all of them, or one month's (served from idx_expenses_month_date).
+
+        With `limit`, returns one keyset page: pass the (date, id) of the previous page's last row as
+        `after` to continue. Each page is an index seek, however deep into the history it is.
+        """
+        where, params = ['user_id = ?'], [user_id]
+        if month is not None:
+            where.append('month = ?')
+            params.append(month)
+        if after is not None:
+            where.append('(date, id) < (?, ?)')
+            params.extend(after)
+        sql = f'SELECT {EXPENSE_COLUMNS} FROM expenses WHERE ' + ' AND '.join(where)
+        sql += ' ORDER BY date DESC, id DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return [expense_from_row(row) for row in self.query(sql, params)]
+
+    def expense_rows(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """Streams (amount, currency_code, category, date) tuples, optionally within an inclusive month range."""
+        # Plain tuples rather than sqlite3.Row: building a Row per expense costs more than reading it
+        # (about 1.3 s of a 3.7 s load of 1M rows)
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        sql = (
+            # coalesce() rather than "?1 IS NULL OR ...": bounds written this way can use the
+            # (user_id, month, date) index, so a year of a long history reads only that year's rows
+            'SELECT amount, currency_code, category, date FROM expenses '
+            "WHERE user_id = ?3 AND month >= coalesce(?1, '') AND month <= coalesce(?2, '9999-12')"
+        )
+        params = (start_month, end_month, user_id)
+        if self.query_observer is None:
+            return cursor.execute(sql, params)
+        return self._observed(sql, lambda: cursor.execute(sql, params))
+
+    def months(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """Distinct months that have expenses, oldest first (read from the month index)."""
+        rows = self.query(
+            'SELECT DISTINCT month FROM expenses '
+            'WHERE user_id = ?3 AND (?1 IS NULL OR month >= ?1) AND (?2 IS NULL OR month <= ?2) ORDER BY month',
+            (start_month, end_month, user_id),
+        )
+        return [row['month'] for row in rows]
+
+    def iter_month_expenses(self, month, user_id=DEFAULT_USER_ID):
+        """Streams one month's rows oldest first, without materializing them."""
+        return self.execute(
+            f'SELECT {EXPENSE_COLUMNS} FROM expenses WHERE user_id = ? AND month = ? ORDER BY date, id',
+            (user_id, month),
+        )
+
+    def get_expense(self, expense_id, user_id=DEFAULT_USER_ID):
+        row = self.execute(
+            f'SELECT {EXPENSE_COLUMNS} FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id),
+        ).fetchone()
+        return expense_from_row(row) if row else None
+
+    def add_expense(self, expense, user_id=DEFAULT_USER_ID):
+        """Inserts one validated expense and returns it with its id."""
+        try:
+            with self.transaction():
+                cursor = self.execute(
+                    'INSERT INTO expenses (id, user_id, amount, currency_code, category, date, note) '
+                    + _KEEP_CLIENT_ID,
+                    (expense.get('id'), user_id, expense['amount'], expense['currencyCode'],
+                     expense['category'], expense['date'], expense['note']),
+                )
+        except sqlite3.IntegrityError:
+            # The only constraint a validated expense can break is an id this user already has
+            # (JournalStore says the same)
+            raise ValidationError(f"Expense {expense['id']} already exists.") from None
+        return dict(expense, id=cursor.lastrowid)
+
+    def add_expenses(self, expenses, user_id=DEFAULT_USER_ID):
+        """
+        Bulk-inserts validated expenses in one transaction. Rows whose id the user already has are skipped;
+        an id another user has is replaced with a new one.
+        """
+        with self.transaction():
+            cursor = self.executemany(
+                'INSERT OR IGNORE INTO expenses (id, user_id, amount, currency_code, category, date, note) '
+                + _KEEP_CLIENT_ID,
+                ((e.get('id'), user_id, e['amount'], e['currencyCode'], e['category'], e['date'], e['note'])
+                 for e in expenses),
+            )
+        # rowcount counts only the expense rows, not the rollup rows the triggers touched
+        return cursor.rowcount
+
+    def update_expense(self, expense_id, expense, user_id=DEFAULT_USER_ID):
+        """Replaces an expense's fields. Returns the updated expense, or None if it doesn't exist."""
+        with self.transaction():
+            cursor = self.execute(
+                'UPDATE expenses SET amount = ?, currency_code = ?, category = ?, date = ?, note = ? '
+                'WHERE id = ? AND user_id = ?',
+                (expense['amount'], expense['currencyCode'], expense['category'],
+                 expense['date'], expense['note'], expense_id, user_id),
+            )
+        if cursor.rowcount == 0:
+            return None
+        return dict(expense, id=expense_id)
+
+    def delete_expense(self, expense_id, user_id=DEFAULT_USER_ID):
+        with self.transaction():
+            cursor = self.execute('DELETE FROM expenses WHERE id = ? AND user_id = ?', (expense_id, user_id))
+        return cursor.rowcount > 0
+
+    # --- SEARCH ---
+
+    def search(self, text, min_amount=None, max_amount=None, start_date=None, end_date=None, limit=50,
+               user_id=DEFAULT_USER_ID):
+        """
+        Expenses whose category or note contains every word of `text` as a word prefix, optionally within an
+        amount and inclusive date range. Of the newest SEARCH_CANDIDATES such expenses, returns the best
+        matches first (bm25, with category matches weighted double; ties newest first).
+        """
+        terms = search_terms(text)
+        if not terms:
+            return []
+        match = ' '.join('"' + term.replace('"', '""') + '"*' for term in terms)
+        # FTS5 hands matches out in rowid order, so the inner LIMIT stops the scan early
+        rows = self.query(
+            f'SELECT {EXPENSE_COLUMNS} FROM ('
+            f'  SELECT {", ".join("e." + column for column in EXPENSE_COLUMNS.split(", "))}, '
+            '         bm25(expenses_fts, 2.0, 1.0) AS score '
+            '  FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid '
+            '  WHERE expenses_fts MATCH ?1 AND e.user_id = ?2 '
+            '    AND (?3 IS NULL OR e.amount >= ?3) AND (?4 IS NULL OR e.amount <= ?4) '
+            '    AND (?5 IS NULL OR e.date >= ?5) AND (?6 IS NULL OR e.date <= ?6) '
+            '  ORDER BY expenses_fts.rowid DESC LIMIT ?8'
+            ') ORDER BY score, date DESC, id DESC LIMIT ?7',
+            (match, user_id, min_amount, max_amount, start_date, end_date, limit, SEARCH_CANDIDATES),
+        )
+        return [expense_from_row(row) for row in rows]
+
+    # --- BUDGETS & CATEGORY COLORS ---
+
+    def list_budgets(self, user_id=DEFAULT_USER_ID):
+        rows = self.query('SELECT month, amount FROM budgets WHERE user_id = ?', (user_id,))
+        return {row['month']: row['amount'] for row in rows}
+
+    def get_budget(self, month, user_id=DEFAULT_USER_ID):
+        row = self.execute('SELECT amount FROM budgets WHERE user_id = ? AND month = ?', (user_id, month)).fetchone()
+        return row['amount'] if row else 0
+
+    def set_budget(self, month, amount, user_id=DEFAULT_USER_ID):
+        with self.transaction():
+            self.execute(
+                'INSERT INTO budgets (user_id, month, amount) VALUES (?, ?, ?) '
+                'ON CONFLICT (user_id, month) DO UPDATE SET amount = excluded.amount',
+                (user_id, month, amount),
+            )
+
+    def list_category_colors(self, user_id=DEFAULT_USER_ID):
+        rows = self.query('SELECT category, color FROM category_colors WHERE user_id = ?', (user_id,))
+        return {row['category']: row['color'] for row in rows}
+
+    def set_category_color(self, category, color, user_id=DEFAULT_USER_ID):
+        with self.transaction():
+            self.execute(
+                'INSERT INTO category_colors (user_id, category, color) VALUES (?, ?, ?) '
+                'ON CONFLICT (user_id, category) DO UPDATE SET color = excluded.color',
+                (user_id, category, color),
+            )
+
+    # --- MONTHLY ROLLUPS ---
+
+    def month_rollups(self, month, user_id=DEFAULT_USER_ID):
+        """The month's (category, currency_code, total, count) rows; cost depends on categories, not expenses."""
+        return self.query(
+            'SELECT category, currency_code, total, count FROM monthly_rollups WHERE user_id = ? AND month = ?',
+            (user_id, month),
+        )
+
+    def month_counts(self, start_month=None, end_month=None, user_id=DEFAULT_USER_ID):
+        """[(month, expenses)] for the months that have expenses, oldest first, read from the rollups."""
+        rows = self.query(
+            'SELECT month, SUM(count) FROM monthly_rollups '
+            'WHERE user_id = ?3 AND (?1 IS NULL OR month >= ?1) AND (?2 IS NULL OR month <= ?2) '
+            'GROUP BY month HAVING SUM(count) > 0 ORDER BY month',
+            (start_month, end_month, user_id),
+        )
+        return [tuple(row) for row in rows]
+
+    def rebuild_rollups(self, user_id=None):
+        """
+        Recomputes monthly_rollups from scratch (drops any floating-point drift from incremental updates),
+        for every user or only `user_id`.
+        """
+        with self.transaction():
+            self.execute('DELETE FROM monthly_rollups WHERE ?1 IS NULL OR user_id = ?1', (user_id,))
+            self.execute(
+                'INSERT INTO monthly_rollups (user_id, month, category, currency_code, total, count) '
+                'SELECT user_id, month, category, currency_code, SUM(amount), COUNT(*) FROM expenses '
+                'WHERE ?1 IS NULL OR user_id = ?1 '
+                'GROUP BY user_id, month, category, currency_code',
+                (user_id,),
+            )
+
+    # --- DELTA SYNC ---
+
+    def _current_cursor(self, user_id):
+        row = self.execute('SELECT epoch FROM sync_state WHERE user_id = ?', (user_id,)).fetchone()
+        seq = self.execute(
+            'SELECT COALESCE(MAX(seq), 0) AS seq FROM changes WHERE user_id = ?', (user_id,),
+        ).fetchone()['seq']
+        return (row['epoch'] if row else 1), seq
+
+    def data_version(self, user_id=DEFAULT_USER_ID):
+        """An opaque token that changes whenever any of the user's expenses, budgets or category colors does."""
+        epoch, seq = self._current_cursor(user_id)
+        return f'{epoch}:{seq}'
+
+    def changes_since(self, cursor, limit=5000, user_id=DEFAULT_USER_ID):
+        """
+        Everything a client holding `cursor` ('<epoch>:<seq>') is missing.
+
+        Unknown, empty or stale-epoch cursors get a full snapshot; otherwise only the records
+        inserted, updated or deleted after the cursor, in at most `limit` entries (more=True
+        means the client should ask again with the returned cursor).
+        """
+        with self.read_transaction():
+            epoch, latest = self._current_cursor(user_id)
+            try:
+                client_epoch, since = (int(part) for part in str(cursor).split(':'))
+            except ValueError:
+                client_epoch, since = None, None
+
+            if client_epoch != epoch:
+                return {
+                    'full': True,
+                    'cursor': f'{epoch}:{latest}',
+                    'more': False,
+                    'expenses': self.list_expenses(user_id=user_id),
+                    'budgets': self.list_budgets(user_id),
+                    'categoryColors': self.list_category_colors(user_id),
+                }
+
+            rows = self.query(
+                'SELECT c.seq, c.entity, c.entity_key, c.op, '
+                '       e.id, e.amount, e.currency_code, e.category, e.date, e.note, '
+                '       b.amount AS budget_amount, cc.color '
+                'FROM changes c '
+                "LEFT JOIN expenses e ON c.entity = 'expense' AND c.op = 'upsert' AND e.id = CAST(c.entity_key AS INTEGER) "
+                "LEFT JOIN budgets b ON c.entity = 'budget' AND c.op = 'upsert' "
+                '    AND b.user_id = c.user_id AND b.month = c.entity_key '
+                "LEFT JOIN category_colors cc ON c.entity = 'categoryColor' AND c.op = 'upsert' "
+                '    AND cc.user_id = c.user_id AND cc.category = c.entity_key '
+                'WHERE c.user_id = ? AND c.seq > ? ORDER BY c.seq LIMIT ?',
+                (user_id, since, limit),
+            )
+
+        changes = []
+        for row in rows:
+            change = {'entity': row['entity'], 'key': row['entity_key'], 'op': row['op']}
+            if row['op'] == 'upsert':
+                if row['entity'] == 'expense':
+                    change['data'] = expense_from_row(row)
+                elif row['entity'] == 'budget':
+                    change['data'] = {'month': row['entity_key'], 'amount': row['budget_amount']}
+                else:
+                    change['data'] = {'category': row['entity_key'], 'color': row['color']}
+            changes.append(change)
+
+        more = len(rows) == limit
+        last = rows[-1]['seq'] if more else latest
+        return {'full': False, 'cursor': f'{epoch}:{last}', 'more': more, 'changes': changes}
+
+    def clear_all(self, user_id=DEFAULT_USER_ID):
+        """Deletes the user's expenses, budgets and category colors (the page's "Reset All Data")."""
+        with self.transaction():
+            for table in ('expenses', 'monthly_rollups', 'budgets', 'category_colors'):
+                self.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+            # Every client must start over from a snapshot, so the old log (now all tombstones) can go.
+            self.execute('DELETE FROM changes WHERE user_id = ?', (user_id,))
+            self.execute(
+                'INSERT INTO sync_state (user_id, epoch) VALUES (?, 2) '
+                'ON CONFLICT (user_id) DO UPDATE SET epoch = epoch + 1',
+                (user_id,),
+            )
+
+    # --- USERS & API TOKENS ---
+
+    def add_user(self, username, password_hash):
+        """Creates an account and returns its id; usernames are unique, ignoring case."""
+        with self.transaction():
+            try:
+                cursor = self.execute(
+                    'INSERT INTO users (username, password_hash) VALUES (?, ?)', (username, password_hash),
+                )
+            except sqlite3.IntegrityError:
+                raise ValidationError(f"User {username!r} already exists.") from None
+        return cursor.lastrowid
+
+    def find_user(self, username):
+        """{id, username, password_hash} for a username, or None."""
+        row = self.execute('SELECT id, username, password_hash FROM users WHERE username = ?', (username,)).fetchone()
+        return dict(row) if row else None
+
+    def set_password(self, username, password_hash):
+        """Replaces an account's password hash; False if there is no such user."""
+        with self.transaction():
+            cursor = self.execute('UPDATE users SET password_hash = ? WHERE username = ?', (password_hash, username))
+        return cursor.rowcount > 0
+
+    def list_users(self):
+        return [dict(row) for row in self.query('SELECT id, username, created_at FROM users ORDER BY id')]
+
+    def add_token(self, token_hash, user_id):
+        with self.transaction():
+            self.execute('INSERT INTO api_tokens (token_hash, user_id) VALUES (?, ?)', (token_hash, user_id))
+
+    def user_for_token(self, token_hash):
+        """{id, username} of the token's owner, or None for an unknown/revoked token."""
+        row = self.execute(
+            'SELECT u.id, u.username FROM api_tokens t JOIN users u ON u.id = t.user_id WHERE t.token_hash = ?',
+            (token_hash,),
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete_token(self, token_hash):
+        with self.transaction():
+            self.execute('DELETE FROM api_tokens WHERE token_hash = ?', (token_hash,))
+
+
+class UserStore:
+    """
+    One user's slice of an ExpenseStore: the same methods, with user_id filled in for the data ones.
+
+    Code written against a store (the importer, the exporter, ExpenseFrame.from_store) therefore works
+    on a single user's data unchanged.
+    """
+
+    SCOPED_METHODS = frozenset({
+        'list_expenses', 'expense_rows', 'months', 'iter_month_expenses', 'get_expense',
+        'add_expense', 'add_expenses', 'update_expense', 'delete_expense',
+        'list_budgets', 'get_budget', 'set_budget', 'list_category_colors', 'set_category_color',
+        'month_rollups', 'month_counts', 'rebuild_rollups', 'data_version', 'changes_since', 'clear_all', 'search',
+    })
+
+    def __init__(self, store, user_id):
+        self.store = store
+        self.user_id = user_id
+
+    def __getattr__(self, name):
+        attribute = getattr(self.store, name)
+        if name in self.SCOPED_METHODS:
+            return functools.partial(attribute, user_id=self.user_id)
+        return attribute
@@ -0,0 +1,5 @@
+"""Puts the app's modules (store, aggregate, ...) on sys.path, so the tests run from any directory."""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,76 @@
+"""ExpenseFrame against the per-row convert_to_primary() semantics the page uses."""
+import math
+
+import pytest
+
+from aggregate import ExpenseFrame
+from benchmarks.generators import synthetic_rows
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD, convert_to_primary
+
+
+def per_row_report(rows, primary_code):
+    """The reference: one convert_to_primary() per row."""
+    by_category, by_month = {}, {}
+    for amount, currency_code, category, date in rows:
+        value = convert_to_primary(amount, currency_code, primary_code)
+        by_category[category] = by_category.get(category, 0) + value
+        by_month[date[:7]] = by_month.get(date[:7], 0) + value
+    return by_category, by_month
+
+
+def assert_totals_close(got, expected):
+    assert got.keys() == expected.keys()
+    for key, value in expected.items():
+        assert math.isclose(got[key], value, rel_tol=1e-9), (key, got[key], value)
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return synthetic_rows(5000)
+
+
+@pytest.mark.parametrize('primary_code', CURRENCY_OPTIONS)
+def test_converted_matches_convert_to_primary(rows, primary_code):
+    expected = [convert_to_primary(amount, code, primary_code) for amount, code, _, _ in rows]
+    assert ExpenseFrame.from_rows(rows).converted(primary_code).tolist() == expected
+
+
+@pytest.mark.parametrize('primary_code', CURRENCY_OPTIONS)
+def test_grouped_totals_match_per_row_report(rows, primary_code):
+    frame = ExpenseFrame.from_rows(rows)
+    by_category, by_month = per_row_report(rows, primary_code)
+    assert_totals_close(frame.totals_by_category(primary_code), by_category)
+    assert_totals_close(frame.month_series(primary_code), by_month)
+    assert math.isclose(frame.total(primary_code), sum(by_category.values()), rel_tol=1e-9)
+
+
+def test_empty_months_between_expenses_are_zero():
+    rows = [(10.0, 'USD', 'Food', '2024-01-05'), (4.5, 'USD', 'Food', '2024-04-30')]
+    assert ExpenseFrame.from_rows(rows).month_series('USD') == {
+        '2024-01': 10.0, '2024-02': 0.0, '2024-03': 0.0, '2024-04': 4.5}
+
+
+def test_single_category_month():
+    rows = [(12.25, 'USD', 'Rent', '2023-11-01'), (7.75, 'USD', 'Rent', '2023-11-30')]
+    report = ExpenseFrame.from_rows(rows).report('USD')
+    assert report['byCategory'] == {'Rent': 20.0}
+    assert report['byMonth'] == {'2023-11': 20.0}
+    assert report['count'] == 2 and report['total'] == 20.0
+
+
+def test_mixed_currencies_convert_each_row_once():
+    rows = [(10.0, 'EUR', 'Food', '2024-02-01'), (10.0, 'USD', 'Food', '2024-02-02'),
+            (1000.0, 'JPY', 'Travel', '2024-02-03')]
+    frame = ExpenseFrame.from_rows(rows)
+    usd, eur, jpy = (CURRENCY_RATES_TO_USD[code] for code in ('USD', 'EUR', 'JPY'))
+    # A row already in the primary currency keeps its amount; the others go through USD
+    assert frame.converted('EUR').tolist() == [10.0, 10.0 * usd / eur, 1000.0 * jpy / eur]
+    assert frame.totals_by_currency() == {'USD': 10.0, 'EUR': 10.0, 'JPY': 1000.0}
+    by_category, by_month = per_row_report(rows, 'EUR')
+    assert_totals_close(frame.totals_by_category('EUR'), by_category)
+    assert_totals_close(frame.month_series('EUR'), by_month)
+
+
+def test_empty_frame_reports_nothing():
+    assert ExpenseFrame.from_rows([]).report('USD') == {
+        'primaryCurrency': 'USD', 'count': 0, 'total': 0.0, 'byCategory': {}, 'byCurrency': {}, 'byMonth': {}}
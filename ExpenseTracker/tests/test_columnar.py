@@ -0,0 +1,63 @@
+"""ColumnarExpenses reads rows back unchanged and reports like ExpenseFrame.from_rows()."""
+import pytest
+
+from aggregate import ExpenseFrame
+from benchmarks.bench_columnar import synthetic_expenses
+from columnar import FIXED_BYTES_PER_ROW, ColumnarExpenses
+from store import ExpenseStore
+
+
+@pytest.fixture(scope='module')
+def expenses():
+    return synthetic_expenses(5000)
+
+
+def test_rows_read_back_unchanged(expenses):
+    columns = ColumnarExpenses()
+    columns.extend(expenses)
+    assert len(columns) == len(expenses)
+    assert list(columns) == expenses
+    assert columns[-1] == expenses[-1]
+    with pytest.raises(IndexError):
+        columns[len(expenses)]
+
+
+def test_notes_keep_their_boundaries():
+    notes = ['', 'Café', '', 'Crème brûlée 🍮', 'x']
+    columns = ColumnarExpenses()
+    for index, note in enumerate(notes):
+        columns.append_row(index + 1, 1.0, 'USD', 'Food', '2024-01-01', note)
+    assert [row['note'] for row in columns] == notes
+    assert columns.nbytes() == FIXED_BYTES_PER_ROW * len(notes) + sum(len(note.encode()) for note in notes)
+
+
+@pytest.mark.parametrize('primary_code', ['USD', 'EUR', 'JPY'])
+def test_report_matches_frame_from_rows(expenses, primary_code):
+    columns = ColumnarExpenses()
+    columns.extend(expenses)
+    rows = [(e['amount'], e['currencyCode'], e['category'], e['date']) for e in expenses]
+    assert columns.to_frame().report(primary_code) == ExpenseFrame.from_rows(rows).report(primary_code)
+
+
+def test_to_frame_leaves_the_columns_appendable():
+    columns = ColumnarExpenses()
+    columns.append_row(1, 5.0, 'EUR', 'Food', '2024-03-01')
+    frame = columns.to_frame()
+    columns.append_row(2, 7.0, 'EUR', 'Travel', '2024-05-01')
+    assert frame.report('EUR')['byMonth'] == {'2024-03': 5.0}
+    assert columns.to_frame().report('EUR')['byMonth'] == {'2024-03': 5.0, '2024-04': 0.0, '2024-05': 7.0}
+
+
+def test_empty_columns():
+    columns = ColumnarExpenses()
+    assert list(columns) == []
+    assert columns.bytes_per_row() == FIXED_BYTES_PER_ROW
+    assert columns.to_frame().report('USD')['count'] == 0
+
+
+def test_from_store_matches_the_store(tmp_path, expenses):
+    store = ExpenseStore(str(tmp_path / 'expenses.db'))
+    store.add_expenses(expenses[:500])
+    columns = ColumnarExpenses.from_store(store, '2016-01', '2018-12')
+    expected = sorted((e for e in expenses[:500] if '2016-01' <= e['date'][:7] <= '2018-12'), key=lambda e: e['id'])
+    assert sorted(columns, key=lambda e: e['id']) == expected
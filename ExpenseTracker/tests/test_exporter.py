@@ -0,0 +1,84 @@
+"""Streamed exports hold every expense once, oldest first, with the page's primary-currency amounts."""
+import csv
+import io
+import json
+
+import pytest
+
+import exporter
+from benchmarks.bench_journal import synthetic_expenses
+from currency import convert_to_primary
+from store import ExpenseStore
+
+AWKWARD_NOTES = ['', 'Café, 2 coffees', 'said "hi"', 'line one\nline two', 'ünïcödé 🍮']
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = ExpenseStore(str(tmp_path / 'expenses.db'))
+    expenses = synthetic_expenses(600)
+    for index, expense in enumerate(expenses):
+        expense['note'] = AWKWARD_NOTES[index % len(AWKWARD_NOTES)]
+    store.add_expenses(expenses)
+    return store
+
+
+def expected_records(store, primary_code, start_month=None, end_month=None):
+    expenses = sorted(store.list_expenses(), key=lambda expense: (expense['date'], expense['id']))
+    return [
+        {'id': e['id'], 'date': e['date'], 'category': e['category'], 'amount': e['amount'],
+         'currencyCode': e['currencyCode'],
+         'primaryAmount': convert_to_primary(e['amount'], e['currencyCode'], primary_code),
+         'primaryCurrency': primary_code, 'note': e['note']}
+        for e in expenses
+        if (start_month is None or e['date'][:7] >= start_month) and (end_month is None or e['date'][:7] <= end_month)
+    ]
+
+
+def test_records_match_the_store(store):
+    assert list(exporter.export_rows(store, 'EUR')) == expected_records(store, 'EUR')
+    assert list(exporter.export_rows(store, 'JPY', '2017-01', '2018-06')) == \
+        expected_records(store, 'JPY', '2017-01', '2018-06')
+
+
+def test_csv_round_trips(store, monkeypatch):
+    monkeypatch.setattr(exporter, 'CHUNK_BYTES', 1024)  # several chunks
+    chunks = list(exporter.stream_export(store, 'csv', 'GBP'))
+    assert len(chunks) > 1
+    reader = csv.DictReader(io.StringIO(b''.join(chunks).decode('utf-8'), newline=''))
+    rows = list(reader)
+    expected = expected_records(store, 'GBP')
+    assert reader.fieldnames == exporter.COLUMNS
+    assert [row['note'] for row in rows] == [record['note'] for record in expected]
+    assert [(int(row['id']), float(row['primaryAmount'])) for row in rows] == \
+        [(record['id'], record['primaryAmount']) for record in expected]
+
+
+def test_ndjson_round_trips(store, monkeypatch):
+    monkeypatch.setattr(exporter, 'CHUNK_BYTES', 1024)
+    data = b''.join(exporter.stream_export(store, 'ndjson', 'USD')).decode('utf-8')
+    assert [json.loads(line) for line in data.splitlines()] == expected_records(store, 'USD')
+
+
+def test_parquet_round_trips(store, monkeypatch):
+    pq = pytest.importorskip('pyarrow.parquet')
+    monkeypatch.setattr(exporter, 'ROW_GROUP_SIZE', 100)
+    data = b''.join(exporter.stream_export(store, 'parquet', 'EUR'))
+    parquet = pq.ParquetFile(io.BytesIO(data))
+    assert parquet.metadata.num_row_groups == 6
+    table = parquet.read().to_pylist()
+    expected = expected_records(store, 'EUR')
+    assert [{**row, 'date': row['date'].isoformat()} for row in table] == expected
+
+
+def test_progress_counts_months(store):
+    calls = []
+    records = exporter.export_rows(store, 'USD', '2016-01', '2016-12', lambda done, total: calls.append((done, total)))
+    list(records)
+    assert calls == [(done, 12) for done in range(13)]
+
+
+def test_empty_history_exports_a_header_only(tmp_path):
+    store = ExpenseStore(str(tmp_path / 'empty.db'))
+    assert b''.join(exporter.stream_export(store, 'csv', 'USD')).decode().splitlines() == [','.join(exporter.COLUMNS)]
+    assert b''.join(exporter.stream_export(store, 'ndjson', 'USD')) == b''
@@ -0,0 +1,149 @@
+"""JournalStore against the SQLite ExpenseStore, and recovery from the journal, a snapshot and a torn tail."""
+import os
+import random
+import shutil
+
+import pytest
+
+from benchmarks.bench_journal import synthetic_expenses
+from journal import JournalStore
+from store import ExpenseStore
+
+CATEGORIES = ['Food', 'Rent', 'Travel', 'Fun', 'Bills']
+COLORS = ['#0f76e6', '#10b981', '#f59e0b', '#ef4444']
+OPERATIONS = 1500
+
+
+def random_operations(store, count, seed=0):
+    """Applies a seeded mix of writes through the public store methods (ids are explicit, so both stores agree)."""
+    rng = random.Random(seed)
+    live, next_id = [], 1 + seed * 1_000_000
+    for step in range(count):
+        roll = rng.random()
+        if roll < 0.5 or not live:
+            batch = synthetic_expenses(rng.choice([1, 1, 1, 20]), seed=step, first_id=next_id)
+            next_id += len(batch)
+            if len(batch) == 1:
+                store.add_expense(batch[0])
+            else:
+                store.add_expenses(batch)
+            live.extend(expense['id'] for expense in batch)
+        elif roll < 0.7:
+            expense = synthetic_expenses(1, seed=10_000 + step)[0]
+            store.update_expense(rng.choice(live), dict(expense, category=rng.choice(CATEGORIES)))
+        elif roll < 0.85:
+            store.delete_expense(live.pop(rng.randrange(len(live))))
+        elif roll < 0.95:
+            store.set_budget(f'20{rng.randint(15, 24)}-{rng.randint(1, 12):02d}', float(rng.randint(0, 5000)))
+        else:
+            store.set_category_color(rng.choice(CATEGORIES), rng.choice(COLORS))
+
+
+def state_of(store):
+    months = store.months()
+    return {
+        'expenses': store.list_expenses(),
+        'page': store.list_expenses(months[-1] if months else None, 7, ('2020-06-15', 10**9)),
+        'budgets': store.list_budgets(),
+        'colors': store.list_category_colors(),
+        'months': months,
+        'rows': sorted(map(tuple, store.expense_rows('2016-01', '2019-12'))),
+        'rollups': {
+            month: sorted((row['category'], row['currency_code'], round(row['total'], 6), row['count'])
+                          for row in store.month_rollups(month))
+            for month in months
+        },
+    }
+
+
+@pytest.fixture(scope='module')
+def history(tmp_path_factory):
+    """The same operations applied to both stores, with a delta-sync cursor taken halfway."""
+    workdir = tmp_path_factory.mktemp('journal')
+    sqlite = ExpenseStore(str(workdir / 'reference.db'))
+    journal_dir = str(workdir / 'journal')
+    journal = JournalStore(journal_dir, sync='none', compact_bytes=1 << 40)
+    random_operations(sqlite, OPERATIONS)
+    random_operations(journal, OPERATIONS)
+    cursors = sqlite.data_version(), journal.data_version()
+    random_operations(sqlite, OPERATIONS, seed=1)
+    random_operations(journal, OPERATIONS, seed=1)
+    deltas = [store.changes_since(cursor, limit=100_000)['changes'] for store, cursor in zip((sqlite, journal), cursors)]
+    states = state_of(sqlite), state_of(journal)
+    journal.close()
+    return {'journal_dir': journal_dir, 'deltas': deltas, 'states': states, 'expected': states[0]}
+
+
+def copy_journal(history, tmp_path):
+    """A copy of the journal directory, so each test recovers from the same files."""
+    directory = str(tmp_path / 'journal')
+    shutil.copytree(history['journal_dir'], directory)
+    return directory
+
+
+def test_same_state_as_expense_store(history):
+    sqlite_state, journal_state = history['states']
+    assert journal_state == sqlite_state
+
+
+def test_same_delta_sync_output(history):
+    sqlite_changes, journal_changes = history['deltas']
+    assert sqlite_changes and journal_changes == sqlite_changes
+
+
+def test_replaying_the_journal_reproduces_the_state(history, tmp_path):
+    reopened = JournalStore(copy_journal(history, tmp_path), sync='none')
+    try:
+        assert state_of(reopened) == history['expected']
+    finally:
+        reopened.close()
+
+
+def test_snapshot_plus_tail_reproduces_the_state(history, tmp_path):
+    directory = copy_journal(history, tmp_path)
+    store = JournalStore(directory, sync='none')
+    store.compact()
+    store.set_budget('2030-01', 1.0)
+    expected = state_of(store)
+    store.close()
+    assert expected['budgets']['2030-01'] == 1.0
+    assert sorted(name.split('-')[0] for name in os.listdir(directory)) == ['journal', 'snapshot']
+    reopened = JournalStore(directory, sync='none')
+    try:
+        assert state_of(reopened) == expected
+    finally:
+        reopened.close()
+
+
+def test_torn_final_record_is_dropped(history, tmp_path):
+    directory = copy_journal(history, tmp_path)
+    # A crash in the middle of a write leaves half a record at the end of the last segment
+    segment = max(name for name in os.listdir(directory) if name.startswith('journal-'))
+    with open(os.path.join(directory, segment), 'a', encoding='utf-8') as handle:
+        handle.write('0badc0de {"op":"set_budget","user":1,"mo')
+    reopened = JournalStore(directory, sync='none')
+    try:
+        assert state_of(reopened) == history['expected']
+        reopened.set_budget('2030-02', 2.0)  # appends after the cut, not after the torn bytes
+    finally:
+        reopened.close()
+    again = JournalStore(directory, sync='none')
+    try:
+        assert again.list_budgets()['2030-02'] == 2.0
+    finally:
+        again.close()
+
+
+def test_delta_pages_do_not_split_a_batch(tmp_path):
+    store = JournalStore(str(tmp_path / 'journal'), sync='none')
+    try:
+        cursor = store.data_version()
+        store.add_expenses(synthetic_expenses(20))
+        store.add_expense(synthetic_expenses(1, first_id=21)[0])
+        first = store.changes_since(cursor, limit=3)
+        assert first['more'] and len(first['changes']) == 20
+        second = store.changes_since(first['cursor'], limit=3)
+        assert [change['key'] for change in second['changes']] == ['21']
+        assert store.changes_since(second['cursor'], limit=3)['changes'] == []
+    finally:
+        store.close()
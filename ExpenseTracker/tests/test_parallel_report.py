@@ -0,0 +1,99 @@
+"""ParallelReporter's merged report against the single-process ExpenseFrame report."""
+import pytest
+
+import parallel_report
+from aggregate import ExpenseFrame
+from benchmarks.bench_parallel import fill
+from benchmarks.bench_rates import synthetic_series
+from parallel_report import ParallelReporter, month_partitions
+from rates import RateTable
+from store import ExpenseStore
+
+
+def single_report(store, start_month, end_month, primary_code, rates=None):
+    """/api/report with one process."""
+    return ExpenseFrame.from_store(store, start_month, end_month, rates=rates).report(primary_code)
+
+
+def assert_close(got, expected):
+    assert got['count'] == expected['count'] and got.keys() == expected.keys()
+    for key in ('byCategory', 'byCurrency', 'byMonth'):
+        assert got[key].keys() == expected[key].keys(), key
+        for name, total in expected[key].items():
+            assert got[key][name] == pytest.approx(total, rel=1e-9, abs=1e-9), (key, name)
+    assert got['total'] == pytest.approx(expected['total'], rel=1e-9, abs=1e-9)
+
+
+@pytest.fixture(scope='module')
+def store(tmp_path_factory):
+    """Five years from 2015 for the default user, with no expenses from 2018-03 to 2018-12."""
+    store = ExpenseStore(str(tmp_path_factory.mktemp('parallel') / 'expenses.db'))
+    fill(store, 4000, years=5, chunk=1000)
+    return store
+
+
+@pytest.fixture(scope='module')
+def other_user(store):
+    """A second account with a year of expenses of its own."""
+    user_id = store.add_user('other', 'x')
+    fill(store.for_user(user_id), 300, seed=1, years=1)
+    return user_id
+
+
+@pytest.fixture(scope='module')
+def reporters(store):
+    """Reporters with fixed and with historical rates. Their worker processes start once for the module."""
+    fixed, historical = ParallelReporter(store, workers=2), ParallelReporter(store, RateTable(synthetic_series()), 2)
+    yield {'fixed': fixed, 'historical': historical}
+    fixed.close()
+    historical.close()
+
+
+@pytest.fixture
+def always_parallel(monkeypatch):
+    monkeypatch.setattr(parallel_report, 'PARALLEL_MIN_ROWS', 0)
+
+
+@pytest.mark.parametrize('rates', ['fixed', 'historical'])
+@pytest.mark.parametrize('start_month, end_month, primary_code', [
+    (None, None, 'USD'),           # the whole history, across the empty months
+    ('2016-07', '2019-02', 'EUR'),
+    (None, '2018-06', 'JPY'),      # ends inside the empty months
+    ('2017-05', '2017-05', 'GBP'),  # a single month
+    ('1990-01', '1990-12', 'USD'),  # no expenses
+])
+def test_parallel_matches_single_process(store, reporters, always_parallel, rates, start_month, end_month,
+                                         primary_code):
+    reporter = reporters[rates]
+    expected = single_report(store, start_month, end_month, primary_code, reporter.rates)
+    assert_close(reporter.report(start_month, end_month, primary_code), expected)
+    assert reporter._executor is not None
+
+
+def test_empty_months_are_zero(store, reporters, always_parallel):
+    by_month = reporters['fixed'].report(None, None, 'USD')['byMonth']
+    assert by_month['2018-03'] == by_month['2018-12'] == 0.0
+    assert list(by_month) == sorted(by_month) and len(by_month) == 60
+
+
+def test_reports_only_the_users_expenses(store, other_user, reporters, always_parallel):
+    expected = single_report(store.for_user(other_user), None, None, 'EUR')
+    assert expected['count'] == 300
+    assert_close(reporters['fixed'].report(None, None, 'EUR', user_id=other_user), expected)
+
+
+def test_small_histories_stay_in_the_calling_process(store):
+    reporter = ParallelReporter(store, workers=2)
+    try:
+        assert_close(reporter.report(None, None, 'USD'), single_report(store, None, None, 'USD'))
+        assert reporter._executor is None
+    finally:
+        reporter.close()
+
+
+def test_month_partitions_balance_the_rows():
+    counts = [('2024-01', 10), ('2024-02', 0), ('2024-03', 10), ('2024-04', 10), ('2024-05', 10)]
+    assert month_partitions(counts, 2) == [('2024-01', '2024-03'), ('2024-04', '2024-05')]
+    assert month_partitions(counts, 10) == [('2024-01', '2024-01'), ('2024-02', '2024-02'), ('2024-03', '2024-03'),
+                                            ('2024-04', '2024-04'), ('2024-05', '2024-05')]
+    assert month_partitions([], 4) == []
@@ -0,0 +1,66 @@
+"""RateTable's batch conversion against one as-of convert() per row, and the fixed rates without a series."""
+import numpy as np
+import pytest
+
+from aggregate import ExpenseFrame
+from benchmarks.bench_rates import synthetic_series
+from benchmarks.generators import synthetic_rows
+from currency import CURRENCY_OPTIONS, CURRENCY_RATES_TO_USD, convert_to_primary
+from rates import RateTable
+
+
+@pytest.fixture(scope='module')
+def rows():
+    return synthetic_rows(5000)
+
+
+@pytest.fixture(scope='module')
+def table():
+    return RateTable(synthetic_series())
+
+
+@pytest.mark.parametrize('primary_code', CURRENCY_OPTIONS)
+def test_batch_matches_per_row_as_of(rows, table, primary_code):
+    frame = ExpenseFrame.from_rows(rows)
+    expected = [table.convert(amount, code, primary_code, date) for amount, code, _, date in rows]
+    got = table.convert_columns(frame.amounts, frame.currency_ids, frame.dates, primary_code)
+    assert got.tolist() == expected
+
+
+@pytest.mark.parametrize('primary_code', CURRENCY_OPTIONS)
+def test_no_series_reproduces_fixed_rates(rows, primary_code):
+    frame = ExpenseFrame.from_rows(rows)
+    got = RateTable().convert_columns(frame.amounts, frame.currency_ids, frame.dates, primary_code)
+    assert got.tolist() == [convert_to_primary(amount, code, primary_code) for amount, code, _, _ in rows]
+
+
+def test_as_of_uses_latest_observation_on_or_before():
+    table = RateTable({'EUR': [('2024-01-10', 1.10), ('2024-01-02', 1.05), ('2024-01-10', 1.12)]})
+    assert table.rate('EUR', '2023-12-31') == 1.05  # before the series: the earliest observation
+    assert table.rate('EUR', '2024-01-02') == 1.05
+    assert table.rate('EUR', '2024-01-09') == 1.05
+    assert table.rate('EUR', '2024-01-10') == 1.12  # a later duplicate of a date wins
+    assert table.rate('EUR', '2030-01-01') == 1.12
+    assert table.rate('GBP', '2024-01-10') == CURRENCY_RATES_TO_USD['GBP']  # no series: the fixed rate
+
+
+def test_mixed_currencies_with_and_without_series():
+    table = RateTable({'EUR': [('2024-01-01', 1.0), ('2024-02-01', 1.25)]})
+    rows = [(10.0, 'EUR', '2024-01-15'), (10.0, 'EUR', '2024-02-15'), (10.0, 'GBP', '2024-02-15'),
+            (10.0, 'USD', '2024-02-15')]
+    gbp = CURRENCY_RATES_TO_USD['GBP']
+    assert table.convert_many(rows, 'EUR').tolist() == [10.0, 10.0, 10.0 * gbp / 1.25, 10.0 / 1.25]
+    assert table.convert_many(rows, 'USD').tolist() == [10.0, 12.5, 10.0 * gbp, 10.0]
+
+
+def test_frame_report_converts_each_row_on_its_date():
+    table = RateTable({'EUR': [('2024-01-01', 1.0), ('2024-02-01', 2.0)]})
+    rows = [(10.0, 'EUR', 'Food', '2024-01-20'), (10.0, 'EUR', 'Food', '2024-02-20')]
+    report = ExpenseFrame.from_rows(rows, rates=table).report('USD')
+    assert report['byMonth'] == {'2024-01': 10.0, '2024-02': 20.0}
+    assert report['byCurrency'] == {'EUR': 20.0}
+
+
+def test_empty_columns():
+    assert RateTable(synthetic_series()).convert_columns(
+        np.zeros(0), np.zeros(0, dtype=np.int8), np.zeros(0, dtype='datetime64[D]'), 'EUR').tolist() == []
@@ -0,0 +1,83 @@
+"""ExpenseStore.search() against a brute-force scan, and JournalStore.search() against ExpenseStore."""
+import random
+
+import pytest
+
+import journal
+import store
+from benchmarks.bench_search import COMMON_WORDS, QUERIES, synthetic_expenses
+from journal import JournalStore
+from store import ExpenseStore, search_terms
+
+ROWS = 5000
+# Small enough that most queries match more expenses than are ranked
+CANDIDATES = 200
+
+
+def brute_force(expenses, text, min_amount=None, max_amount=None, start_date=None, end_date=None):
+    """Ids search() may rank: every matching expense that passes the filters, newest CANDIDATES by id."""
+    terms = search_terms(text)
+    matches = []
+    for expense in expenses:
+        words = search_terms(expense['category']) + search_terms(expense['note'])
+        if (terms and all(any(word.startswith(term) for word in words) for term in terms)
+                and (min_amount is None or expense['amount'] >= min_amount)
+                and (max_amount is None or expense['amount'] <= max_amount)
+                and (start_date is None or expense['date'] >= start_date)
+                and (end_date is None or expense['date'] <= end_date)):
+            matches.append(expense['id'])
+    return set(sorted(matches)[-CANDIDATES:])
+
+
+@pytest.fixture(scope='module')
+def stores(tmp_path_factory):
+    """Both stores after the same inserts, edits and deletes, and the expenses they should hold."""
+    workdir = tmp_path_factory.mktemp('search')
+    expenses = synthetic_expenses(ROWS, seed=1, vocabulary=50)
+    sqlite = ExpenseStore(str(workdir / 'search.db'))
+    memory = JournalStore(str(workdir / 'journal'), sync='none')
+    for target in (sqlite, memory):
+        target.add_expenses(expenses[:ROWS // 2])
+    memory.search('warm up')  # build the index now, so the writes below go through its incremental path
+    rng = random.Random(2)
+    edits = [(rng.choice(expenses[:ROWS // 2])['id'], rng.choice(COMMON_WORDS)) for _ in range(200)]
+    deletes = {rng.choice(expenses[:ROWS // 2])['id'] for _ in range(200)}
+    for target in (sqlite, memory):
+        target.add_expenses(expenses[ROWS // 2:])
+        for expense_id, note in edits:
+            target.update_expense(expense_id, dict(expenses[expense_id - 1], note=note, category='Travel'))
+        for expense_id in deletes:
+            target.delete_expense(expense_id)
+    for expense_id, note in edits:
+        expenses[expense_id - 1] = dict(expenses[expense_id - 1], note=note, category='Travel')
+    yield sqlite, memory, [expense for expense in expenses if expense['id'] not in deletes]
+    memory.close()
+
+
+@pytest.fixture(autouse=True)
+def few_candidates(monkeypatch):
+    monkeypatch.setattr(store, 'SEARCH_CANDIDATES', CANDIDATES)
+    monkeypatch.setattr(journal, 'SEARCH_CANDIDATES', CANDIDATES)
+
+
+SEARCHES = QUERIES + [('w1', {}), ('', {}), ('zzz', {}), ('TRAVEL', {'start_date': '2020-06-01'})]
+
+
+@pytest.mark.parametrize('text, filters', SEARCHES)
+def test_fts5_matches_brute_force(stores, text, filters):
+    sqlite, _, expenses = stores
+    found = sqlite.search(text, limit=CANDIDATES, **filters)
+    assert {expense['id'] for expense in found} == brute_force(expenses, text, **filters)
+
+
+@pytest.mark.parametrize('text, filters', SEARCHES)
+def test_journal_store_matches_fts5(stores, text, filters):
+    sqlite, memory, _ = stores
+    assert memory.search(text, limit=CANDIDATES, **filters) == sqlite.search(text, limit=CANDIDATES, **filters)
+
+
+def test_accents_and_case_are_ignored(stores):
+    sqlite, memory, _ = stores
+    for target in (sqlite, memory):
+        assert target.search('CAFE', limit=CANDIDATES) == target.search('café', limit=CANDIDATES) != []
+        assert target.search('creme brulee', limit=CANDIDATES) == target.search('Crème Brûlée', limit=CANDIDATES)
@@ -0,0 +1,113 @@
+"""Delta sync: a client applying changes_since() pages ends up with the same data as a full snapshot."""
+import pytest
+
+from benchmarks.bench_journal import synthetic_expenses
+from journal import JournalStore
+from store import ExpenseStore
+
+
+@pytest.fixture(params=['sqlite', 'journal'])
+def store(request, tmp_path):
+    if request.param == 'sqlite':
+        yield ExpenseStore(str(tmp_path / 'expenses.db'))
+    else:
+        store = JournalStore(str(tmp_path / 'journal'), sync='none')
+        yield store
+        store.close()
+
+
+class Client:
+    """What the page keeps: its data and the cursor it last synced to."""
+
+    def __init__(self, snapshot):
+        self.load(snapshot)
+
+    def load(self, snapshot):
+        assert snapshot['full']
+        self.cursor = snapshot['cursor']
+        self.data = {
+            'expense': {str(expense['id']): expense for expense in snapshot['expenses']},
+            'budget': {month: {'month': month, 'amount': amount} for month, amount in snapshot['budgets'].items()},
+            'categoryColor': {category: {'category': category, 'color': color}
+                              for category, color in snapshot['categoryColors'].items()},
+        }
+
+    def sync(self, store, limit):
+        """Pulls pages until the store says there is no more; returns the number of pages."""
+        pages = 0
+        while True:
+            response = store.changes_since(self.cursor, limit=limit)
+            if response['full']:
+                self.load(response)
+                return pages + 1
+            for change in response['changes']:
+                if change['op'] == 'upsert':
+                    self.data[change['entity']][change['key']] = change['data']
+                else:
+                    self.data[change['entity']].pop(change['key'], None)
+            self.cursor = response['cursor']
+            pages += 1
+            if not response['more']:
+                return pages
+
+
+def edit(store, first_id):
+    """Inserts, updates, deletes and budget and color changes, some touching the same rows twice."""
+    expenses = synthetic_expenses(30, seed=first_id, first_id=first_id)
+    store.add_expenses(expenses[:20])
+    for expense in expenses[20:]:
+        store.add_expense(expense)
+    for expense in expenses[:10]:
+        store.update_expense(expense['id'], dict(expense, note='edited'))
+    for expense in expenses[5:15]:
+        store.delete_expense(expense['id'])
+    store.set_budget('2024-01', 100.0)
+    store.set_budget('2024-01', 150.0)
+    store.set_budget('2024-02', 80.0)
+    store.set_category_color('Food', '#10b981')
+
+
+def assert_in_sync(client, store):
+    assert client.data == Client(store.changes_since('')).data
+
+
+@pytest.mark.parametrize('limit', [1, 7, 5000])
+def test_deltas_reproduce_the_snapshot(store, limit):
+    edit(store, 1)
+    client = Client(store.changes_since(''))
+    edit(store, 1000)
+    pages = client.sync(store, limit)
+    assert pages > 1 if limit < 10 else pages == 1
+    assert_in_sync(client, store)
+    assert client.cursor == store.data_version()
+
+
+def test_nothing_new_after_the_latest_cursor(store):
+    edit(store, 1)
+    response = store.changes_since(store.data_version())
+    assert response == {'full': False, 'cursor': store.data_version(), 'more': False, 'changes': []}
+
+
+@pytest.mark.parametrize('cursor', ['', 'garbage', '1', None])
+def test_unknown_cursor_gets_a_snapshot(store, cursor):
+    edit(store, 1)
+    assert store.changes_since(cursor)['full']
+
+
+def test_clear_all_starts_clients_over(store):
+    edit(store, 1)
+    client = Client(store.changes_since(''))
+    store.clear_all()
+    edit(store, 1000)
+    assert store.changes_since(client.cursor)['full']
+    client.sync(store, 5000)
+    assert_in_sync(client, store)
+
+
+def test_other_users_changes_are_not_sent(tmp_path):
+    store = ExpenseStore(str(tmp_path / 'expenses.db'))
+    other = store.add_user('other', 'x')
+    client = Client(store.changes_since(''))
+    edit(store.for_user(other), 1)
+    assert store.changes_since(client.cursor)['changes'] == []
+    assert store.for_user(other).changes_since(client.cursor)['changes'] != []
@@ -0,0 +1,115 @@
+"""
+Self-hosted copies of the page's third-party files (Chart.js and the Inter font).
+
+The files are committed in vendor/ next to vendor/SHA256SUMS, which pins each one's sha256 (in
+`sha256sum` format, so `sha256sum -c` checks them too). Files found there are served from /assets/ under
+fingerprinted names and the page's CDN URLs are rewritten to them, so the app needs no outside host.
+
+`python app.py fetch-vendor` downloads missing files and refuses any whose digest doesn't match its pin.
+`python app.py fetch-vendor --pin` is for adding or upgrading a file: it records the digests of what it
+downloaded instead, to be reviewed and committed together with the files.
+
+A file whose digest doesn't match its pin is never served. `serve` and `build-assets` refuse to run
+while files are missing (see missing_vendor_files()) unless told to fall back to the CDN URLs.
+"""
+import hashlib
+import os
+import urllib.request
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'vendor')
+SHA256SUMS = 'SHA256SUMS'
+
+# filename -> (pinned CDN URL, as referenced by HTML_CONTENT; content type; worth compressing)
+VENDOR_FILES = {
+    'chart.umd.min.js': (
+        'https://cdn.jsdelivr.net/npm/chart.js@4.4.0/dist/chart.umd.min.js',
+        'text/javascript; charset=utf-8',
+        True,
+    ),
+    'inter-latin-wght-normal.woff2': (
+        'https://cdn.jsdelivr.net/npm/@fontsource-variable/inter@5.0.16/files/inter-latin-wght-normal.woff2',
+        'font/woff2',
+        False,  # woff2 is already Brotli-compressed
+    ),
+}
+
+
+class VendorError(Exception):
+    """A vendored file is unpinned or doesn't match its pinned sha256."""
+
+
+def pinned_digests(directory=VENDOR_DIR):
+    """{filename: sha256 hex digest} from the directory's SHA256SUMS ({} if there is none)."""
+    try:
+        with open(os.path.join(directory, SHA256SUMS), encoding='utf-8') as handle:
+            lines = handle.read().splitlines()
+    except FileNotFoundError:
+        return {}
+    digests = {}
+    for line in lines:
+        if line.strip():
+            digest, filename = line.split(maxsplit=1)
+            digests[filename.lstrip('*')] = digest.lower()
+    return digests
+
+
+def _write_pins(directory, digests):
+    path = os.path.join(directory, SHA256SUMS)
+    with open(path + '.part', 'w', encoding='utf-8') as handle:
+        handle.writelines(f'{digest}  {filename}\n' for filename, digest in sorted(digests.items()))
+    os.replace(path + '.part', path)
+
+
+def _verify(filename, body, digests):
+    expected = digests.get(filename)
+    if expected is None:
+        raise VendorError(f"{filename} has no pinned sha256 in {SHA256SUMS}.")
+    actual = hashlib.sha256(body).hexdigest()
+    if actual != expected:
+        raise VendorError(f"{filename} has sha256 {actual}, but {SHA256SUMS} pins {expected}.")
+
+
+def missing_vendor_files(directory=VENDOR_DIR):
+    """Vendored files not yet on disk; the page falls back to their CDN URLs."""
+    return [filename for filename in VENDOR_FILES if not os.path.isfile(os.path.join(directory, filename))]
+
+
+def vendored_files(directory=VENDOR_DIR):
+    """
+    Yields (filename, cdn_url, content_type, compress, body) for each vendored file present on disk.
+    Raises VendorError for a file that doesn't match its pin.
+    """
+    digests = pinned_digests(directory)
+    for filename, (url, content_type, compress) in VENDOR_FILES.items():
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path):
+            with open(path, 'rb') as handle:
+                body = handle.read()
+            _verify(filename, body, digests)
+            yield filename, url, content_type, compress, body
+
+
+def fetch_vendor(directory=VENDOR_DIR, force=False, timeout=30, pin=False):
+    """
+    Downloads missing (or, with force, all) vendored files; yields (filename, bytes written or None if kept).
+    Each download must match its pinned sha256, or, with pin, has its digest recorded in SHA256SUMS.
+    """
+    os.makedirs(directory, exist_ok=True)
+    digests = pinned_digests(directory)
+    for filename, (url, _, _) in VENDOR_FILES.items():
+        path = os.path.join(directory, filename)
+        if os.path.isfile(path) and not force:
+            yield filename, None
+            continue
+        with urllib.request.urlopen(url, timeout=timeout) as response:
+            body = response.read()
+        if pin:
+            digests[filename] = hashlib.sha256(body).hexdigest()
+            _write_pins(directory, digests)
+        else:
+            _verify(filename, body, digests)
+        # Write then rename, so a failed download never leaves a truncated file to be served.
+        with open(path + '.part', 'wb') as handle:
+            handle.write(body)
+        os.replace(path + '.part', path)
+        yield filename, len(body)
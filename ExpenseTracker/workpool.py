@@ -0,0 +1,128 @@
+"""
+A small, bounded pool for slow request work (reports over many years, full exports).
+
+Every server thread that runs a year-long report is a thread that can't answer the page's quick
+CRUD and summary requests. Heavy endpoints therefore hand their work to a WorkPool:
+- At most `workers` heavy jobs run at once, whatever the number of server threads.
+- At most `queued` more wait for a turn. Past that, submit() and stream() raise PoolBusy right away
+  (the API answers 503 with Retry-After), instead of piling up behind the running jobs.
+- stream() runs a generator on a pool thread and hands its items to the response through a small
+  bounded queue. The client gets results as they're produced, and a slow reader holds back the
+  producer instead of buffering the whole export in memory.
+
+Flask async views would need asgiref and an ASGI server. This keeps the WSGI deployment as it is.
+"""
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class PoolBusy(Exception):
+    """Every worker and queue slot is taken."""
+
+
+class _Failed:
+    def __init__(self, error):
+        self.error = error
+
+
+class WorkPool:
+    def __init__(self, workers=2, queued=2, buffer=8):
+        self.workers = workers
+        self.queued = queued
+        self.buffer = buffer
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix='workpool')
+        self._slots = threading.BoundedSemaphore(workers + queued)
+
+    def _take_slot(self):
+        if not self._slots.acquire(blocking=False):
+            raise PoolBusy(f"all {self.workers} workers and {self.queued} queue slots are busy")
+
+    def submit(self, function, *args):
+        """A Future for function(*args) on a pool thread. Raises PoolBusy when the pool is full."""
+        self._take_slot()
+        try:
+            future = self._executor.submit(function, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, function, *args):
+        """function(*args) on a pool thread, waiting for the result (exceptions propagate)."""
+        return self.submit(function, *args).result()
+
+    def stream(self, make_items):
+        """
+        An iterator over make_items(), which runs on a pool thread. Raises PoolBusy (before anything
+        runs) when the pool is full. Closing the iterator, as the server does when the client
+        disconnects, stops the producer at its next item.
+        """
+        self._take_slot()
+        items = queue.Queue(self.buffer)
+        stopped = threading.Event()
+
+        def hand_over(item):
+            while not stopped.is_set():
+                try:
+                    items.put(item, timeout=0.25)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def produce():
+            produced = None
+            try:
+                produced = make_items()
+                for item in produced:
+                    if not hand_over(item):
+                        return
+                hand_over(_DONE)
+            except BaseException as error:
+                hand_over(_Failed(error))
+            finally:
+                if hasattr(produced, 'close'):
+                    produced.close()  # a generator stopped early runs its cleanup now, on this thread
+                self._slots.release()
+
+        try:
+            self._executor.submit(produce)
+        except BaseException:
+            self._slots.release()
+            raise
+        return _Relay(items, stopped)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Relay:
+    """The consuming end of WorkPool.stream(). Closing it (or dropping it unread) stops the producer."""
+
+    def __init__(self, items, stopped):
+        self._items = items
+        self._stopped = stopped
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._stopped.is_set():
+            raise StopIteration
+        item = self._items.get()
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, _Failed):
+            self.close()
+            raise item.error
+        return item
+
+    def close(self):
+        self._stopped.set()
+
+    __del__ = close